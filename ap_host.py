@@ -0,0 +1,153 @@
+"""
+AP 網域解析：學習紀錄與課程頁會在 ap1 / ap2 等 AP 主機之間切換。
+從 SSO 與各回應的最終網址得知目前 session 使用的主機並持久化，
+請求前把課程 / SCORM 連結改寫到該主機，並快取課程頁的 JS 跳轉目標，
+省去跨主機的重新導向與額外的往返。
+"""
+
+import json
+import os
+import re
+import tempfile
+from typing import Dict, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+
+import logs
+from utils import Files
+
+
+DEFAULT_BASE = "https://ap1.elearning.taipei"
+_AP_HOST_RE = re.compile(r"^ap\d+\.elearning\.taipei$", re.I)
+
+logger = logs.get_logger(__name__)
+
+
+def is_ap_url(url: Optional[str]) -> bool:
+    """是否為 AP 主機上的網址"""
+    if not url:
+        return False
+    return bool(_AP_HOST_RE.match(urlsplit(url).hostname or ""))
+
+
+def _path_key(url: str) -> str:
+    """與主機無關的快取鍵 (路徑 + 查詢字串)"""
+    parts = urlsplit(url)
+    return parts.path + (f"?{parts.query}" if parts.query else "")
+
+
+class HostResolver:
+    """記錄目前的 AP 主機與 JS 跳轉目標"""
+
+    def __init__(self, file_path: str = Files.AP_HOST):
+        self.file_path = file_path
+        self.base = DEFAULT_BASE
+        self.redirects: Dict[str, str] = {}
+        self._dirty = False
+        self._load()
+
+    def _load(self) -> None:
+        """讀取 ap_host.json；檔案損毀時沿用預設主機 (下次 learn 後覆寫)"""
+        if not self.file_path or not os.path.exists(self.file_path):
+            return
+        try:
+            with open(self.file_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            base = data.get("base", DEFAULT_BASE)
+            redirects = data.get("redirects", {})
+            if not is_ap_url(base) or not isinstance(redirects, dict):
+                raise ValueError("內容格式不符")
+        except (OSError, ValueError, AttributeError) as e:
+            logger.warning("無法讀取 %s (%s)，改用預設 AP 主機 %s", self.file_path, e, DEFAULT_BASE)
+            return
+        self.base = base
+        self.redirects = redirects
+
+    def learn(self, url: str) -> bool:
+        """由回應的最終網址更新目前的 AP 主機，回傳是否有變更"""
+        if not is_ap_url(url):
+            return False
+        parts = urlsplit(url)
+        base = f"{parts.scheme}://{parts.netloc}"
+        if base == self.base:
+            return False
+        logger.info("AP 網域變更: %s -> %s", self.base, base)
+        self.base = base
+        self._dirty = True
+        return True
+
+    def rewrite(self, url: str) -> str:
+        """把其他 AP 主機的網址改寫到目前的主機；非 AP 網址維持不變"""
+        if not is_ap_url(url):
+            return url
+        base = urlsplit(self.base)
+        parts = urlsplit(url)
+        if parts.netloc == base.netloc and parts.scheme == base.scheme:
+            return url
+        return urlunsplit((base.scheme, base.netloc, parts.path, parts.query, parts.fragment))
+
+    def absolute(self, href: str) -> str:
+        """相對路徑補上目前的主機，絕對網址則改寫主機"""
+        if href.startswith("/"):
+            return self.base + href
+        return self.rewrite(href)
+
+    def cached_redirect(self, url: str) -> Optional[str]:
+        """先前記錄的 JS 跳轉目標 (已改寫到目前的主機)"""
+        target = self.redirects.get(_path_key(url))
+        return self.absolute(target) if target else None
+
+    def remember_redirect(self, url: str, target: str) -> None:
+        """記錄 JS 跳轉目標；只快取 AP 主機內的跳轉 (不快取登入頁等)"""
+        if not is_ap_url(target):
+            return
+        key, value = _path_key(url), _path_key(target)
+        if self.redirects.get(key) != value:
+            self.redirects[key] = value
+            self._dirty = True
+
+    def forget_redirect(self, url: str) -> None:
+        if self.redirects.pop(_path_key(url), None) is not None:
+            self._dirty = True
+
+    def save(self) -> None:
+        """有變更時以暫存檔 + os.replace 原子性寫入"""
+        if not self._dirty:
+            return
+        directory = os.path.dirname(os.path.abspath(self.file_path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".ap-host-")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"base": self.base, "redirects": self.redirects}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.file_path)
+        self._dirty = False
+
+
+_resolver: Optional[HostResolver] = None
+
+
+def current() -> HostResolver:
+    """取得本程序共用的解析器 (第一次使用時才讀取檔案)"""
+    global _resolver
+    if _resolver is None:
+        _resolver = HostResolver()
+    return _resolver
+
+
+def save() -> None:
+    if _resolver is not None:
+        _resolver.save()
+
+
+def _response_hook(response: requests.Response, *args, **kwargs) -> None:
+    # 重新導向的中間回應不算，只看實際提供內容的主機
+    if not response.is_redirect:
+        current().learn(response.url)
+
+
+def instrument(session: requests.Session) -> requests.Session:
+    """為 session 掛上 hook，從每個回應的最終網址學習目前的 AP 主機"""
+    hooks = session.hooks.setdefault("response", [])
+    if _response_hook not in hooks:
+        hooks.append(_response_hook)
+    return session
@@ -0,0 +1,261 @@
+"""
+多帳號批次執行：每個帳號在獨立的工作目錄中執行 get_course / enroll / list_course 等步驟，
+各自擁有自己的 cookies.json、captcha.png、urls.txt，最後彙整成一份摘要。
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional
+
+from utils import Files
+
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 可執行的步驟與對應腳本
+STEPS = {
+    "enroll": "enroll.py",
+    "list_course": "list_course.py",
+    "get_course": "get_course.py",
+    "gen_url": "gen_url.py",
+}
+DEFAULT_STEPS = "enroll,get_course,gen_url"
+# 各步驟的課程紀錄匯出檔 (每個步驟各自一個檔案，不互相覆蓋)；
+# get_course 的紀錄包含修課時間，使用 export.py combine / report.py 預設讀取的檔名，
+# 其他步驟的匯出以 export.py combine --input-name 指定
+EXPORT_FILES = {
+    "enroll": "courses-enroll.jsonl",
+    "list_course": "courses-list_course.jsonl",
+    "get_course": Files.COURSE_EXPORT,
+}
+# 帳號同時用作工作目錄名稱，只允許不含路徑分隔符號的字元
+_USER_ID_RE = re.compile(r"[A-Za-z0-9_@.+-]+")
+
+
+@dataclass
+class Account:
+    user_id: str
+    password: str
+
+
+@dataclass
+class AccountResult:
+    user_id: str
+    work_dir: str
+    ok: bool = True
+    failed_step: Optional[str] = None
+    elapsed: float = 0.0
+    step_times: Dict[str, float] = field(default_factory=dict)
+    total_hours: Optional[float] = None
+    course_count: Optional[int] = None
+    incomplete_count: Optional[int] = None
+    url_count: Optional[int] = None
+
+
+def load_accounts(file_path: str) -> List[Account]:
+    """讀取帳號檔，每行一組 "帳號 密碼" (以空白、逗號或 = 分隔)，# 開頭為註解"""
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"找不到檔案 '{file_path}'")
+
+    accounts = []
+    with open(file_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            parts = re.split(r"[\s,=]+", line, maxsplit=1)
+            if len(parts) != 2:
+                print(f"[警告] 無法解析帳號設定: {line}")
+                continue
+            if not _USER_ID_RE.fullmatch(parts[0]) or parts[0] in (".", ".."):
+                print(f"[警告] 帳號含有不允許的字元，已略過: {parts[0]!r}")
+                continue
+            accounts.append(Account(user_id=parts[0], password=parts[1]))
+    return accounts
+
+
+def prepare_work_dir(base_dir: str, account: Account) -> str:
+    """建立帳號專屬工作目錄並寫入 id.confg"""
+    work_dir = os.path.join(base_dir, account.user_id)
+    if os.path.dirname(os.path.abspath(work_dir)) != os.path.abspath(base_dir):
+        raise ValueError(f"帳號 {account.user_id!r} 不能作為工作目錄名稱")
+    os.makedirs(work_dir, exist_ok=True)
+    with open(os.path.join(work_dir, Files.CONFIG), "w", encoding="utf-8") as f:
+        f.write(f"USER_ID={account.user_id}\n")
+        f.write(f"USER_PW={account.password}\n")
+    return work_dir
+
+
+def run_step(step: str, work_dir: str, extra_args: List[str]) -> bool:
+    """在工作目錄中執行單一步驟，輸出寫入 <step>.log"""
+    script = os.path.join(SCRIPT_DIR, STEPS[step])
+    log_path = os.path.join(work_dir, f"{step}.log")
+    with open(log_path, "w", encoding="utf-8") as log:
+        proc = subprocess.run(
+            [sys.executable, "-u", script, *extra_args],
+            cwd=work_dir,
+            stdin=subprocess.DEVNULL,  # 批次模式無法手動輸入驗證碼
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+    return proc.returncode == 0
+
+
+def collect_outputs(result: AccountResult) -> None:
+    """從帳號工作目錄中的輸出檔案彙整統計資訊"""
+    courses_path = os.path.join(result.work_dir, "courses.txt")
+    if os.path.exists(courses_path):
+        with open(courses_path, "r", encoding="utf-8") as f:
+            text = f.read()
+        hours_match = re.search(r"總時數:\s*([\d.]+)", text)
+        count_match = re.search(r"課程總數:\s*(\d+)", text)
+        if hours_match:
+            result.total_hours = float(hours_match.group(1))
+        if count_match:
+            result.course_count = int(count_match.group(1))
+
+    incomplete_path = os.path.join(result.work_dir, Files.INCOMPLETE_COURSES)
+    if os.path.exists(incomplete_path):
+        with open(incomplete_path, "r", encoding="utf-8") as f:
+            result.incomplete_count = len(
+                re.findall(r"^\d+\.\s", f.read(), re.MULTILINE))
+
+    urls_path = os.path.join(result.work_dir, Files.URLS_TXT)
+    if os.path.exists(urls_path):
+        with open(urls_path, "r", encoding="utf-8") as f:
+            result.url_count = sum(1 for line in f if line.strip())
+
+
+def run_account(account: Account, base_dir: str, steps: List[str],
+                step_args: Dict[str, List[str]]) -> AccountResult:
+    """依序執行單一帳號的所有步驟"""
+    work_dir = prepare_work_dir(base_dir, account)
+    result = AccountResult(user_id=account.user_id, work_dir=work_dir)
+    start = time.monotonic()
+
+    for step in steps:
+        step_start = time.monotonic()
+        ok = run_step(step, work_dir, step_args.get(step, []))
+        result.step_times[step] = round(time.monotonic() - step_start, 2)
+        if not ok:
+            result.ok = False
+            result.failed_step = step
+            break
+
+    result.elapsed = round(time.monotonic() - start, 2)
+    collect_outputs(result)
+    return result
+
+
+def print_summary(results: List[AccountResult]) -> None:
+    """輸出彙整摘要"""
+    def fmt(value, spec=""):
+        return "-" if value is None else format(value, spec)
+
+    print("\n" + "=" * 80)
+    print("批次執行摘要")
+    print("=" * 80)
+    for r in results:
+        status = "成功" if r.ok else f"失敗 ({r.failed_step})"
+        print(
+            f"{r.user_id:<16} {status:<18} 時數: {fmt(r.total_hours, '.1f'):>6}  "
+            f"課程: {fmt(r.course_count):>4}  未完成: {fmt(r.incomplete_count):>4}  "
+            f"待上課: {fmt(r.url_count):>4}  耗時: {r.elapsed:.1f}s"
+        )
+
+    succeeded = sum(1 for r in results if r.ok)
+    total_hours = sum(r.total_hours or 0 for r in results)
+    total_incomplete = sum(r.incomplete_count or 0 for r in results)
+    print("-" * 80)
+    print(f"帳號數: {len(results)} (成功 {succeeded})  "
+          f"總時數: {total_hours:.1f} 小時  未完成課程: {total_incomplete}")
+    print("=" * 80)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run the crawler for many accounts in parallel.")
+    parser.add_argument("accounts", help="Accounts file, one 'USER_ID USER_PW' per line")
+    parser.add_argument("--steps", default=DEFAULT_STEPS,
+                        help=f"Comma separated steps from {', '.join(STEPS)} (default: {DEFAULT_STEPS})")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4,
+                        help="Number of accounts processed concurrently (default: CPU count)")
+    parser.add_argument("--work-dir", default="accounts",
+                        help="Base directory for per-account state (default: accounts)")
+    parser.add_argument("--target", type=float, default=None,
+                        help="Target hours passed to enroll.py")
+    parser.add_argument("--summary", default="batch_summary.json",
+                        help="Path of the aggregated JSON summary")
+    args = parser.parse_args()
+
+    steps = [s.strip() for s in args.steps.split(",") if s.strip()]
+    unknown = [s for s in steps if s not in STEPS]
+    if unknown:
+        print(f"錯誤: 未知的步驟 {', '.join(unknown)}")
+        sys.exit(1)
+
+    try:
+        accounts = load_accounts(args.accounts)
+    except FileNotFoundError as e:
+        print(f"錯誤: {e}")
+        sys.exit(1)
+
+    if not accounts:
+        print("錯誤: 帳號檔中沒有任何帳號")
+        sys.exit(1)
+
+    # 各步驟皆匯出課程紀錄，之後可用 export.py combine 合併成全體帳號的資料
+    step_args = {step: ["--export", file_name] for step, file_name in EXPORT_FILES.items()}
+    if args.target is not None:
+        step_args["enroll"] += ["--target", str(args.target)]
+
+    if importlib.util.find_spec("ddddocr") is None and any(step in EXPORT_FILES for step in steps):
+        # 子程序沒有終端機，無法手動輸入驗證碼
+        print("[警告] 未安裝 ddddocr (pip install ddddocr)：需要重新登入的帳號將無法辨識驗證碼而失敗")
+
+    base_dir = os.path.abspath(args.work_dir)
+    workers = max(1, min(args.workers, len(accounts)))
+    print(f"[資訊] 共 {len(accounts)} 個帳號，同時執行 {workers} 個，步驟: {', '.join(steps)}")
+
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(run_account, account, base_dir, steps, step_args): account
+            for account in accounts
+        }
+        for future in as_completed(futures):
+            account = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"[錯誤] {account.user_id} 執行時發生異常: {e}")
+                result = AccountResult(
+                    user_id=account.user_id,
+                    work_dir=os.path.join(base_dir, account.user_id),
+                    ok=False,
+                )
+            status = "完成" if result.ok else f"失敗於 {result.failed_step}"
+            print(f"[資訊] {result.user_id} {status} ({result.elapsed:.1f}s)")
+            results.append(result)
+
+    results.sort(key=lambda r: r.user_id)
+    print_summary(results)
+
+    with open(args.summary, "w", encoding="utf-8") as f:
+        json.dump([asdict(r) for r in results], f, ensure_ascii=False, indent=2)
+    print(f"\n摘要已儲存至 {args.summary}")
+
+    if not all(r.ok for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,695 @@
+"""
+效能測試工具：以錄製的真實流量或合成資料比較各解析實作的速度與結果。
+
+用法：
+    python bench.py detail --archive recordings
+    python bench.py duration --samples 100000
+    python bench.py report --rows 100000
+    python bench.py blocks --lines 2000000 --top 20
+    python bench.py http2 --requests 400 --concurrency 16   # 需要 httpx[http2] 與 openssl
+    python bench.py regress                # 與 bench_baseline.json 比對解析器速度
+    python bench.py regress --update       # 解析器行為或速度有意變更後重新產生基準
+
+本工具只量測速度；解析結果與各流程的正確性由 tests/ 下的 pytest 測試檢查
+(tests/test_parsers.py 比對基準檔中的解析結果摘要)。
+regress 的速度以「相對於校準迴圈的倍數」比較，基準檔可在不同機器間共用；
+每一輪交錯量測校準迴圈與各解析器，取多輪的中位數，ms/筆 只供參考。
+"""
+
+import argparse
+import dataclasses
+import datetime
+import hashlib
+import json
+import os
+import random
+import re
+import socket
+import ssl
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+
+import ap_host
+import corpus
+import http2
+import recorder
+import report
+from enroll import parse_search_results
+from export import CourseRecord
+from gen_url import iter_course_blocks, parse_course_block, parse_course_file, read_course_file, shortest_courses
+from get_course import _resolve_scorm_launch, extract_course_detail, extract_course_info_from_html
+from utils import Files, _parse_minutes, parse_time_to_minutes, parse_times_to_minutes
+
+
+def _time_per_item(func: Callable, items: Sequence, repeat: int) -> float:
+    """回傳每個項目的平均耗時 (毫秒)，取多次執行中最快的一次"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            func(item)
+        best = min(best, time.perf_counter() - start)
+    return best / max(len(items), 1) * 1000
+
+
+def _legacy_course_detail(content: str):
+    """舊版做法 (已自 get_course.py 移除，保留作為比對基準)：建立整份 DOM 後分別掃描整頁"""
+    soup = BeautifulSoup(content, "html.parser")
+    study_times = sorted(set(re.findall(r"\d{4}[-/]\d{2}[-/]\d{2}\s+\d{2}:\d{2}", content)
+                             + re.findall(r"\d{4}[-/]\d{2}[-/]\d{2}", content)))
+
+    progress = is_completed = None
+    for indicator in soup.find_all(string=re.compile(r"(\d+)%")):
+        progress = int(re.search(r"(\d+)%", indicator).group(1))
+        is_completed = progress == 100
+        break
+    if is_completed is None:
+        if any(text in content for text in ["已完成", "完成", "Completed"]):
+            is_completed, progress = True, 100
+        elif any(text in content for text in ["未完成", "進行中", "In Progress"]):
+            is_completed, progress = False, 0
+
+    scorm_link = None
+    for link in soup.find_all("a", href=True):
+        if "/elearn/mod/scorm/view.php" in link["href"]:
+            scorm_link = ap_host.current().absolute(link["href"])
+            break
+    if not scorm_link:
+        match = re.search(r'https?://[^\s"\'<>]+/elearn/mod/scorm/view\.php\?id=\d+', content)
+        if match:
+            scorm_link = ap_host.current().rewrite(match.group(0))
+    req_match = re.search(r"完成條件為[：:]\s*閱讀時間達\d+分鐘以上", content)
+    required_time_str = req_match.group(0) if req_match else None
+    return is_completed, progress, study_times, scorm_link, required_time_str
+
+
+def bench_detail(args: argparse.Namespace) -> int:
+    """比較課程頁 (course/view.php) 的整頁解析與單次掃描解析"""
+    pages: List[str] = [
+        recorder.record_text(record)
+        for record in recorder.iter_records(args.archive, r"/course/view\.php")
+    ]
+    if not pages:
+        print(f"錯誤: {args.archive} 中沒有 course/view.php 的錄製紀錄 (請先以 --record 執行 get_course.py)")
+        return 1
+
+    legacy_ms = _time_per_item(_legacy_course_detail, pages, args.repeat)
+    targeted_ms = _time_per_item(extract_course_detail, pages, args.repeat)
+
+    fields = ("is_completed", "progress", "study_times", "scorm_link", "required_time_str")
+    differences = {name: 0 for name in fields}
+    for content in pages:
+        legacy = _legacy_course_detail(content)
+        detail = extract_course_detail(content)
+        for name, old_value in zip(fields, legacy):
+            if getattr(detail, name) != old_value:
+                differences[name] += 1
+
+    print(f"課程頁數: {len(pages)}  重複次數: {args.repeat}")
+    print(f"整頁 DOM 解析: {legacy_ms:8.3f} ms/頁")
+    print(f"單次掃描解析: {targeted_ms:8.3f} ms/頁  (加速 {legacy_ms / max(targeted_ms, 1e-9):.1f}x)")
+    print("與舊版結果不同的頁數 (舊版會掃到 script/style 與頁首頁尾):")
+    for name, count in differences.items():
+        print(f"  {name:<18} {count}")
+    return 0
+
+
+def _reference_parse_time_to_minutes(time_str: Optional[str]) -> int:
+    """原始的三段式正規表示式實作，作為比對基準"""
+    if not time_str:
+        return 0
+
+    time_str = time_str.strip()
+    total_min = 0
+
+    hr_match = re.search(r"(\d+)\s*(?:小時|時)", time_str)
+    if hr_match:
+        total_min += int(hr_match.group(1)) * 60
+
+    min_match = re.search(r"(\d+)\s*分", time_str)
+    if min_match:
+        total_min += int(min_match.group(1))
+
+    if total_min == 0 and re.match(r"^\d+(\.\d+)?$", time_str):
+        try:
+            return int(float(time_str) * 60)
+        except ValueError:
+            pass
+
+    return total_min
+
+
+def _random_duration(rng: random.Random) -> str:
+    """產生各種觀察到的時間格式 (含空白、雜訊與邊界值)"""
+    hours = rng.randint(0, 12)
+    minutes = rng.randint(0, 59)
+    space = rng.choice(["", " ", "  "])
+    choices = [
+        f"{hours}{space}小時{minutes}{space}分",
+        f"{hours}{space}小時",
+        f"{minutes}{space}分",
+        f"{hours}{space}時",
+        f"{hours}時{minutes}分",
+        f"{hours}.{rng.randint(0, 9)}",
+        f"{hours}",
+        f"完成條件為：閱讀時間達{rng.randint(1, 300)}分鐘以上",
+        f"閱讀時間達{rng.randint(1, 300)}分鐘以上",
+        f"{minutes}分{hours}時",
+        f"{hours}.{rng.randint(0, 9)}小時",
+        rng.choice(["", " ", "未知", "-", "0", "0分"]),
+    ]
+    value = rng.choice(choices)
+    if rng.random() < 0.2:
+        value = rng.choice([" ", "\t", ""]) + value + rng.choice([" ", "\n", ""])
+    return value
+
+
+def bench_duration(args: argparse.Namespace) -> int:
+    """比較原始實作與單筆、快取、批次轉換的速度 (結果一致性由 tests/test_utils.py 檢查)"""
+    rng = random.Random(args.seed)
+    values = [_random_duration(rng) for _ in range(args.samples)]
+
+    reference_ms = _time_per_item(_reference_parse_time_to_minutes, values, args.repeat)
+
+    def uncached(value):
+        _parse_minutes.cache_clear()
+        return parse_time_to_minutes(value)
+
+    uncached_ms = _time_per_item(uncached, values, args.repeat)
+    cached_ms = _time_per_item(parse_time_to_minutes, values, args.repeat)
+    batch_ms = _time_per_item(parse_times_to_minutes, [values], args.repeat) / len(values)
+
+    print(f"樣本數: {len(values)} (不重複 {len(set(values))})  種子: {args.seed}")
+    print(f"原始三段正規表示式: {reference_ms * 1000:8.3f} µs/筆")
+    print(f"單次掃描 (無快取):   {uncached_ms * 1000:8.3f} µs/筆")
+    print(f"單次掃描 (快取):     {cached_ms * 1000:8.3f} µs/筆")
+    print(f"批次轉換:            {batch_ms * 1000:8.3f} µs/筆")
+    return 0
+
+
+def _random_record(rng: random.Random, accounts: int) -> CourseRecord:
+    hours = rng.choice([1.0, 1.5, 2.0, 3.0, 4.0, 6.0])
+    return CourseRecord(
+        account=f"user{rng.randrange(accounts):04d}",
+        course_id=str(rng.randrange(100000)),
+        name="課程",
+        hours=hours,
+        # 約三成課程有完成條件 (與認證時數的一半不同)
+        required_minutes=rng.choice([30, 60, 90]) if rng.random() < 0.3 else int(hours * 60 / 2),
+        study_minutes=rng.randrange(int(hours * 60)),
+        status=rng.choice(["已完成", "未完成", "進行中", "完成"]),
+    )
+
+
+def bench_report(args: argparse.Namespace) -> int:
+    """比較逐筆與向量化 (NumPy) 的全體報表計算，並確認結果一致"""
+    if report.np is None:
+        print("錯誤: 需要安裝 numpy 套件 (pip install numpy)")
+        return 1
+
+    rng = random.Random(args.seed)
+    records = [_random_record(rng, args.accounts) for _ in range(args.rows)]
+    today = datetime.date(2026, 1, 1)
+
+    expected = report.summarize_records(records, today=today)
+    columns = report.load_columns(records)
+    actual = report.summarize_columns(columns, today=today)
+    if expected.to_dict() != actual.to_dict():
+        print("錯誤: 向量化結果與逐筆計算不一致")
+        return 1
+
+    loop_ms = _time_per_item(lambda rows: report.summarize_records(rows, today=today), [records], args.repeat)
+    load_ms = _time_per_item(report.load_columns, [records], args.repeat)
+    vector_ms = _time_per_item(lambda cols: report.summarize_columns(cols, today=today), [columns], args.repeat)
+
+    print(f"筆數: {len(records)}  帳號數: {len(actual.accounts)}  種子: {args.seed}")
+    print(f"逐筆計算:           {loop_ms:9.2f} ms")
+    print(f"載入欄位:           {load_ms:9.2f} ms")
+    print(f"向量化計算:         {vector_ms:9.2f} ms  ({loop_ms / max(vector_ms, 1e-9):.1f}x)")
+    return 0
+
+
+def _write_course_file(path: str, lines: int, seed: int) -> int:
+    """寫入約 lines 行的 incomplete_courses.txt (多帳號合併的規模)，回傳實際行數"""
+    rng = random.Random(seed)
+    pool = [corpus.incomplete_block(rng, 1).split(". ", 1)[1] for _ in range(2000)]
+    written = number = 0
+    with open(path, "w", encoding="utf-8") as f:
+        while written < lines:
+            number += 1
+            block = f"{number}. {pool[number % len(pool)]}"
+            f.write(block)
+            written += block.count("\n")
+    return written
+
+
+def _legacy_shortest(path: str, top: int) -> List[str]:
+    """舊版做法：整個檔案讀成字串、切成區塊串列、全部解析後排序"""
+    results = []
+    for block in re.split(r"\n(?=\d+\.)", read_course_file(path)):
+        result = parse_course_block(block)
+        if result and result.remaining_min > 0:
+            results.append(result)
+    results.sort(key=lambda x: x.wait_min)
+    return [item.output for item in results[:top]]
+
+
+def _streaming_shortest(path: str, top: int) -> List[str]:
+    return [item.output for item in shortest_courses(parse_course_file(path), top)]
+
+
+def _measure(func: Callable, *args) -> tuple:
+    """(結果, 秒數, 峰值記憶體 MB)；峰值另以 tracemalloc 量測，不影響計時"""
+    start = time.perf_counter()
+    result = func(*args)
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def bench_blocks(args: argparse.Namespace) -> int:
+    """比較整檔讀取 + re.split 與 mmap 逐區塊產生的切割 / 解析吞吐量與記憶體"""
+    ap_host._resolver = ap_host.HostResolver(file_path="")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, Files.INCOMPLETE_COURSES)
+        lines = _write_course_file(path, args.lines, args.seed)
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        print(f"行數: {lines}  檔案大小: {size_mb:.1f} MB  取最短: {args.top} 門")
+
+        split_rows = [
+            ("切割 (read + re.split)", lambda: len(re.split(r"\n(?=\d+\.)", read_course_file(path)))),
+            ("切割 (mmap 逐區塊)", lambda: sum(1 for _ in iter_course_blocks(path))),
+        ]
+        blocks = None
+        for label, func in split_rows:
+            count, seconds, peak = _measure(func)
+            blocks = blocks or count
+            print(f"{label:<28} {seconds:8.2f} 秒  {lines / seconds / 1e6:6.2f} M 行/秒  峰值 {peak:8.1f} MB")
+
+        legacy, legacy_seconds, legacy_peak = _measure(_legacy_shortest, path, args.top)
+        streaming, streaming_seconds, streaming_peak = _measure(_streaming_shortest, path, args.top)
+        print(f"{'解析 + 排序 (整份串列)':<28} {legacy_seconds:8.2f} 秒  "
+              f"{blocks / legacy_seconds / 1e3:6.1f} K 區塊/秒  峰值 {legacy_peak:8.1f} MB")
+        print(f"{'解析 + 堆積 (逐區塊)':<28} {streaming_seconds:8.2f} 秒  "
+              f"{blocks / streaming_seconds / 1e3:6.1f} K 區塊/秒  峰值 {streaming_peak:8.1f} MB")
+
+    if legacy != streaming:
+        print("錯誤: 逐區塊解析的結果與整檔解析不一致")
+        return 1
+    print("[成功] 兩種做法取得的最短課程一致")
+    return 0
+
+
+class _LocalTlsServer:
+    """本機 TLS 測試伺服器：依 ALPN 以 HTTP/2 或 HTTP/1.1 回應固定頁面 (延遲 delay 秒)，並計算建立的連線數"""
+
+    def __init__(self, certfile: str, keyfile: str, body: bytes, delay: float):
+        self.body = body
+        self.delay = delay
+        self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self.context.load_cert_chain(certfile, keyfile)
+        self.context.set_alpn_protocols(["h2", "http/1.1"])
+        self.listener = socket.create_server(("127.0.0.1", 0))
+        self.port = self.listener.getsockname()[1]
+        self.connections: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "_LocalTlsServer":
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.listener.close()
+
+    def _accept_loop(self) -> None:
+        while True:
+            try:
+                raw, _ = self.listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(raw,), daemon=True).start()
+
+    def _handle(self, raw: socket.socket) -> None:
+        try:
+            tls = self.context.wrap_socket(raw, server_side=True)
+        except (OSError, ssl.SSLError):
+            raw.close()
+            return
+        protocol = tls.selected_alpn_protocol() or "http/1.1"
+        with self._lock:
+            self.connections[protocol] = self.connections.get(protocol, 0) + 1
+        try:
+            if protocol == "h2":
+                self._serve_h2(tls)
+            else:
+                self._serve_http1(tls)
+        except (OSError, ssl.SSLError):
+            pass
+        finally:
+            tls.close()
+
+    def _serve_http1(self, tls: ssl.SSLSocket) -> None:
+        stream = tls.makefile("rb")
+        header = (f"HTTP/1.1 200 OK\r\nContent-Type: text/html; charset=utf-8\r\n"
+                  f"Content-Length: {len(self.body)}\r\n\r\n").encode("ascii")
+        while stream.readline():
+            while stream.readline() not in (b"\r\n", b"\n", b""):
+                pass
+            time.sleep(self.delay)
+            tls.sendall(header + self.body)
+
+    def _serve_h2(self, tls: ssl.SSLSocket) -> None:
+        import h2.config
+        import h2.connection
+        import h2.events
+
+        connection = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False))
+        lock = threading.Lock()
+        pending: Dict[int, bytes] = {}
+
+        def flush(stream_id: int) -> None:
+            # 依流量控制視窗分段送出，視窗不足時等 WindowUpdated 再繼續
+            data = pending.get(stream_id, b"")
+            while data:
+                size = min(connection.local_flow_control_window(stream_id), connection.max_outbound_frame_size)
+                if size <= 0:
+                    break
+                connection.send_data(stream_id, data[:size], end_stream=len(data) <= size)
+                data = data[size:]
+            if data:
+                pending[stream_id] = data
+            else:
+                pending.pop(stream_id, None)
+            tls.sendall(connection.data_to_send())
+
+        def respond(stream_id: int) -> None:
+            with lock:
+                connection.send_headers(stream_id, [(":status", "200"),
+                                                    ("content-type", "text/html; charset=utf-8"),
+                                                    ("content-length", str(len(self.body)))])
+                pending[stream_id] = self.body
+                flush(stream_id)
+
+        with lock:
+            connection.initiate_connection()
+            tls.sendall(connection.data_to_send())
+        while True:
+            data = tls.recv(65536)
+            if not data:
+                return
+            with lock:
+                events = connection.receive_data(data)
+                for event in events:
+                    if isinstance(event, h2.events.WindowUpdated):
+                        for stream_id in list(pending):
+                            flush(stream_id)
+                tls.sendall(connection.data_to_send())
+            for event in events:
+                if isinstance(event, h2.events.RequestReceived):
+                    threading.Timer(self.delay, respond, args=(event.stream_id,)).start()
+
+
+def _self_signed_cert(directory: str) -> tuple:
+    certfile, keyfile = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                    "-keyout", keyfile, "-out", certfile, "-subj", "/CN=127.0.0.1",
+                    "-addext", "subjectAltName=IP:127.0.0.1"],
+                   check=True, capture_output=True)
+    return certfile, keyfile
+
+
+def _run_transport(adapter: HTTPAdapter, server: _LocalTlsServer, certfile: str,
+                   total: int, concurrency: int) -> tuple:
+    """以共用 session 平行送出 total 個請求；回傳 (各請求延遲, 總秒數, 內容是否正確)"""
+    session = requests.Session()
+    session.mount("https://", adapter)
+    url = f"https://127.0.0.1:{server.port}/elearn/courserecord/index.php"
+
+    def fetch(_) -> tuple:
+        start = time.perf_counter()
+        response = session.get(url, verify=certfile, timeout=30)
+        return time.perf_counter() - start, response.content == server.body
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(fetch, range(total)))
+    seconds = time.perf_counter() - start
+    session.close()
+    return [latency for latency, _ in results], seconds, all(ok for _, ok in results)
+
+
+def bench_http2(args: argparse.Namespace) -> int:
+    """在本機 TLS 伺服器上比較 HTTP/1.1 連線池與 HTTP/2 多工的連線數與延遲"""
+    if not http2.available():
+        print("錯誤: 需要安裝 httpx[http2] 套件 (pip install \"httpx[http2]\")")
+        return 1
+
+    body = corpus.courserecord_page(random.Random(args.seed), 10).encode("utf-8")
+    transports = [
+        ("HTTP/1.1 (urllib3 連線池)", lambda: HTTPAdapter(pool_maxsize=args.pool_size)),
+        ("HTTP/2 (httpx 多工)", lambda: http2.Http2Adapter(transports={})),
+    ]
+    failures = 0
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            certfile, keyfile = _self_signed_cert(directory)
+        except (OSError, subprocess.CalledProcessError) as e:
+            print(f"錯誤: 無法以 openssl 產生測試憑證: {e}")
+            return 1
+
+        print(f"請求數: {args.requests}  並行數: {args.concurrency}  伺服器延遲: {args.delay:.0f} ms  "
+              f"頁面大小: {len(body) / 1024:.1f} KB")
+        for label, make_adapter in transports:
+            with _LocalTlsServer(certfile, keyfile, body, args.delay / 1000) as server:
+                latencies, seconds, correct = _run_transport(make_adapter(), server, certfile,
+                                                             args.requests, args.concurrency)
+            latencies.sort()
+            p95 = latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)]
+            connections = ", ".join(f"{protocol} {count}" for protocol, count in server.connections.items())
+            print(f"{label:<26} 連線 {sum(server.connections.values()):>4} ({connections})  "
+                  f"總計 {seconds:6.2f} 秒  {args.requests / seconds:7.1f} 請求/秒  "
+                  f"平均 {statistics.mean(latencies) * 1000:6.1f} ms  p95 {p95 * 1000:6.1f} ms")
+            if not correct:
+                print(f"[錯誤] {label}: 回應內容與伺服器送出的不一致")
+                failures += 1
+    return 1 if failures else 0
+
+
+BASELINE_FILE = "bench_baseline.json"
+# 每次量測至少累積的秒數、量測輪數與容許的變慢倍數 (中位數在重複執行間的差異約在 ±20% 內)
+MIN_SAMPLE_SECONDS = 0.05
+REGRESS_ROUNDS = 5
+REGRESS_TOLERANCE = 2.0
+
+
+class _FixtureSession:
+    """以固定頁面回應 GET 的假 session (供 _resolve_scorm_launch 使用)"""
+
+    def __init__(self, pages: Dict[str, str]):
+        self.pages = pages
+
+    def get(self, url: str, **kwargs):
+        return type("FixtureResponse", (), {"text": self.pages[url], "url": url})()
+
+
+def _digest(value: Any) -> str:
+    """解析結果的穩定摘要 (dataclass 轉為 dict 後以 JSON 序列化)"""
+    def plain(obj):
+        if dataclasses.is_dataclass(obj):
+            return dataclasses.asdict(obj)
+        raise TypeError(type(obj).__name__)
+    text = json.dumps(value, default=plain, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _regress_suites(seed: int) -> Dict[str, tuple]:
+    """實際流程使用的各解析器的 (函式, 輸入)"""
+    fixtures = corpus.build_corpus(seed)
+    launch_pages = {f"{corpus.AP_BASE}/elearn/mod/scorm/view.php?id={i}": page
+                    for i, page in enumerate(fixtures["scorm_view"])}
+    session = _FixtureSession(launch_pages)
+
+    def duration(value):
+        _parse_minutes.cache_clear()
+        return parse_time_to_minutes(value)
+
+    return {
+        "extract_course_info_from_html": (extract_course_info_from_html, fixtures["courserecord"]),
+        "extract_course_detail": (extract_course_detail, fixtures["course_view"]),
+        "_resolve_scorm_launch": (lambda link: _resolve_scorm_launch(session, link), list(launch_pages)),
+        "parse_search_results": (parse_search_results, fixtures["search"]),
+        "parse_course_block": (parse_course_block, fixtures["incomplete_block"]),
+        "parse_time_to_minutes": (duration, fixtures["duration"]),
+    }
+
+
+def _calibration_work(text: str) -> int:
+    """與解析器相近的純 Python 工作 (正規表示式掃描 + dict 計數)，用來換算機器速度"""
+    counts: Dict[str, int] = {}
+    for word in re.findall(r"\w+", text):
+        counts[word] = counts.get(word, 0) + 1
+    return len(counts)
+
+
+def _sample_ms(func: Callable, items: Sequence) -> float:
+    """重複執行整份語料直到累積 MIN_SAMPLE_SECONDS，回傳每筆的平均耗時 (毫秒)；
+    語料很小的解析器也不會只量到計時器的誤差"""
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        for item in items:
+            func(item)
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_SAMPLE_SECONDS:
+            return elapsed / (runs * max(len(items), 1)) * 1000
+
+
+def _measure_suites(seed: int, rounds: int) -> Tuple[float, Dict[str, Dict[str, float]]]:
+    """每一輪先量校準迴圈再量各解析器，以同一輪的校準值換算相對速度；回傳各項多輪的中位數"""
+    calibration_items = corpus.build_corpus(seed)["courserecord"]
+    suites = _regress_suites(seed)
+    calibrations: List[float] = []
+    samples: Dict[str, List[Tuple[float, float]]] = {name: [] for name in suites}
+    for _ in range(rounds):
+        calibration_ms = _sample_ms(_calibration_work, calibration_items)
+        calibrations.append(calibration_ms)
+        for name, (func, items) in suites.items():
+            ms_per_item = _sample_ms(func, items)
+            samples[name].append((ms_per_item, ms_per_item / calibration_ms))
+    results = {}
+    for name, values in samples.items():
+        results[name] = {
+            "items": len(suites[name][1]),
+            "ms_per_item": round(statistics.median(ms for ms, _ in values), 4),
+            "relative": round(statistics.median(relative for _, relative in values), 3),
+        }
+    return statistics.median(calibrations), results
+
+
+def bench_regress(args: argparse.Namespace) -> int:
+    """各解析器相對於校準迴圈的速度 (多輪中位數) 比基準慢超過容許倍數時失敗"""
+    # 固定 AP 主機，避免讀到本機 ap_host.json 而改變輸出
+    ap_host._resolver = ap_host.HostResolver(file_path="")
+
+    calibration_ms, results = _measure_suites(args.seed, args.rounds)
+
+    if args.update:
+        # 解析結果摘要供 tests/test_parsers.py 比對
+        for name, (func, items) in _regress_suites(args.seed).items():
+            results[name]["digests"] = [_digest(func(item)) for item in items]
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"seed": args.seed, "calibration_ms": round(calibration_ms, 4), "suites": results},
+                      f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"校準迴圈 {calibration_ms:8.4f} ms/筆")
+        for name, result in results.items():
+            print(f"{name:<32} {result['items']:>4} 筆  {result['ms_per_item']:8.4f} ms/筆  "
+                  f"({result['relative']:7.3f} 單位)")
+        print(f"[成功] 基準已寫入 {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"錯誤: 找不到基準檔 {args.baseline} (請先以 --update 產生)")
+        return 1
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("seed") != args.seed:
+        print(f"錯誤: 基準檔的種子為 {baseline.get('seed')}，與 --seed {args.seed} 不同")
+        return 1
+
+    if "calibration_ms" not in baseline:
+        print(f"錯誤: 基準檔 {args.baseline} 沒有校準資料 (請以 --update 重新產生)")
+        return 1
+    print(f"校準迴圈 {calibration_ms:8.4f} ms/筆 (基準 {baseline['calibration_ms']:8.4f})，{args.rounds} 輪中位數")
+
+    failures = 0
+    for name, result in results.items():
+        expected = baseline["suites"].get(name)
+        if expected is None:
+            print(f"[警告] {name}: 基準檔中沒有此項目 (請以 --update 更新)")
+            continue
+        ratio = result["relative"] / max(expected["relative"], 1e-9)
+        slow = args.tolerance > 0 and ratio > args.tolerance
+        mark = "[錯誤]" if slow else "      "
+        print(f"{mark} {name:<32} {result['ms_per_item']:8.4f} ms/筆  {result['relative']:7.3f} 單位  "
+              f"(基準 {expected['relative']:7.3f}, {ratio:4.2f}x)")
+        failures += slow
+
+    if failures:
+        print(f"[錯誤] {failures} 個解析器變慢超過 {args.tolerance:g} 倍")
+        return 1
+    print("[成功] 解析器速度在容許範圍內")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parser benchmarks.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    detail = subparsers.add_parser("detail", help="Benchmark course/view.php extraction on recorded pages")
+    detail.add_argument("--archive", default=Files.RECORDINGS_DIR, help="Recording archive directory")
+    detail.add_argument("--repeat", type=int, default=5)
+    detail.set_defaults(func=bench_detail)
+
+    duration = subparsers.add_parser("duration", help="Property check and benchmark for duration parsing")
+    duration.add_argument("--samples", type=int, default=100000)
+    duration.add_argument("--seed", type=int, default=0)
+    duration.add_argument("--repeat", type=int, default=3)
+    duration.set_defaults(func=bench_duration)
+
+    fleet = subparsers.add_parser("report", help="Compare loop and vectorized fleet report on synthetic rows")
+    fleet.add_argument("--rows", type=int, default=100000)
+    fleet.add_argument("--accounts", type=int, default=500)
+    fleet.add_argument("--seed", type=int, default=0)
+    fleet.add_argument("--repeat", type=int, default=3)
+    fleet.set_defaults(func=bench_report)
+
+    blocks = subparsers.add_parser("blocks", help="Compare whole-file and mmap streaming parsing of incomplete_courses.txt")
+    blocks.add_argument("--lines", type=int, default=1000000, help="Approximate line count of the synthetic file")
+    blocks.add_argument("--top", type=int, default=20, help="Number of shortest courses to keep")
+    blocks.add_argument("--seed", type=int, default=0)
+    blocks.set_defaults(func=bench_blocks)
+
+    h2 = subparsers.add_parser("http2", help="Compare HTTP/1.1 pooling and the HTTP/2 transport on a local TLS server")
+    h2.add_argument("--requests", type=int, default=400)
+    h2.add_argument("--concurrency", type=int, default=16, help="Parallel requests sharing one session")
+    h2.add_argument("--delay", type=float, default=20.0, help="Server think time per request in ms (default: 20)")
+    h2.add_argument("--pool-size", type=int, default=10,
+                    help="urllib3 pool_maxsize for the HTTP/1.1 run (requests default: 10)")
+    h2.add_argument("--seed", type=int, default=0)
+    h2.set_defaults(func=bench_http2)
+
+    regress = subparsers.add_parser("regress", help="Compare parser speed on the fixture corpus against a baseline")
+    regress.add_argument("--baseline", default=BASELINE_FILE, help=f"Baseline file (default: {BASELINE_FILE})")
+    regress.add_argument("--update", action="store_true",
+                         help="Rewrite the baseline (speed and parser output digests) from the current parsers")
+    regress.add_argument("--tolerance", type=float, default=REGRESS_TOLERANCE,
+                         help="Fail when a parser's median speed relative to the calibration loop is this many times "
+                              f"slower than baseline; 0 disables (default: {REGRESS_TOLERANCE:g})")
+    regress.add_argument("--seed", type=int, default=0)
+    regress.add_argument("--rounds", type=int, default=REGRESS_ROUNDS,
+                         help=f"Measurement rounds; the median is compared (default: {REGRESS_ROUNDS})")
+    regress.set_defaults(func=bench_regress)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
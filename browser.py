@@ -0,0 +1,282 @@
+"""
+常駐瀏覽器控制器：透過 Chrome DevTools Protocol 維持一個 (預設 headless) Chromium
+程序，每門課只把同一個分頁導向 SCORM 播放網址，不必每次結束並重新啟動瀏覽器。
+支援 Linux 與 macOS，並回報導覽與載入耗時。
+
+用法 (供 run_all.sh 使用)：
+    python browser.py open "<網址>"   # 必要時啟動瀏覽器，載入 cookies 後開啟網址
+    python browser.py blank          # 離開課程頁 (觸發 SCORM 儲存進度)
+    python browser.py status
+    python browser.py stop
+"""
+
+import argparse
+import collections
+import itertools
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import time
+from typing import Any, Dict, Optional
+
+import requests
+
+from cookie_store import CookieStore
+
+try:
+    import websocket
+except ImportError:
+    websocket = None
+
+# DevTools 連線中斷、拒絕連線等錯誤
+CONNECTION_ERRORS = (OSError,) + ((websocket.WebSocketException,) if websocket else ())
+
+
+DEBUG_PORT = 9222
+PROFILE_DIR = ".browser-profile"
+PID_FILE = ".browser.pid"
+COOKIE_DOMAIN = ".elearning.taipei"  # 舊版 cookies.json 沒有記錄網域時使用
+STARTUP_TIMEOUT = 20
+LOAD_TIMEOUT = 60
+
+BROWSER_CANDIDATES = [
+    "chromium",
+    "chromium-browser",
+    "google-chrome",
+    "google-chrome-stable",
+    "brave-browser",
+    "brave",
+    "/Applications/Brave Browser.app/Contents/MacOS/Brave Browser",
+    "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome",
+    "/Applications/Chromium.app/Contents/MacOS/Chromium",
+]
+
+
+class BrowserError(Exception):
+    """瀏覽器控制失敗"""
+
+    pass
+
+
+def find_browser() -> str:
+    """尋找 Chromium 核心的瀏覽器執行檔 (可用 CHROME_BIN 指定)"""
+    candidates = [os.environ.get("CHROME_BIN")] + BROWSER_CANDIDATES
+    for candidate in filter(None, candidates):
+        path = shutil.which(candidate) or (candidate if os.path.exists(candidate) else None)
+        if path:
+            return path
+    raise BrowserError("找不到 Chromium / Chrome / Brave，請安裝或設定 CHROME_BIN")
+
+
+class BrowserController:
+    """以 DevTools Protocol 控制單一分頁"""
+
+    def __init__(self, port: int = DEBUG_PORT, headless: bool = True):
+        self.port = port
+        self.headless = headless
+        self.endpoint = f"http://127.0.0.1:{port}"
+        self._ws = None
+        self._ids = itertools.count(1)
+        self._events: collections.deque = collections.deque()
+
+    def is_running(self) -> bool:
+        try:
+            requests.get(f"{self.endpoint}/json/version", timeout=1)
+            return True
+        except requests.RequestException:
+            return False
+
+    def ensure_running(self) -> bool:
+        """確保瀏覽器已啟動，回傳是否為本次新啟動"""
+        if self.is_running():
+            return False
+
+        args = [
+            find_browser(),
+            f"--remote-debugging-port={self.port}",
+            f"--user-data-dir={os.path.abspath(PROFILE_DIR)}",
+            "--no-first-run",
+            "--no-default-browser-check",
+            "--disable-session-crashed-bubble",
+            "--hide-crash-restore-bubble",
+            "--autoplay-policy=no-user-gesture-required",
+            "--mute-audio",
+            "about:blank",
+        ]
+        if self.headless:
+            args.insert(1, "--headless=new")
+
+        proc = subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                start_new_session=True)
+        with open(PID_FILE, "w") as f:
+            f.write(str(proc.pid))
+
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.is_running():
+                return True
+            time.sleep(0.2)
+        raise BrowserError("瀏覽器啟動逾時")
+
+    def _page_ws_url(self) -> str:
+        """取得 (或建立) 唯一的分頁"""
+        targets = requests.get(f"{self.endpoint}/json/list", timeout=5).json()
+        pages = [t for t in targets if t.get("type") == "page"]
+        if pages:
+            # 只保留一個分頁，確保只開啟目前的課堂頁面
+            for extra in pages[1:]:
+                requests.get(f"{self.endpoint}/json/close/{extra['id']}", timeout=5)
+            return pages[0]["webSocketDebuggerUrl"]
+        target = requests.put(f"{self.endpoint}/json/new?about:blank", timeout=5).json()
+        return target["webSocketDebuggerUrl"]
+
+    def connect(self) -> None:
+        if websocket is None:
+            raise BrowserError("需要安裝 websocket-client 套件 (pip install websocket-client)")
+        self._ws = websocket.create_connection(self._page_ws_url(), timeout=LOAD_TIMEOUT)
+
+    def close(self) -> None:
+        if self._ws:
+            self._ws.close()
+            self._ws = None
+
+    def send(self, method: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """送出 CDP 指令並等待對應的回應；期間收到的事件排入佇列供 wait_event 使用"""
+        message_id = next(self._ids)
+        self._ws.send(json.dumps({"id": message_id, "method": method, "params": params or {}}))
+        while True:
+            message = json.loads(self._ws.recv())
+            if message.get("id") == message_id:
+                if "error" in message:
+                    raise BrowserError(f"{method}: {message['error'].get('message')}")
+                return message.get("result", {})
+            if "method" in message:
+                self._events.append(message)
+
+    def wait_event(self, method: str, timeout: float = LOAD_TIMEOUT) -> Dict[str, Any]:
+        """等待指定事件 (包含 send 等待回應時已收到的事件)"""
+        while self._events:
+            message = self._events.popleft()
+            if message.get("method") == method:
+                return message.get("params", {})
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            self._ws.settimeout(max(deadline - time.monotonic(), 0.1))
+            try:
+                message = json.loads(self._ws.recv())
+            except websocket.WebSocketTimeoutException:
+                break
+            if message.get("method") == method:
+                return message.get("params", {})
+        raise BrowserError(f"等待 {method} 逾時")
+
+    def load_cookies(self) -> int:
+        """把共用 cookies.json 的 session 依原本的網域載入瀏覽器
+
+        入口網站的 cookie 與 AP 主機 (ap1/ap2) 的 MoodleSession 各自設在所屬網域；
+        只屬於單一主機的 cookie (網域不以 . 開頭) 以 url 設定，瀏覽器才不會送往其他子網域。
+        """
+        _, cookies = CookieStore().read()
+        params = []
+        for cookie in cookies:
+            param = {"name": cookie.name, "value": cookie.value, "path": cookie.path or "/", "secure": True}
+            domain = cookie.domain or COOKIE_DOMAIN
+            if domain.startswith("."):
+                param["domain"] = domain
+            else:
+                param["url"] = f"https://{domain}{param['path']}"
+            if cookie.expires:
+                param["expires"] = cookie.expires
+            params.append(param)
+        if params:
+            self.send("Network.setCookies", {"cookies": params})
+        return len(params)
+
+    def navigate(self, url: str) -> Dict[str, Optional[float]]:
+        """導覽至網址並等待載入完成，回傳耗時 (毫秒)
+
+        導覽送出後分頁已經在目標網址上，等待載入事件逾時只回報 load_ms 為 None 而不視為失敗，
+        避免呼叫端改用其他瀏覽器再開一次同一門課 (兩個同時進行的上課 session)。
+        """
+        self.send("Page.enable")
+        # 只等待這次導覽的載入事件，先前的事件不算
+        self._events.clear()
+        start = time.perf_counter()
+        result = self.send("Page.navigate", {"url": url})
+        if result.get("errorText"):
+            raise BrowserError(f"導覽失敗: {result['errorText']}")
+        committed = time.perf_counter()
+        try:
+            self.wait_event("Page.loadEventFired")
+        except (BrowserError,) + CONNECTION_ERRORS:
+            load_ms = None
+        else:
+            load_ms = round((time.perf_counter() - start) * 1000, 1)
+        return {"navigate_ms": round((committed - start) * 1000, 1), "load_ms": load_ms}
+
+    def stop(self) -> bool:
+        """結束由本控制器啟動的瀏覽器"""
+        if not os.path.exists(PID_FILE):
+            return False
+        with open(PID_FILE, "r") as f:
+            pid = int(f.read().strip() or 0)
+        os.remove(PID_FILE)
+        try:
+            os.killpg(pid, signal.SIGTERM)
+        except (ProcessLookupError, PermissionError):
+            return False
+        return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Persistent browser controller (Chrome DevTools Protocol).")
+    parser.add_argument("--port", type=int, default=DEBUG_PORT)
+    parser.add_argument("--headed", action="store_true", help="Show the browser window instead of running headless")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    open_parser = subparsers.add_parser("open", help="Navigate the single tab to URL")
+    open_parser.add_argument("url")
+    subparsers.add_parser("blank", help="Navigate away from the course page")
+    subparsers.add_parser("status", help="Show whether the browser is running")
+    subparsers.add_parser("stop", help="Stop the browser started by this controller")
+    args = parser.parse_args()
+
+    controller = BrowserController(port=args.port, headless=not args.headed)
+
+    try:
+        if args.command == "status":
+            print("執行中" if controller.is_running() else "未執行")
+            return
+        if args.command == "stop":
+            print("已結束瀏覽器" if controller.stop() else "沒有由控制器啟動的瀏覽器")
+            return
+
+        if args.command == "blank" and not controller.is_running():
+            # 沒有執行中的瀏覽器就沒有課程頁需要離開，不為了空白頁啟動瀏覽器
+            return
+
+        launch_start = time.perf_counter()
+        launched = controller.ensure_running()
+        launch_ms = (time.perf_counter() - launch_start) * 1000
+        controller.connect()
+        try:
+            if args.command == "open":
+                cookie_count = controller.load_cookies()
+                timings = controller.navigate(args.url)
+                prefix = f"啟動 {launch_ms:.0f} ms，" if launched else ""
+                print(f"[資訊] {prefix}載入 {cookie_count} 個 cookies，導覽 {timings['navigate_ms']:.0f} ms，"
+                      + (f"載入完成 {timings['load_ms']:.0f} ms" if timings["load_ms"] is not None
+                         else "等待載入完成逾時 (課程頁已開啟)"))
+            elif args.command == "blank":
+                controller.navigate("about:blank")
+        finally:
+            controller.close()
+    except (BrowserError, requests.RequestException) + CONNECTION_ERRORS as e:
+        print(f"[錯誤] 瀏覽器控制失敗: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+各執行入口共用的命令列參數與執行環境設定
+"""
+
+import argparse
+import os
+import sys
+from contextlib import contextmanager
+from typing import Iterator
+
+import ap_host
+import export
+import http2
+import http_cache
+import logs
+import loop_status
+import metrics
+import prewarm
+import recorder
+from profiling import Profiler
+from utils import Files
+
+
+def build_parser(description: str) -> argparse.ArgumentParser:
+    """建立帶有共用選項的參數解析器"""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--metrics", metavar="DIR", nargs="?", const=".", default=None,
+                        help="Write per-stage HTTP metrics (metrics.json / metrics.prom) to DIR")
+    parser.add_argument("--profile", metavar="DIR", nargs="?", const="profile", default=None,
+                        help="Profile each stage with cProfile/tracemalloc and write a report to DIR")
+    parser.add_argument("--record", metavar="DIR", nargs="?", const=Files.RECORDINGS_DIR, default=None,
+                        help="Record every HTTP request/response into a compressed archive in DIR")
+    parser.add_argument("--no-http-cache", action="store_true",
+                        help=f"Disable the conditional-request HTTP cache ({Files.HTTP_CACHE_DIR}/)")
+    parser.add_argument("--http2", action="store_true", default=http2.DEFAULT_ENABLED,
+                        help="Send HTTPS requests over a multiplexed HTTP/2 connection per host "
+                             "(requires httpx[http2]; default: off or $ELEARNING_HTTP2=1)")
+    parser.add_argument("--no-prewarm", action="store_true",
+                        help="Do not pre-connect (DNS + TLS) to the portal and AP host while loading config and cookies")
+    parser.add_argument("--log-level", choices=logs.LEVELS, type=str.upper, default=logs.DEFAULT_LEVEL,
+                        help="Log level for progress messages; DEBUG shows per-page and per-row detail "
+                             "(default: INFO or $ELEARNING_LOG_LEVEL)")
+    parser.add_argument("--log-format", choices=logs.FORMATS, default=logs.DEFAULT_FORMAT,
+                        help="Log output on stderr as human-readable text or JSON lines "
+                             "(default: human or $ELEARNING_LOG_FORMAT)")
+    return parser
+
+
+def add_export_option(parser: argparse.ArgumentParser) -> None:
+    """加入 --export：把解析出的課程列匯出為 JSON Lines / CSV / Parquet / Arrow"""
+    parser.add_argument("--export", metavar="PATH", nargs="?", const=Files.COURSE_EXPORT, default=None,
+                        help="Export parsed course rows to PATH (.jsonl/.csv/.parquet/.arrow, "
+                             f"default: {Files.COURSE_EXPORT})")
+
+
+def export_courses(path: str, records) -> None:
+    """串流寫出課程紀錄並回報筆數"""
+    try:
+        count = export.export_records(records, path)
+    except (OSError, ValueError) as e:
+        print(f"[錯誤] 匯出課程紀錄失敗: {e}")
+        return
+    print(f"[資訊] 已匯出 {count} 筆課程紀錄至 {path}")
+
+
+@contextmanager
+def run_context(args: argparse.Namespace) -> Iterator[None]:
+    """依照共用選項啟用量測等功能，結束時 (包含 exit) 輸出結果"""
+    http_cache.enabled = not args.no_http_cache
+    http2.enabled = args.http2
+    prewarm.enabled = not args.no_prewarm
+    logs.setup(args.log_level, args.log_format)
+    profiler = None
+    if args.profile is not None:
+        profiler = Profiler(args.profile)
+        profiler.start()
+    if args.record is not None:
+        recorder.start(args.record)
+
+    try:
+        yield
+    finally:
+        # 保存本次學到的 AP 主機與 JS 跳轉目標
+        ap_host.save()
+        # run_all.sh 執行中時，把本次的請求數累加到上課迴圈狀態
+        loop_status.add_requests(os.path.basename(sys.argv[0]), metrics.registry.request_count())
+        if recorder.active:
+            print(f"[資訊] 已錄製 {recorder.active.records} 筆請求至 {args.record}")
+            recorder.stop()
+        if profiler:
+            profiler.stop()
+            report_path = profiler.write_report()
+            print(f"[資訊] 效能分析報告已輸出至 {report_path}")
+        if args.metrics is not None:
+            metrics.registry.print_summary()
+            http_cache.print_summary()
+            metrics.registry.export(args.metrics)
+            print(f"[資訊] 請求統計已輸出至 {args.metrics}")
+        logs.shutdown()
@@ -0,0 +1,134 @@
+"""
+跨程序共用的 Cookie 儲存：以檔案鎖保護寫入，並以 generation 計數器判斷
+其他程序是否已經重新登入，讓同時執行的腳本共用同一個 session。
+
+每個 cookie 連同網域與路徑一起保存：入口網站 (elearning.taipei) 的登入 cookie
+與 AP 主機 (ap1/ap2) 的 MoodleSession 分屬不同網域，輪詢與瀏覽器都需要後者。
+登入 (新的 generation) 時記錄 created_at；之後以同一 generation 寫回 cookie 時保留原值，
+因此 created_at 即目前 session 的登入時間 (檔案的修改時間則是最後一次寫回的時間)。
+"""
+
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from http.cookiejar import CookieJar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from requests.cookies import RequestsCookieJar, cookiejar_from_dict, create_cookie
+
+from utils import Files, file_lock
+
+
+def _cookie_to_dict(cookie) -> Dict[str, Any]:
+    return {
+        "name": cookie.name,
+        "value": cookie.value,
+        "domain": cookie.domain,
+        "path": cookie.path,
+        "secure": cookie.secure,
+        "expires": cookie.expires,
+    }
+
+
+def _jar_from_data(cookies: Any) -> RequestsCookieJar:
+    """由檔案內容建立 cookie jar；舊版 {name: value} 格式沒有網域，會送往所有主機"""
+    if isinstance(cookies, dict):
+        return cookiejar_from_dict(cookies)
+    jar = RequestsCookieJar()
+    for item in cookies:
+        jar.set_cookie(create_cookie(**item))
+    return jar
+
+
+class CookieStore:
+    """檔案型 cookie 儲存
+
+    檔案格式為 {"generation": n, "created_at": 登入時間, "cookies": [{"name", "value", "domain", "path", ...}, ...]}；
+    舊版的 {"generation": n, "cookies": {name: value}} 與只有 cookies 的 dict 仍可讀取
+    (後者視為 generation 0)。
+    """
+
+    def __init__(self, path: str = Files.COOKIES):
+        self.path = path
+        self.lock_path = path + ".lock"
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """取得排他鎖；在鎖內進行登入，確保同時間只有一個程序重新登入"""
+        with file_lock(self.lock_path):
+            yield
+
+    def _load(self) -> Any:
+        with open(self.path, "r") as f:
+            return json.load(f)
+
+    def read(self) -> Tuple[int, RequestsCookieJar]:
+        """讀取 (generation, cookies)；檔案不存在或損毀時回傳 (0, 空的 jar)
+
+        寫入皆為原子性取代，因此讀取不需要上鎖。
+        """
+        if not os.path.exists(self.path):
+            return 0, RequestsCookieJar()
+        try:
+            data = self._load()
+            if isinstance(data, dict) and "cookies" in data and "generation" in data:
+                return int(data["generation"]), _jar_from_data(data["cookies"])
+            if isinstance(data, dict):
+                return 0, _jar_from_data(data)
+        except (OSError, ValueError, TypeError) as e:
+            print(f"[警告] 載入 Cookies 失敗: {e}")
+        return 0, RequestsCookieJar()
+
+    def created_at(self) -> Optional[float]:
+        """目前 session 的登入時間；檔案不存在或為舊版格式時回傳 None"""
+        try:
+            data = self._load()
+            return float(data["created_at"])
+        except (OSError, ValueError, TypeError, KeyError):
+            return None
+
+    def _created_at_for(self, generation: int) -> float:
+        """同一 generation 沿用原本的登入時間，新的 generation 記錄目前時間"""
+        try:
+            data = self._load()
+            if int(data["generation"]) == generation:
+                return float(data["created_at"])
+        except (OSError, ValueError, TypeError, KeyError):
+            pass
+        return time.time()
+
+    def write(self, cookies: CookieJar, generation: int) -> None:
+        """以暫存檔 + os.replace 原子性寫入 (呼叫端應持有 locked())"""
+        records: List[Dict[str, Any]] = [_cookie_to_dict(cookie) for cookie in cookies]
+        created_at = self._created_at_for(generation)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".cookies-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"generation": generation, "created_at": created_at, "cookies": records}, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def update(self, cookies: CookieJar, generation: int) -> bool:
+        """以相同 generation 寫回新增的 cookie (例如 SSO 後 AP 主機的 MoodleSession)；
+        其他程序已重新登入時不覆寫，回傳是否已寫入"""
+        with self.locked():
+            current, _ = self.read()
+            if current != generation:
+                return False
+            self.write(cookies, generation)
+            return True
+
+    def invalidate(self, generation: int) -> bool:
+        """若檔案仍是指定的 generation 則刪除；其他程序已更新時保留"""
+        with self.locked():
+            current, _ = self.read()
+            if current != generation or not os.path.exists(self.path):
+                return False
+            os.remove(self.path)
+            return True
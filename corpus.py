@@ -0,0 +1,166 @@
+"""
+解析器測試語料：以固定種子產生與平台頁面結構相同的 HTML / 文字，
+涵蓋學習紀錄表格 (data-column 與依欄位順序兩種版面)、課程頁 (course/view.php)、
+SCORM 頁 (表單與連結兩種「進入」按鈕)、課程搜尋頁 (view_type_list)、
+incomplete_courses.txt 區塊與時間字串。供 bench.py regress 使用。
+"""
+
+import random
+from typing import Dict, List
+
+AP_BASE = "https://ap1.elearning.taipei"
+
+_COURSE_NAMES = [
+    "性別主流化基礎課程", "資訊安全通識", "個人資料保護法實務", "行政中立",
+    "廉政倫理與案例解析", "環境教育：淨零轉型", "人權大步走", "公務倫理",
+    "防制職場霸凌", "政府採購法入門", "CEDAW 概論", "身心障礙者權益公約",
+]
+_STATUSES = ["未完成", "進行中", "已完成", "完成"]
+
+_PAGE_HEAD = """<!DOCTYPE html>
+<html lang="zh-tw"><head><meta charset="utf-8"><title>{title}</title>
+<style>.progress-bar{{width:45%}} .badge:after{{content:"100%"}}</style>
+<script>var M = {{cfg: {{wwwroot: "{base}", sesskey: "aBcD1234"}}}}; var updated = "2023-01-01 00:00";</script>
+</head><body>
+<header id="page-header"><nav><a href="/mpage/">首頁</a> <a href="/login/logout.php">登出</a> 完成度 100%</nav></header>
+"""
+_PAGE_FOOT = """<footer id="page-footer"><p>最後更新 2020-02-02 12:00 系統狀態：完成</p>
+<script>window.setTimeout(function(){{}}, 1000);</script></footer></body></html>"""
+
+
+def _hours(rng: random.Random) -> str:
+    return rng.choice(["1", "1.5", "2", "3", "4", "6"])
+
+
+def _study_time(rng: random.Random) -> str:
+    hours, minutes = rng.randrange(0, 4), rng.randrange(0, 60)
+    return rng.choice([f"{hours}小時{minutes}分", f"{minutes}分", f"{hours}時{minutes}分", ""])
+
+
+def courserecord_page(rng: random.Random, rows: int, positional: bool = False) -> str:
+    """學習紀錄 (courserecord/index.php) 分頁"""
+    body = []
+    for i in range(rows):
+        course_id = rng.randrange(1000, 99999)
+        name = rng.choice(_COURSE_NAMES)
+        href = f"/elearn/course/view.php?id={course_id}" if rng.random() < 0.7 \
+            else f"{AP_BASE}/elearn/course/view.php?id={course_id}"
+        cells = [
+            ("序號", str(i + 1)),
+            ("課程名稱", f'<a href="{href}" title="{name}">{name}</a>'),
+            ("認證時數", _hours(rng)),
+            ("修課時間", _study_time(rng)),
+            ("課程完成與否", f'<span class="badge">{rng.choice(_STATUSES)}</span>'),
+        ]
+        if positional:
+            tds = "".join(f"<td>{value}</td>" for _, value in cells)
+        else:
+            tds = "".join(f'<td data-column="{column}">{value}</td>' for column, value in cells)
+        body.append(f"<tr>{tds}</tr>")
+    tbody_class = "" if positional else ' class="table__tbody"'
+    pages = "".join(f'<a class="paginate-page" data-page="{n}">{n}</a>' for n in range(1, 4))
+    return (_PAGE_HEAD.format(title="學習紀錄", base=AP_BASE)
+            + '<div id="region-main"><form><input type="hidden" name="sesskey" value="aBcD1234"></form>'
+            + '<table id="applySelection" class="table"><thead><tr><th>序號</th><th>課程名稱</th>'
+            + "<th>認證時數</th><th>修課時間</th><th>課程完成與否</th></tr></thead>"
+            + f"<tbody{tbody_class}>{''.join(body)}</tbody></table>"
+            + f'<div class="pagination">{pages}</div></div>'
+            + _PAGE_FOOT.format())
+
+
+def course_view_page(rng: random.Random) -> str:
+    """課程頁 (course/view.php)：進度、完成條件、上課時間與 SCORM 連結"""
+    scorm_id = rng.randrange(10000, 99999)
+    variant = rng.randrange(4)
+    parts = ['<div id="region-main" role="main"><h2>課程內容</h2>']
+    if variant in (0, 1):
+        parts.append(f'<div class="progress"><span>{rng.choice([0, 35, 80, 100])}%</span></div>')
+    elif variant == 2:
+        parts.append("<p>狀態：進行中</p>")
+    else:
+        parts.append("<p>狀態：已完成</p>")
+    if rng.random() < 0.7:
+        parts.append(f"<p>完成條件為：閱讀時間達{rng.choice([30, 60, 90, 120])}分鐘以上</p>")
+    for _ in range(rng.randrange(0, 4)):
+        parts.append(f"<li>上課紀錄 2024-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d} "
+                     f"{rng.randrange(24):02d}:{rng.randrange(60):02d}</li>")
+    launch = rng.randrange(3)
+    if launch == 0:
+        parts.append(f'<a class="aalink" href="/elearn/mod/scorm/view.php?id={scorm_id}">數位課程</a>')
+    elif launch == 1:
+        parts.append(f'<a href="{AP_BASE}/elearn/mod/scorm/view.php?id={scorm_id}&amp;lang=zh">數位課程</a>')
+    else:
+        parts.append(f'<div data-url="{AP_BASE}/elearn/mod/scorm/view.php?id={scorm_id}"></div>')
+    parts.append("</div>")
+    return _PAGE_HEAD.format(title="課程", base=AP_BASE) + "".join(parts) + _PAGE_FOOT.format()
+
+
+def scorm_view_page(rng: random.Random) -> str:
+    """SCORM 頁：表單或連結形式的「進入」按鈕"""
+    scorm_id = rng.randrange(10000, 99999)
+    launcher = rng.randrange(3)
+    if launcher == 0:
+        button = (f'<form id="scormviewform" method="post" action="{AP_BASE}/elearn/mod/scorm/player.php">'
+                  f'<input type="hidden" name="mode" value="normal">'
+                  f'<input type="hidden" name="scoid" value="{rng.randrange(100, 999)}">'
+                  f'<input type="hidden" name="cm" value="{scorm_id}">'
+                  f'<input type="hidden" name="currentorg" value="">'
+                  f'<input type="submit" value="進入"></form>')
+    elif launcher == 1:
+        button = (f'<a class="btn" href="/elearn/mod/scorm/player.php?a={scorm_id}&scoid=1">'
+                  f'<span>開始上課 Enter</span></a>')
+    else:
+        button = f'<p>請由<a href="player.php?cm={scorm_id}">這裡</a>播放</p>'
+    return (_PAGE_HEAD.format(title="SCORM", base=AP_BASE)
+            + f'<div id="region-main" role="main"><h2>數位課程</h2>{button}</div>'
+            + _PAGE_FOOT.format())
+
+
+def search_page(rng: random.Random, blocks: int) -> str:
+    """課程搜尋頁 (mpage/view_type_list)"""
+    items = []
+    for _ in range(blocks):
+        course_id = rng.randrange(1000, 99999)
+        name = rng.choice(_COURSE_NAMES)
+        label = "已報名" if rng.random() < 0.3 else "我要報名"
+        items.append(
+            '<div class="col-12 md:col-6 xl:col-4"><div class="card">'
+            f'<h2 class="card-title"><a href="/mpage/courseinfo?v={course_id}">{name}</a></h2>'
+            f'<span class="badge bg-blue-500">認證時數 {_hours(rng)} 小時</span>'
+            f'<button type="button" class="btn btn-black" onclick="location.href=\'so.php?v={course_id}\'">{label}</button>'
+            "</div></div>")
+    return ('<html><body><form><input type="hidden" name="_token" value="tok123"></form>'
+            f'<div class="grid">{"".join(items)}</div></body></html>')
+
+
+def incomplete_block(rng: random.Random, number: int) -> str:
+    """get_course.py 輸出的 incomplete_courses.txt 課程區塊"""
+    lines = [f"{number}. {rng.choice(_COURSE_NAMES)}", f"   認證時數: {_hours(rng)}"]
+    if rng.random() < 0.5:
+        lines.append(f"   完成條件為：閱讀時間達{rng.choice([30, 60, 90])}分鐘以上")
+    study = _study_time(rng)
+    if study:
+        lines.append(f"   修課時間: {study}")
+    lines.append(f"   進度: {rng.choice([0, 40])}%")
+    lines.append(f"   連結: {AP_BASE}/elearn/mod/scorm/player.php?a={rng.randrange(1000, 9999)}&scoid=1")
+    return "\n".join(lines) + "\n"
+
+
+def durations(rng: random.Random, count: int) -> List[str]:
+    choices = ["1小時30分", "40分", "2時", "1.5", "閱讀時間達90分鐘以上", "0分", "", "3",
+               "完成條件為：閱讀時間達120分鐘以上", " 2小時 5分 "]
+    return [rng.choice(choices) if rng.random() < 0.5 else _study_time(rng) for _ in range(count)]
+
+
+def build_corpus(seed: int = 0) -> Dict[str, List[str]]:
+    """依種子產生完整語料 (同一個種子永遠得到相同內容)"""
+    rng = random.Random(seed)
+    return {
+        "courserecord": ([courserecord_page(rng, 10) for _ in range(8)]
+                         + [courserecord_page(rng, 10, positional=True) for _ in range(4)]),
+        "course_view": [course_view_page(rng) for _ in range(40)],
+        "scorm_view": [scorm_view_page(rng) for _ in range(24)],
+        "search": [search_page(rng, 12) for _ in range(6)],
+        "incomplete_block": [incomplete_block(rng, i) for i in range(1, 41)],
+        "duration": durations(rng, 500),
+    }
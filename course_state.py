@@ -0,0 +1,95 @@
+"""
+未完成課程的狀態檔：記錄每門課所在的學習紀錄分頁、修課時間與剩餘分鐘數，
+讓單一課程的進度輪詢只需重新讀取一頁，不必重跑整個流程。
+"""
+
+import json
+import os
+import re
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Optional
+
+import ap_host
+import logs
+from utils import Files, parse_time_to_minutes, target_minutes
+
+
+_COURSE_ID_RE = re.compile(r"[?&]id=(\d+)")
+
+logger = logs.get_logger(__name__)
+
+
+@dataclass
+class CourseState:
+    course_id: str
+    name: str
+    link: str
+    study_link: str
+    hours: str = ""
+    study_time: str = ""
+    required_time_str: Optional[str] = None
+    record_page: int = 1
+    remaining_min: int = 0
+    updated_at: float = field(default_factory=time.time)
+
+    def update_study_time(self, study_time: str) -> int:
+        """更新修課時間並重新計算剩餘分鐘數"""
+        self.study_time = study_time
+        self.remaining_min = max(
+            target_minutes(self.hours, self.required_time_str) - parse_time_to_minutes(study_time), 0)
+        self.updated_at = time.time()
+        return self.remaining_min
+
+
+@dataclass
+class CourseStateFile:
+    course_list_url: str = ""
+    courses: Dict[str, CourseState] = field(default_factory=dict)
+
+    def find_by_link(self, url: str) -> Optional[CourseState]:
+        """以上課連結 (SCORM 或課程頁) 或課程 ID 找出課程 (不分 AP 主機)"""
+        rewrite = ap_host.current().rewrite
+        url = rewrite(url)
+        for state in self.courses.values():
+            if url in (rewrite(state.study_link), rewrite(state.link), state.course_id):
+                return state
+        course_id = course_id_from_link(url)
+        return self.courses.get(course_id) if course_id else None
+
+
+def course_id_from_link(link: Optional[str]) -> Optional[str]:
+    """從 course/view.php?id=123 這類連結取出課程 ID"""
+    if not link:
+        return None
+    match = _COURSE_ID_RE.search(link)
+    return match.group(1) if match else None
+
+
+def load_state(file_path: str = Files.COURSE_STATE) -> CourseStateFile:
+    """讀取狀態檔；檔案損毀時回傳空的狀態 (輪詢會要求重新執行完整流程)"""
+    if not os.path.exists(file_path):
+        return CourseStateFile()
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return CourseStateFile(
+            course_list_url=data.get("course_list_url", ""),
+            courses={cid: CourseState(**entry) for cid, entry in data.get("courses", {}).items()},
+        )
+    except (OSError, ValueError, TypeError, AttributeError) as e:
+        logger.warning("無法讀取 %s (%s)，視為沒有課程狀態", file_path, e)
+        return CourseStateFile()
+
+
+def save_state(state: CourseStateFile, file_path: str = Files.COURSE_STATE) -> None:
+    """以暫存檔 + os.replace 原子性寫入"""
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".course-state-")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump({
+            "course_list_url": state.course_list_url,
+            "courses": {cid: asdict(entry) for cid, entry in state.courses.items()},
+        }, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, file_path)
@@ -1,29 +1,42 @@
-import requests
 from bs4 import BeautifulSoup
-from get_course import load_config, load_cookies, is_session_valid, login_and_get_session
+import ap_host
+import cli
+import export
+import logs
+import metrics
+import prewarm
+from get_course import URLs, create_session, load_config, get_logged_in_session, log_redirect_history
 import re
-import argparse
 import time
 
+logger = logs.get_logger(__name__)
+
+
+def get_enrolled_courses(session, max_pages=50):
+    """Get all enrolled courses from ALL pages using robust pagination.
+
+    max_pages 可限制讀取頁數。
+    """
+    with metrics.stage("sso"):
+        resolver, detected_base, course_list_url, initial_response = _open_course_list(session)
+    with metrics.stage("pagination"):
+        return _read_record_pages(session, resolver, detected_base, course_list_url,
+                                  initial_response, max_pages)
 
-def get_enrolled_courses(session):
-    """Get all enrolled courses from ALL pages using robust pagination."""
-    sso_url = "https://elearning.taipei/mpage/sso_moodle?redirectPage=courserecord"
-    course_list_url = "https://ap1.elearning.taipei/elearn/courserecord/index.php"
 
-    print(f"[資訊] 存取 SSO: {sso_url}")
+def _open_course_list(session):
+    """SSO 進入學習紀錄頁，回傳 (resolver, AP 網域, 學習紀錄網址, 第 1 頁回應)"""
+    sso_url = "https://elearning.taipei/mpage/sso_moodle?redirectPage=courserecord"
+    logger.info("存取 SSO: %s", sso_url)
     sso_response = session.get(sso_url, allow_redirects=True)
+    log_redirect_history(sso_response)
 
-    print("   [除錯] SSO Redirect History:")
-    for history_resp in sso_response.history:
-        print(f"   -> {history_resp.status_code} {history_resp.url}")
-    print(f"   -> {sso_response.status_code} {sso_response.url}")
 
-    # 動態提取目前使用的 AP 網域
-    from urllib.parse import urlparse
-    parsed_url = urlparse(sso_response.url)
-    detected_base = f"{parsed_url.scheme}://{parsed_url.netloc}"
-    print(f"[資訊] 偵測到目前網域: {detected_base}")
+    # 動態提取目前使用的 AP 網域 (由 ap_host 記錄，供後續改寫連結)
+    resolver = ap_host.current()
+    resolver.learn(sso_response.url)
+    detected_base = resolver.base
+    logger.info("偵測到目前網域: %s", detected_base)
 
     # 更新後續使用的網址
     course_list_url = f"{detected_base}/elearn/courserecord/index.php"
@@ -35,16 +48,16 @@ def get_enrolled_courses(session):
     # Check if SSO landed us on the correct page
     initial_response = None
     if is_course_list_page(sso_response.text):
-        print("[成功] SSO 直接跳轉至課程列表頁面!")
+        logger.info("SSO 直接跳轉至課程列表頁面")
         initial_response = sso_response
     else:
-        print("[資訊] SSO 未直接跳轉至課程列表，嘗試手動存取...")
+        logger.info("SSO 未直接跳轉至課程列表，嘗試手動存取...")
         resp = session.get(course_list_url)
         if is_course_list_page(resp.text):
-            print("[成功] 手動存取課程列表成功!")
+            logger.info("手動存取課程列表成功")
             initial_response = resp
         else:
-            print("[資訊] 偵測到尚未進入學習紀錄頁面 (Validation Failed)，嘗試第二次 SSO 跳轉...")
+            logger.info("偵測到尚未進入學習紀錄頁面 (Validation Failed)，嘗試第二次 SSO 跳轉...")
             sso_response = session.get(sso_url)
             if is_course_list_page(sso_response.text):
                 initial_response = sso_response
@@ -52,6 +65,11 @@ def get_enrolled_courses(session):
                 # Last resort
                 initial_response = session.get(course_list_url)
 
+    return resolver, detected_base, course_list_url, initial_response
+
+
+def _read_record_pages(session, resolver, detected_base, course_list_url, initial_response, max_pages):
+    """逐頁讀取學習紀錄"""
     all_courses = []
     total_hours = 0.0
     enrolled_ids = set()
@@ -60,28 +78,29 @@ def get_enrolled_courses(session):
     while True:
         # Get course record page with pagination
         if page == 1 and initial_response:
-            print(f"檢查已報名: 使用 SSO 獲取的第 1 頁...")
+            logger.debug("檢查已報名: 使用 SSO 獲取的第 1 頁")
             resp = initial_response
             # Clear it so we don't reuse it
             initial_response = None
         elif page == 1:
             record_url = course_list_url
-            print(f"檢查已報名: 讀取第 {page} 頁...")
+            logger.debug("檢查已報名: 讀取第 %d 頁", page)
             resp = session.get(record_url)
         # 對於 page > 1，resp 已在迴圈底部由 session.post 更新
 
-        soup = BeautifulSoup(resp.text, "html.parser")
+        with metrics.stage("parse"):
+            soup = BeautifulSoup(resp.text, "html.parser")
         table = soup.find("table", id="applySelection")
 
         if not table:
-            print(f"  → 找不到表格，結束讀取")
+            logger.debug("第 %d 頁找不到表格，結束讀取", page)
             break
 
         tbody = table.find("tbody")
         rows = tbody.find_all("tr") if tbody else []
 
         if not rows:
-            print(f"  → 沒有課程資料，結束讀取")
+            logger.debug("第 %d 頁沒有課程資料，結束讀取", page)
             break
 
         courses_on_page = 0
@@ -95,7 +114,7 @@ def get_enrolled_courses(session):
                 continue
 
             course_name = link.get_text(strip=True)
-            course_link = link.get("href", "")
+            course_link = resolver.absolute(link.get("href", ""))
 
             # Extract ID
             match = re.search(r"id=(\d+)", course_link)
@@ -126,7 +145,8 @@ def get_enrolled_courses(session):
             })
             courses_on_page += 1
 
-        print(f"  → 找到 {courses_on_page} 門課程")
+        logger.debug("第 %d 頁：找到 %d 門課程", page, courses_on_page,
+                     extra={"page": page, "courses": courses_on_page})
 
         # Determine if we should continue to next page
 
@@ -137,13 +157,16 @@ def get_enrolled_courses(session):
             f"{c['name']}_{c['hours']}" for c in all_courses[:-courses_on_page]}
 
         if courses_on_page > 0 and current_page_courses_signatures.issubset(previous_courses_signatures):
-            print("  [停止] 本頁課程皆已重複，視為已達最後一頁。")
+            logger.debug("第 %d 頁課程皆已重複，視為已達最後一頁", page)
             break
 
         # Prepare for next page
         page += 1
-        if page > 50:
-            print("  [停止] 超過 50 頁安全限制")
+        if page > max_pages:
+            if max_pages < 50:
+                logger.debug("已讀取 %d 頁，停止", max_pages)
+            else:
+                logger.warning("超過 50 頁安全限制，停止讀取")
             break
 
         # 使用 POST 讀取後續頁面
@@ -156,22 +179,22 @@ def get_enrolled_courses(session):
         if sesskey_match:
             payload["sesskey"] = sesskey_match.group(1)
 
-        print(f"檢查已報名: 讀取第 {page} 頁 (POST)...")
+        logger.debug("檢查已報名: 讀取第 %d 頁 (POST)", page)
         resp = session.post(course_list_url, data=payload)
 
     return enrolled_ids, all_courses, total_hours, detected_base
 
 
-def enroll_course(session, course_id, base_url="https://ap1.elearning.taipei"):
+def enroll_course(session, course_id, base_url=ap_host.DEFAULT_BASE):
     """Enroll in a course with session sync through so.php."""
     # 1. 透過 so.php 同步 session 到 AP 網域
     so_url = f"{base_url}/elearn/courseinfo/so.php?v={course_id}"
-    print(f"    [同步] 存取: {so_url}")
+    logger.debug("同步 session: %s", so_url)
     session.get(so_url, allow_redirects=True)
 
     # 2. 執行實際報名動作
     enroll_url = f"{base_url}/elearn/course/view.php?id={course_id}&act=reg"
-    print(f"    [報名] 存取: {enroll_url}")
+    logger.debug("報名: %s", enroll_url)
     resp = session.get(enroll_url, allow_redirects=True)
 
     # 檢查是否報名成功 (檢查網址或內容)
@@ -180,22 +203,69 @@ def enroll_course(session, course_id, base_url="https://ap1.elearning.taipei"):
     else:
         # 有些課程可能有額外條件或已截止
         if "已經報名過" in resp.text:
-            print(f"    [提醒] 此課程之前已報名過")
+            logger.info("課程 %s 之前已報名過", course_id)
             return True
-        print(f"    [失敗] 報名回應網址: {resp.url}")
+        logger.warning("課程 %s 報名失敗，回應網址: %s", course_id, resp.url)
         return False
 
 
+def parse_search_results(page_html):
+    """解析 view_type_list 搜尋結果頁，回傳 [{'id', 'name', 'hours', 'enrolled'}]
+
+    沒有報名按鈕的課程 id 為 None。
+    """
+    soup = BeautifulSoup(page_html, "html.parser")
+    results = []
+    for block in soup.find_all("div", class_=re.compile(r"md:col-6.*xl:col-4")):
+        title_tag = block.find("h2")
+        if not title_tag:
+            continue
+        link = title_tag.find("a")
+        if not link:
+            continue
+
+        hours_tag = block.find("span", class_=re.compile(r"bg-blue"))
+        hours = 0.0
+        if hours_tag:
+            hours_match = re.search(
+                r"(\d+(?:\.\d+)?)", hours_tag.get_text(strip=True))
+            if hours_match:
+                hours = float(hours_match.group(1))
+
+        course_id = None
+        enrolled = False
+        enroll_btn = block.find("button", class_="btn-black")
+        if enroll_btn:
+            enrolled = "已報名" in enroll_btn.get_text()
+            id_match = re.search(r"v=(\d+)", enroll_btn.get("onclick", ""))
+            if id_match:
+                course_id = id_match.group(1)
+
+        results.append({
+            'id': course_id,
+            'name': link.get_text(strip=True),
+            'hours': hours,
+            'enrolled': enrolled,
+        })
+    return results
+
+
 def search_and_enroll(session, enrolled_ids, current_hours, base_url, target_hours=120):
-    """Search for courses with no quiz and enroll until target hours."""
+    """Search for courses with no quiz and enroll until target hours.
+
+    Returns (final_hours, newly_enrolled)，newly_enrolled 為本次報名成功的課程，
+    格式與 get_enrolled_courses 的課程清單相同，可直接併入既有清單。
+    """
     search_url = "https://elearning.taipei/mpage/view_type_list"
+    newly_enrolled = []
 
-    resp = session.get(search_url)
+    with metrics.stage("search"):
+        resp = session.get(search_url)
     soup = BeautifulSoup(resp.text, "html.parser")
     token_tag = soup.find("input", {"name": "_token"})
     if not token_tag:
         print("錯誤: 找不到 CSRF token")
-        return current_hours
+        return current_hours, newly_enrolled
 
     token = token_tag["value"]
 
@@ -203,7 +273,8 @@ def search_and_enroll(session, enrolled_ids, current_hours, base_url, target_hou
     consecutive_empty_pages = 0
 
     while current_hours < target_hours:
-        print(f"搜尋第 {page} 頁 (目前時數: {current_hours:.1f})")
+        logger.debug("搜尋第 %d 頁 (目前時數: %.1f)", page, current_hours,
+                     extra={"page": page, "hours": current_hours})
         payload = {
             "_token": token,
             "search_quiz": "0",
@@ -211,16 +282,16 @@ def search_and_enroll(session, enrolled_ids, current_hours, base_url, target_hou
         }
 
         try:
-            resp = session.post(search_url, data=payload, timeout=30)
+            with metrics.stage("search"):
+                resp = session.post(search_url, data=payload, timeout=30)
         except Exception as e:
-            print(f"請求失敗: {e}")
+            logger.error("搜尋請求失敗: %s", e)
             break
 
-        soup = BeautifulSoup(resp.text, "html.parser")
-        course_blocks = soup.find_all(
-            "div", class_=re.compile(r"md:col-6.*xl:col-4"))
+        with metrics.stage("parse"):
+            results = parse_search_results(resp.text)
 
-        if not course_blocks:
+        if not results:
             consecutive_empty_pages += 1
             if consecutive_empty_pages > 3:
                 break
@@ -229,57 +300,109 @@ def search_and_enroll(session, enrolled_ids, current_hours, base_url, target_hou
 
         consecutive_empty_pages = 0
 
-        for block in course_blocks:
+        for result in results:
             if current_hours >= target_hours:
                 break
 
-            title_tag = block.find("h2")
-            if not title_tag:
-                continue
-            link = title_tag.find("a")
-            if not link:
-                continue
-            course_name = link.get_text(strip=True)
-
-            hours_tag = block.find("span", class_=re.compile(r"bg-blue"))
-            hours = 0.0
-            if hours_tag:
-                hours_match = re.search(
-                    r"(\d+(?:\.\d+)?)", hours_tag.get_text(strip=True))
-                if hours_match:
-                    hours = float(hours_match.group(1))
+            course_name = result['name']
+            hours = result['hours']
 
             # **重點：跳過認證時數 <= 2 的課程**
             if hours <= 2:
                 continue
 
-            enroll_btn = block.find("button", class_="btn-black")
-            if not enroll_btn:
+            if result['enrolled']:
                 continue
 
-            if "已報名" in enroll_btn.get_text():
-                continue
-
-            onclick = enroll_btn.get("onclick", "")
-            id_match = re.search(r"v=(\d+)", onclick)
-            if id_match:
-                course_id = id_match.group(1)
+            course_id = result['id']
+            if course_id:
                 if course_id in enrolled_ids:
                     continue
 
-                print(f"  [報名] {course_name} ({hours}h, ID: {course_id})")
-                if enroll_course(session, course_id, base_url):
+                logger.info("報名 %s (%gh, ID: %s)", course_name, hours, course_id,
+                            extra={"course_id": course_id, "hours": hours})
+                with metrics.stage("enroll"):
+                    enrolled = enroll_course(session, course_id, base_url)
+                if enrolled:
                     current_hours += hours
                     enrolled_ids.add(course_id)
+                    newly_enrolled.append({
+                        'id': course_id,
+                        'name': course_name,
+                        'hours': hours,
+                        'status': "未完成",
+                        'link': f"{base_url}/elearn/course/view.php?id={course_id}"
+                    })
                     time.sleep(1.5)
-                else:
-                    print(f"    報名失敗")
 
         page += 1
         if page > 150:
             break
 
-    return current_hours
+    return current_hours, newly_enrolled
+
+
+def _record_page_ids(page_html):
+    """學習紀錄頁 (applySelection 表格) 上的課程 id；找不到表格時回傳 None"""
+    soup = BeautifulSoup(page_html, "html.parser")
+    table = soup.find("table", id="applySelection")
+    if not table:
+        return None
+    ids = []
+    for cell in table.find_all("td", {"data-column": "課程名稱"}):
+        link = cell.find("a")
+        match = re.search(r"id=(\d+)", link.get("href", "")) if link else None
+        if match:
+            ids.append(match.group(1))
+    return ids
+
+
+def verify_enrollment(session, new_ids, max_pages=50):
+    """以已登入的 AP session 讀取學習紀錄，確認新報名的課程是否已出現
+
+    get_enrolled_courses 已經完成 SSO，這裡直接讀取學習紀錄頁並逐頁往後，
+    找齊所有新課程或分頁結束就停止。
+    """
+    if not new_ids:
+        return True
+
+    course_list_url = f"{ap_host.current().base}/elearn/courserecord/index.php"
+    missing = set(new_ids)
+    seen = set()
+    with metrics.stage("pagination"):
+        resp = session.get(course_list_url)
+        for page in range(1, max_pages + 1):
+            if page > 1:
+                payload = {"page": str(page), "perPage": "10"}
+                sesskey_match = re.search(r'name="sesskey" value="([^"]+)"', resp.text)
+                if sesskey_match:
+                    payload["sesskey"] = sesskey_match.group(1)
+                logger.debug("驗證報名: 讀取第 %d 頁 (POST)", page)
+                resp = session.post(course_list_url, data=payload)
+
+            with metrics.stage("parse"):
+                page_ids = _record_page_ids(resp.text)
+            if page_ids is None and page == 1:
+                # AP session 已失效，才重新走一次 SSO
+                logger.info("學習紀錄頁無法直接讀取，改用 SSO 重新讀取")
+                enrolled_ids, _, _, _ = get_enrolled_courses(session)
+                missing -= enrolled_ids
+                break
+            if not page_ids or seen.issuperset(page_ids):
+                break
+            seen.update(page_ids)
+            missing.difference_update(page_ids)
+            if not missing:
+                break
+
+    if missing:
+        missing_ids = [course_id for course_id in new_ids if course_id in missing]
+        print(f"[提醒] 學習紀錄中未看到 {len(missing_ids)} 門新報名課程 (ID: {', '.join(missing_ids)})，"
+              f"系統可能尚未更新")
+        return False
+
+    print(f"[成功] 已確認 {len(new_ids)} 門新報名課程")
+    return True
 
 
 def save_courses_to_file(courses, total_hours, filename="courses.txt"):
@@ -302,30 +425,31 @@ def save_courses_to_file(courses, total_hours, filename="courses.txt"):
 
 
 def main():
-    config = load_config()
-    session = requests.Session()
-    session.headers.update({
-        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-    })
+    # 解析命令列參數
+    parser = cli.build_parser('Auto enroll courses to reach target hours.')
+    parser.add_argument('--target', type=float, default=120.0,
+                        help='Target hours to reach (default: 120)')
+    parser.add_argument('--verify', action='store_true',
+                        help='Re-read the record pages to confirm new enrollments')
+    cli.add_export_option(parser)
+    args = parser.parse_args()
+
+    with cli.run_context(args):
+        _run(args)
+
+
+def _run(args):
+    target_enrolled_hours = args.target
+    session = create_session()
+    with prewarm.warm_up(session, [URLs.HOME, ap_host.current().base]):
+        config = load_config()
+        prewarm.load_parser()
 
     print("正在登入...")
-    max_retries = 3
-    for attempt in range(max_retries):
-        if load_cookies(session) and is_session_valid(session):
-            print("使用已儲存的 Cookie")
-            break
-        else:
-            print(f"Cookie 無效或登入嘗試 {attempt + 1}/{max_retries}...")
-            session = login_and_get_session(
-                config.get("USER_ID"), config.get("USER_PW"))
-            if session and is_session_valid(session):
-                from get_course import save_cookies
-                save_cookies(session)
-                break
-            else:
-                print("登入失敗，準備重試...")
-                time.sleep(2)
-    else:
+    # 驗證碼錯誤的重試由 AuthManager 以同一個 session 處理
+    session, _ = get_logged_in_session(
+        config.get("USER_ID"), config.get("USER_PW"), session=session)
+    if not session:
         print("多次登入失敗，請檢查網路或帳號密碼！")
         return
 
@@ -334,14 +458,6 @@ def main():
     enrolled_ids, courses_list, current_hours, detected_base = get_enrolled_courses(
         session)
 
-    # 解析命令列參數
-    parser = argparse.ArgumentParser(
-        description='Auto enroll courses to reach target hours.')
-    parser.add_argument('--target', type=float, default=120.0,
-                        help='Target hours to reach (default: 120)')
-    args = parser.parse_args()
-    target_enrolled_hours = args.target
-
     if current_hours >= target_enrolled_hours:
         print(f"✅ 已達到 {target_enrolled_hours} 小時目標！")
     else:
@@ -351,19 +467,25 @@ def main():
         print("開始自動報名課程（只報名認證時數 > 2 的課程）...\n")
 
         # Enroll in more courses
-        final_hours = search_and_enroll(
+        current_hours, newly_enrolled = search_and_enroll(
             session, enrolled_ids, current_hours, detected_base, target_hours=target_enrolled_hours)
-        print(f"\n報名完成！最終時數: {final_hours:.1f} 小時")
+        print(f"\n報名完成！最終時數: {current_hours:.1f} 小時")
+
+        # 直接把本次報名結果併入課程清單，不需重新讀取所有分頁
+        courses_list.extend(newly_enrolled)
+        print(f"新增 {len(newly_enrolled)} 門課程至清單")
 
-        # Refresh course list
-        print("\n重新取得課程列表...")
-        time.sleep(2)  # Wait for system to update
-        enrolled_ids, courses_list, current_hours, detected_base = get_enrolled_courses(
-            session)
+        if args.verify and newly_enrolled:
+            print("\n驗證新報名課程...")
+            verify_enrollment(session, [c['id'] for c in newly_enrolled])
 
     # Save to file
     print(f"\n儲存課程列表到 courses.txt...")
-    save_courses_to_file(courses_list, current_hours)
+    with metrics.stage("write"):
+        save_courses_to_file(courses_list, current_hours)
+        if args.export:
+            account = config.get("USER_ID", "")
+            cli.export_courses(args.export, (export.record_from_row(c, account) for c in courses_list))
 
     print(f"\n✅ 完成！")
     print(f"已報名課程總時數: {current_hours:.1f} 小時")
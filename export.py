@@ -0,0 +1,294 @@
+"""
+課程紀錄匯出：把解析出的課程列逐筆串流寫成 JSON Lines / CSV，
+安裝 pyarrow (pip install pyarrow) 時也可分批寫成 Parquet 或 Arrow (欄位式)，供報表使用。
+
+用法：
+    python get_course.py --export courses.jsonl        # 各爬蟲皆支援 --export
+    python export.py combine --work-dir accounts -o fleet.parquet   # 合併多帳號
+"""
+
+import abc
+import argparse
+import csv
+import json
+import os
+import sys
+from dataclasses import asdict, dataclass, fields
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from course_state import course_id_from_link
+from utils import Files, parse_time_to_minutes, target_minutes
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+# 欄位式格式每批 (row group / record batch) 的筆數
+BATCH_ROWS = 10000
+
+
+@dataclass
+class CourseRecord:
+    account: str
+    course_id: str
+    name: str
+    hours: float
+    required_minutes: int  # 完成所需分鐘 (與 gen_url 相同：有完成條件時依條件，否則為認證時數的一半)
+    study_minutes: Optional[int]  # 來源沒有修課時間 (enroll / list_course) 時為 None
+    status: str
+    scorm_link: str = ""
+    link: str = ""
+
+
+EXPORT_FIELDS = [f.name for f in fields(CourseRecord)]
+
+
+def _to_hours(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _to_minutes(value: Any) -> Optional[int]:
+    if value is None or value == "":
+        return None
+    return int(float(value))
+
+
+def _required_minutes(value: Any, hours: float) -> int:
+    """讀回的完成所需分鐘；沒有此欄位的舊匯出檔以認證時數的一半計算"""
+    if value is None or value == "":
+        return target_minutes(str(hours))
+    return int(float(value))
+
+
+def record_from_row(row: Dict[str, Any], account: str = "") -> CourseRecord:
+    """由 list_course / enroll 的課程 dict 建立紀錄"""
+    link = row.get("link", "")
+    study_time = row.get("study_time")
+    hours = _to_hours(row.get("hours"))
+    return CourseRecord(
+        account=account,
+        course_id=str(row.get("id") or course_id_from_link(link) or ""),
+        name=row.get("name", ""),
+        hours=hours,
+        required_minutes=target_minutes(str(hours), row.get("required_time_str")),
+        study_minutes=parse_time_to_minutes(study_time) if study_time else None,
+        status=row.get("status", ""),
+        link=link,
+    )
+
+
+def record_from_course(course: Any, account: str = "") -> CourseRecord:
+    """由 get_course 的 CourseInfo 建立紀錄"""
+    return CourseRecord(
+        account=account,
+        course_id=course_id_from_link(course.link) or "",
+        name=course.name,
+        hours=_to_hours(course.hours),
+        required_minutes=target_minutes(course.hours, course.required_time_str),
+        study_minutes=parse_time_to_minutes(course.study_time) if course.study_time else None,
+        status=course.completion_status,
+        scorm_link=course.scorm_link or "",
+        link=course.link,
+    )
+
+
+def _coerce(row: Dict[str, Any]) -> CourseRecord:
+    """由 JSON / CSV 讀回的欄位建立紀錄 (CSV 皆為字串)"""
+    hours = _to_hours(row.get("hours"))
+    return CourseRecord(
+        account=row.get("account") or "",
+        course_id=str(row.get("course_id") or ""),
+        name=row.get("name") or "",
+        hours=hours,
+        required_minutes=_required_minutes(row.get("required_minutes"), hours),
+        study_minutes=_to_minutes(row.get("study_minutes")),
+        status=row.get("status") or "",
+        scorm_link=row.get("scorm_link") or "",
+        link=row.get("link") or "",
+    )
+
+
+class JsonlWriter:
+    """JSON Lines：一行一筆"""
+
+    def __init__(self, path: str):
+        self._file = open(path, "w", encoding="utf-8")
+
+    def write(self, record: CourseRecord) -> None:
+        self._file.write(json.dumps(asdict(record), ensure_ascii=False) + "\n")
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class CsvWriter:
+    """CSV (UTF-8 BOM，方便以 Excel 開啟)"""
+
+    def __init__(self, path: str):
+        self._file = open(path, "w", encoding="utf-8-sig", newline="")
+        self._writer = csv.DictWriter(self._file, fieldnames=EXPORT_FIELDS)
+        self._writer.writeheader()
+
+    def write(self, record: CourseRecord) -> None:
+        self._writer.writerow(asdict(record))
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _ArrowBatchWriter(abc.ABC):
+    """欄位式輸出：累積 BATCH_ROWS 筆後寫出一批，記憶體用量與總筆數無關"""
+
+    def __init__(self, path: str):
+        if pyarrow is None:
+            raise ValueError("Parquet / Arrow 輸出需要安裝 pyarrow 套件 (pip install pyarrow)")
+        self.path = path
+        self.schema = pyarrow.schema([
+            ("account", pyarrow.string()),
+            ("course_id", pyarrow.string()),
+            ("name", pyarrow.string()),
+            ("hours", pyarrow.float64()),
+            ("required_minutes", pyarrow.int64()),
+            ("study_minutes", pyarrow.int64()),
+            ("status", pyarrow.string()),
+            ("scorm_link", pyarrow.string()),
+            ("link", pyarrow.string()),
+        ])
+        self._columns: Dict[str, List[Any]] = {name: [] for name in EXPORT_FIELDS}
+        self._rows = 0
+        self._writer = self._open_writer()
+
+    @abc.abstractmethod
+    def _open_writer(self):
+        """建立實際寫入檔案的 pyarrow writer"""
+
+    def write(self, record: CourseRecord) -> None:
+        for name in EXPORT_FIELDS:
+            self._columns[name].append(getattr(record, name))
+        self._rows += 1
+        if self._rows >= BATCH_ROWS:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._rows:
+            return
+        batch = pyarrow.record_batch(
+            [pyarrow.array(self._columns[f.name], type=f.type) for f in self.schema],
+            schema=self.schema)
+        self._writer.write_batch(batch)
+        self._columns = {name: [] for name in EXPORT_FIELDS}
+        self._rows = 0
+
+    def close(self) -> None:
+        self._flush()
+        self._writer.close()
+
+
+class ParquetWriter(_ArrowBatchWriter):
+    def _open_writer(self):
+        return pyarrow.parquet.ParquetWriter(self.path, self.schema)
+
+
+class ArrowWriter(_ArrowBatchWriter):
+    def _open_writer(self):
+        return pyarrow.ipc.new_file(self.path, self.schema)
+
+
+WRITERS = {
+    ".jsonl": JsonlWriter,
+    ".csv": CsvWriter,
+    ".parquet": ParquetWriter,
+    ".arrow": ArrowWriter,
+}
+
+
+def open_writer(path: str):
+    """依副檔名選擇輸出格式"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in WRITERS:
+        raise ValueError(f"不支援的匯出格式 '{ext}' (可用: {', '.join(WRITERS)})")
+    return WRITERS[ext](path)
+
+
+def export_records(records: Iterable[CourseRecord], path: str) -> int:
+    """逐筆寫出紀錄，回傳筆數"""
+    writer = open_writer(path)
+    count = 0
+    try:
+        for record in records:
+            writer.write(record)
+            count += 1
+    finally:
+        writer.close()
+    return count
+
+
+def iter_records(path: str) -> Iterator[CourseRecord]:
+    """逐筆讀取匯出檔 (JSON Lines / CSV / Parquet / Arrow)"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".jsonl":
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield _coerce(json.loads(line))
+    elif ext == ".csv":
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            for row in csv.DictReader(f):
+                yield _coerce(row)
+    elif ext in (".parquet", ".arrow"):
+        if pyarrow is None:
+            raise ValueError("讀取 Parquet / Arrow 需要安裝 pyarrow 套件 (pip install pyarrow)")
+        if ext == ".parquet":
+            batches = pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=BATCH_ROWS)
+        else:
+            reader = pyarrow.ipc.open_file(path)
+            batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        for batch in batches:
+            for row in batch.to_pylist():
+                yield _coerce(row)
+    else:
+        raise ValueError(f"不支援的匯出格式 '{ext}'")
+
+
+def iter_account_records(work_dir: str, file_name: str = Files.COURSE_EXPORT) -> Iterator[CourseRecord]:
+    """逐一讀取 batch.py 各帳號工作目錄中的匯出檔，帳號欄位以目錄名稱補上"""
+    for account in sorted(os.listdir(work_dir)):
+        path = os.path.join(work_dir, account, file_name)
+        if not os.path.isfile(path):
+            continue
+        for record in iter_records(path):
+            if not record.account:
+                record.account = account
+            yield record
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Course record export helper.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    combine = subparsers.add_parser("combine", help="Merge per-account exports into one file")
+    combine.add_argument("--work-dir", default="accounts",
+                         help="Base directory used by batch.py (default: accounts)")
+    combine.add_argument("--input-name", default=Files.COURSE_EXPORT,
+                         help=f"Export file name inside each account directory (default: {Files.COURSE_EXPORT})")
+    combine.add_argument("-o", "--output", required=True,
+                         help="Output path; format chosen by extension (.jsonl/.csv/.parquet/.arrow)")
+    args = parser.parse_args()
+
+    if args.command == "combine":
+        try:
+            count = export_records(iter_account_records(args.work_dir, args.input_name), args.output)
+        except (OSError, ValueError) as e:
+            print(f"錯誤: {e}")
+            sys.exit(1)
+        print(f"[成功] 已匯出 {count} 筆課程紀錄至 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,23 @@
+import heapq
+import mmap
 import re
 import os
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import Iterable, Iterator, List, Optional
 
-from utils import Files, parse_time_to_minutes, calculate_remaining_time
+import ap_host
+import cli
+import logs
+import metrics
+import planner
+from course_state import load_state
+from study_history import StudyHistory
+from utils import Files, parse_time_to_minutes, target_minutes
+
+logger = logs.get_logger(__name__)
+
+# 以數字開頭的行為課程區塊的開頭
+_BLOCK_START = re.compile(rb"\n(?=\d+\.)")
 
 
 @dataclass
@@ -12,6 +26,11 @@ class CourseResult:
     link: str
     course_name: str
     output: str
+    wait_min: Optional[int] = None  # 依累積速率換算的實際上課分鐘數
+
+    def __post_init__(self):
+        if self.wait_min is None:
+            self.wait_min = self.remaining_min
 
 
 def parse_course_block(block: str) -> Optional[CourseResult]:
@@ -34,19 +53,20 @@ def parse_course_block(block: str) -> Optional[CourseResult]:
         target_req_str = target_req_match.group(
             1).strip() if target_req_match else None
         study_str = study_match.group(1).strip() if study_match else "0分"
-        link = link_match.group(1).strip()
+        # 改寫到最近一次偵測到的 AP 網域，避免開啟時再被重新導向
+        link = ap_host.current().rewrite(link_match.group(1).strip())
 
-        remaining_min = calculate_remaining_time(
-            cert_str, study_str, target_req_str)
+        target_min = target_minutes(cert_str, target_req_str)
+        study_min = parse_time_to_minutes(study_str)
+        remaining_min = max(target_min - study_min, 0)
 
         if target_req_str:
-            target_desc = f"條件 {parse_time_to_minutes(target_req_str)} 分鐘"
+            target_desc = f"條件 {target_min} 分鐘"
         else:
-            target_desc = f"目標 {int(parse_time_to_minutes(cert_str) / 2)} 分鐘 (認證/2)"
+            target_desc = f"目標 {target_min} 分鐘 (認證/2)"
 
-        print(
-            f"解析：{course_name} - {target_desc} - 已上課 {parse_time_to_minutes(study_str)} 分鐘 -> 剩餘 {remaining_min} 分鐘"
-        )
+        logger.debug("解析：%s - %s - 已上課 %d 分鐘 -> 剩餘 %d 分鐘",
+                     course_name, target_desc, study_min, remaining_min)
 
         return CourseResult(
             remaining_min=remaining_min,
@@ -58,8 +78,22 @@ def parse_course_block(block: str) -> Optional[CourseResult]:
     return None
 
 
+def with_accrual_rates(results: Iterable[CourseResult]) -> Iterator[CourseResult]:
+    """依 study_history 的累積速率調整各課程的計時分鐘數 (urls.txt 第一欄)，逐筆產生"""
+    state = load_state()
+    history = StudyHistory()
+    for item in results:
+        course = state.find_by_link(item.link)
+        item.wait_min = history.wall_minutes(course.course_id if course else None, item.remaining_min)
+        item.output = f"{item.wait_min}|{item.link}|{item.course_name}"
+        if item.wait_min != item.remaining_min:
+            logger.debug("調整：%s - 剩餘 %d 分鐘，依累積速率需上課 %d 分鐘",
+                         item.course_name, item.remaining_min, item.wait_min)
+        yield item
+
+
 def read_course_file(file_path: str) -> str:
-    """讀取課程檔案"""
+    """讀取整個課程檔案"""
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"找不到檔案 '{file_path}'")
 
@@ -67,10 +101,50 @@ def read_course_file(file_path: str) -> str:
         return f.read()
 
 
-def write_results(results: List[CourseResult], file_path: str) -> None:
-    """寫入結果到檔案"""
-    results.sort(key=lambda x: x.remaining_min)
+def iter_course_blocks(file_path: str) -> Iterator[str]:
+    """以 mmap 逐一產生課程區塊，不把整個檔案讀成字串再切割 (多帳號的大檔案也只佔一個區塊的記憶體)"""
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"找不到檔案 '{file_path}'")
+    return _mapped_blocks(file_path)
+
+
+def _mapped_blocks(file_path: str) -> Iterator[str]:
+    with open(file_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            # 以 search 逐次尋找 (finditer 會一直持有緩衝區，提前結束時 mmap 無法關閉)
+            start = 0
+            while True:
+                match = _BLOCK_START.search(mapped, start)
+                end = match.start() if match else len(mapped)
+                yield mapped[start:end].decode("utf-8")
+                if match is None:
+                    return
+                start = match.end()
+
+
+def parse_course_file(file_path: str) -> Iterator[CourseResult]:
+    """逐一產生檔案中尚未完成的課程；檔案不存在時在呼叫當下就拋出 FileNotFoundError"""
+    return _incomplete_courses(iter_course_blocks(file_path))
+
 
+def _incomplete_courses(blocks: Iterable[str]) -> Iterator[CourseResult]:
+    for block in blocks:
+        result = parse_course_block(block)
+        if result and result.remaining_min > 0:
+            yield result
+
+
+def shortest_courses(results: Iterable[CourseResult], top: Optional[int] = None) -> List[CourseResult]:
+    """依計時分鐘數由短到長排序；指定 top 時以大小為 top 的堆積只保留最短的幾門"""
+    if top:
+        return heapq.nsmallest(top, results, key=lambda x: x.wait_min)
+    return sorted(results, key=lambda x: x.wait_min)
+
+
+def write_results(results: Iterable[CourseResult], file_path: str) -> None:
+    """依給定順序寫入結果到檔案 (排序由 shortest_courses 負責)"""
     with open(file_path, "w", encoding="utf-8") as out_f:
         for item in results:
             out_f.write(item.output + "\n")
@@ -78,23 +152,40 @@ def write_results(results: List[CourseResult], file_path: str) -> None:
 
 def main():
     """主函數"""
+    parser = cli.build_parser("Compute remaining study time and write urls.txt.")
+    parser.add_argument("--reload-interval", type=int, default=planner.DEFAULT_RELOAD_INTERVAL,
+                        help="Minutes between progress refreshes (RELOAD_INTERVAL in run_all.sh)")
+    parser.add_argument("--refresh-cost", type=float, default=planner.DEFAULT_REFRESH_COST,
+                        help="Estimated minutes spent on each refresh cycle")
+    parser.add_argument("--top", type=int, metavar="N",
+                        help="Only keep the N shortest courses in urls.txt and the study plan (default: all)")
+    args = parser.parse_args()
+
+    with cli.run_context(args):
+        _run(args)
+
+
+def _run(args):
     try:
-        content = read_course_file(Files.INCOMPLETE_COURSES)
+        courses = parse_course_file(Files.INCOMPLETE_COURSES)
     except FileNotFoundError as e:
         print(f"錯誤: {e}")
         return
 
-    # 以數字開頭的行來切割不同的課程區塊
-    blocks = re.split(r"\n(?=\d+\.)", content)
+    with metrics.stage("parse"):
+        results = shortest_courses(with_accrual_rates(courses), args.top)
 
-    results = []
-    for block in blocks:
-        result = parse_course_block(block)
-        if result and result.remaining_min > 0:
-            results.append(result)
+    plan = planner.plan_study(results, args.reload_interval, args.refresh_cost)
+    baseline = planner.plan_one_per_window(results, args.reload_interval, args.refresh_cost)
 
-    write_results(results, Files.URLS_TXT)
+    with metrics.stage("write"):
+        write_results(results, Files.URLS_TXT)
+        planner.write_plan(plan, Files.STUDY_PLAN)
     print(f"\n已完成排序，結果已儲存至 {Files.URLS_TXT}")
+    print(
+        f"上課排程: {plan.refresh_cycles} 個時段 (逐門上課需 {baseline.refresh_cycles} 個)，"
+        f"預估總耗時 {plan.estimated_wall_minutes:.0f} 分鐘，已儲存至 {Files.STUDY_PLAN}"
+    )
 
 
 if __name__ == "__main__":
@@ -1,18 +1,34 @@
-import json
+import html
+import logging
 import os
 import re
+import sys
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Dict, List, Optional, Tuple
 import requests
 from bs4 import BeautifulSoup
 
-from utils import Files, parse_time_to_minutes
+import ap_host
+import cli
+import export
+import http2
+import http_cache
+import logs
+import metrics
+import prewarm
+import recorder
+import resilience
+from cookie_store import CookieStore
+from course_state import CourseState, CourseStateFile, course_id_from_link, save_state
+from utils import Files
 
 try:
     import ddddocr
 except ImportError:
     ddddocr = None
 
+logger = logs.get_logger(__name__)
+
 
 @dataclass
 class URLs:
@@ -22,7 +38,6 @@ class URLs:
     HOME = "https://elearning.taipei/mpage/"
     SSO = "https://elearning.taipei/mpage/sso_moodle?redirectPage=courserecord"
     COURSE_LIST = "https://ap1.elearning.taipei/elearn/courserecord/index.php"
-    AP2_BASE = "https://ap1.elearning.taipei"
 
 
 @dataclass
@@ -44,6 +59,22 @@ class CourseInfo:
     study_times: Optional[List[str]] = None
     scorm_link: Optional[str] = None
     required_time_str: Optional[str] = None
+    record_page: int = 1
+
+    def __post_init__(self):
+        if self.study_times is None:
+            self.study_times = []
+
+
+@dataclass
+class CourseDetail:
+    """課程頁 (course/view.php) 的解析結果"""
+
+    is_completed: Optional[bool] = None
+    progress: Optional[int] = None
+    study_times: Optional[List[str]] = None
+    scorm_link: Optional[str] = None
+    required_time_str: Optional[str] = None
 
     def __post_init__(self):
         if self.study_times is None:
@@ -66,6 +97,7 @@ def extract_course_info_from_html(html_content: str) -> List[CourseInfo]:
     """從 HTML 內容提取課程名稱、連結和完成狀態"""
     soup = BeautifulSoup(html_content, "html.parser")
     courses = []
+    resolver = ap_host.current()
 
     # 尋找包含課程列的表格主體
     tbody = soup.find("tbody", class_="table__tbody")
@@ -95,8 +127,8 @@ def extract_course_info_from_html(html_content: str) -> List[CourseInfo]:
                 if link_tag:
                     course_name = link_tag.get_text(strip=True)
                     course_link = link_tag.get("href")
-                    if course_link and course_link.startswith("/"):
-                        course_link = URLs.AP2_BASE + course_link
+                    if course_link:
+                        course_link = resolver.absolute(course_link)
 
                     # 提取認證時數
                     hours = ""
@@ -126,103 +158,150 @@ def extract_course_info_from_html(html_content: str) -> List[CourseInfo]:
     return courses
 
 
-def login_and_get_session(username: str, password: str) -> Optional[requests.Session]:
-    """登入並返回 session 對象"""
+def create_session() -> requests.Session:
+    """建立帶有預設 headers 的 session"""
     session = requests.Session()
     session.headers.update({"User-Agent": Headers.USER_AGENT})
+    metrics.instrument(session)
+    recorder.instrument(session)
+    ap_host.instrument(session)
+    http_cache.instrument(session)
+    http2.instrument(session)
+    resilience.instrument(session)
+    return session
+
+
+class AuthManager:
+    """登入流程：整個流程 (包含重試) 沿用同一個 session 的連線與 cookie，
+
+    - 以需要登入的首頁檢查 session 是否有效 (有登出連結即已登入)
+    - 登入頁取得 _token 後才下載驗證碼，兩者依序寫入同一個伺服器端 session
+    - 只依登入回應判斷是否成功，不再另外讀取首頁
+    """
+
+    def __init__(self, username: str, password: str, session: Optional[requests.Session] = None):
+        self.username = username
+        self.password = password
+        self.session = session or create_session()
+        self.request_count = 0
+
+    def _count_response(self, response: requests.Response, *args, **kwargs) -> None:
+        self.request_count += 1
+
+    def _login_page(self) -> Tuple[bool, str]:
+        """讀取登入頁，回傳 (是否已登入, _token)"""
+        response = self.session.get(URLs.LOGIN_PAGE, timeout=10)
+        if _has_logout_marker(response.text):
+            return True, ""
+        return False, _extract_csrf_token(response.text)
+
+    def _download_captcha(self) -> bytes:
+        print("[資訊] 正在下載驗證碼...")
+        return self.session.get(URLs.CAPTCHA).content
+
+    def _login_form(self) -> Tuple[bool, str, bytes]:
+        """取得 (是否已登入, _token, 驗證碼圖片)
+
+        驗證碼在登入頁回應之後才下載：兩者同時送出時伺服器端 session 的寫入互相覆蓋，
+        驗證碼的答案可能遺失。
+        """
+        logged_in, token = self._login_page()
+        return logged_in, token, b"" if logged_in else self._download_captcha()
+
+    def is_logged_in(self) -> bool:
+        """以需要登入的首頁檢查 session"""
+        try:
+            with metrics.stage("session_check"):
+                response = self.session.get(URLs.HOME, timeout=10)
+            return _has_logout_marker(response.text)
+        except requests.RequestException as e:
+            print(f"[警告] 檢查 Session 有效性時發生錯誤: {e}")
+            return False
+
+    def login(self, max_attempts: int = 3) -> bool:
+        """登入 (驗證碼錯誤時以同一個 session 重試)"""
+        print(f"[登入] 正在準備登入帳號: {self.username}...")
+        start_count = self.request_count
+        # 只在登入期間計算請求數，session 被重複使用時不會留下多餘的 hook
+        hooks = self.session.hooks["response"]
+        hooks.append(self._count_response)
+        try:
+            with metrics.stage("login"):
+                for attempt in range(1, max_attempts + 1):
+                    logged_in, token, image = self._login_form()
+                    if logged_in:
+                        print("[成功] Session 已是登入狀態。")
+                        return True
+                    if not token:
+                        print("[警告] 找不到 CSRF token。")
+
+                    payload = {
+                        "_token": token,
+                        "username": self.username,
+                        "password": self.password,
+                        "captcha": _solve_captcha(image),
+                    }
+                    response = self.session.post(URLs.LOGIN_DO, data=payload)
+
+                    if _has_logout_marker(response.text):
+                        print("[成功] 登入成功!")
+                        return True
+
+                    print(f"[失敗] 第 {attempt}/{max_attempts} 次登入失敗，請檢查帳號密碼或驗證碼。")
+                    if "驗證碼" in response.text:
+                        print("[提示] 驗證碼錯誤。")
+                    else:
+                        # 不是驗證碼問題 (例如帳號密碼錯誤)，重試也不會成功
+                        break
+                return False
 
-    print(f"[登入] 正在準備登入帳號: {username}...")
-
-    try:
-        token = _get_csrf_token(session)
-        captcha_code = _get_captcha_code(session)
-
-        payload = {
-            "_token": token,
-            "username": username,
-            "password": password,
-            "captcha": captcha_code,
-        }
-
-        response = session.post(URLs.LOGIN_DO, data=payload)
-
-        if _is_login_successful(response, session):
-            print("[成功] 登入成功!")
-            return session
-        else:
-            print("[失敗] 登入失敗，請檢查帳號密碼或驗證碼。")
-            if "驗證碼" in response.text:
-                print("[提示] 驗證碼錯誤。")
+        except Exception as e:
+            print(f"[錯誤] 登入過程中發生異常: {e}")
+            return False
+        finally:
+            hooks.remove(self._count_response)
             _cleanup_captcha()
-            return None
+            print(f"[資訊] 登入流程共使用 {self.request_count - start_count} 個請求")
 
-    except Exception as e:
-        print(f"[錯誤] 登入過程中發生異常: {e}")
-        _cleanup_captcha()
-        return None
 
+def _has_logout_marker(text: str) -> bool:
+    """頁面包含 "登出" 或 "個人選單"，表示主網域 Session 有效"""
+    return "logout" in text.lower() or "登出" in text or "個人選單" in text
 
-def _get_csrf_token(session: requests.Session) -> str:
-    """獲取 CSRF token"""
-    response = session.get(URLs.LOGIN_PAGE)
-    soup = BeautifulSoup(response.text, "html.parser")
-    token_input = soup.find("input", {"name": "_token"})
-
-    if not token_input:
-        print("[警告] 找不到 CSRF token。")
-        return ""
-    return token_input["value"]
 
+def _extract_csrf_token(page_html: str) -> str:
+    """從登入頁取出 CSRF token"""
+    soup = BeautifulSoup(page_html, "html.parser")
+    token_input = soup.find("input", {"name": "_token"})
+    return token_input.get("value", "") if token_input else ""
 
-def _get_captcha_code(session: requests.Session) -> str:
-    """獲取驗證碼"""
-    print("[資訊] 正在下載驗證碼...")
-    captcha_resp = session.get(URLs.CAPTCHA)
 
+def _solve_captcha(image: bytes) -> str:
+    """辨識驗證碼 (有 ddddocr 時自動辨識，否則手動輸入)"""
     with open(Files.CAPTCHA, "wb") as f:
-        f.write(captcha_resp.content)
+        f.write(image)
 
     # 嘗試自動辨識驗證碼
     if ddddocr:
         try:
             print("[資訊] 正在自動辨識驗證碼...")
             ocr = ddddocr.DdddOcr(show_ad=False)
-            captcha_code = ocr.classification(captcha_resp.content)
+            captcha_code = ocr.classification(image)
             print(f"[成功] 自動辨識結果: {captcha_code}")
             return captcha_code
         except Exception as ocr_err:
             print(f"[警告] OCR 辨識失敗: {ocr_err}")
 
-    # 手動輸入驗證碼
+    # 手動輸入驗證碼 (批次模式等沒有終端機的情況無法輸入，直接說明原因)
+    if not sys.stdin or not sys.stdin.isatty():
+        raise LoginError("無法辨識驗證碼：未安裝 ddddocr (pip install ddddocr)，且目前沒有終端機可手動輸入")
+
     import subprocess
 
     subprocess.run(["open", Files.CAPTCHA])
     return input("\n[等待輸入] 請查看開啟的 captcha.png 並在此輸入驗證碼: ")
 
 
-def _is_login_successful(
-    response: requests.Response, session: requests.Session
-) -> bool:
-    """檢查登入是否成功"""
-    # 檢查登入回應
-    if (
-        "logout" in response.text.lower()
-        or "登出" in response.text
-        or "個人選單" in response.text
-    ):
-        return True
-
-    # 檢查首頁
-    try:
-        test_resp = session.get(URLs.HOME)
-        if "logout" in test_resp.text.lower() or "登出" in test_resp.text:
-            return True
-    except:
-        pass
-
-    return False
-
-
 def _cleanup_captcha():
     """清理驗證碼檔案"""
     if os.path.exists(Files.CAPTCHA):
@@ -231,231 +310,271 @@ def _cleanup_captcha():
 
 def check_course_completion(
     session: requests.Session, course_url: str
-) -> Tuple[Optional[bool], Optional[int], List[str], Optional[str]]:
+) -> Tuple[Optional[bool], Optional[int], List[str], Optional[str], Optional[str]]:
     """檢查課程詳細資訊"""
     try:
-        content = _get_course_content(session, course_url)
-        soup = BeautifulSoup(content, "html.parser")
-
-        study_times = _extract_study_times(content)
-        progress, is_completed = _extract_progress_info(soup, content)
-        scorm_link = _extract_scorm_link(soup, content, session)
+        with metrics.stage("course_view"):
+            content = _get_course_content(session, course_url)
+        with metrics.stage("parse"):
+            detail = extract_course_detail(content)
 
-        # 提取完成條件中的閱讀時間
-        required_time_str = None
-        req_match = re.search(r"完成條件為[：:]\s*閱讀時間達\d+分鐘以上", content)
-        if req_match:
-            required_time_str = req_match.group(0)
+        scorm_link = detail.scorm_link
+        if scorm_link:
+            scorm_link = _resolve_scorm_launch(session, scorm_link) or scorm_link
 
-        return is_completed, progress, study_times, scorm_link, required_time_str
+        return detail.is_completed, detail.progress, detail.study_times, scorm_link, detail.required_time_str
 
     except Exception as e:
-        print(f"   [錯誤] 檢查課程時發生問題: {e}")
-        return None, None, [], None
+        logger.error("檢查課程時發生問題: %s", e)
+        return None, None, [], None, None
+
+
+_JS_REDIRECT_RE = re.compile(r'location\.href\s*=\s*["\']([^"\']+)["\']')
 
 
 def _get_course_content(session: requests.Session, course_url: str) -> str:
-    """獲取課程內容，處理 JavaScript 跳轉"""
-    response = session.get(course_url)
-    content = response.text
+    """獲取課程內容，處理 JavaScript 跳轉
+
+    連結先改寫到目前的 AP 主機；JS 跳轉目標會被快取，下次直接請求目標頁。
+    """
+    resolver = ap_host.current()
+    course_url = resolver.absolute(course_url)
+
+    cached = resolver.cached_redirect(course_url)
+    if cached:
+        content = session.get(cached).text
+        if not _JS_REDIRECT_RE.search(content):
+            return content
+        # 快取的目標又要求跳轉 (例如頁面結構改變)，改走原本的流程
+        resolver.forget_redirect(course_url)
+
+    content = session.get(course_url).text
 
     # 處理 JavaScript 跳轉
-    js_redirect = re.search(
-        r'location\.href\s*=\s*["\']([^"\']+)["\']', content)
+    js_redirect = _JS_REDIRECT_RE.search(content)
     if js_redirect:
-        redirect_url = js_redirect.group(1)
-        if redirect_url.startswith("/"):
-            redirect_url = URLs.AP2_BASE + redirect_url
-        response = session.get(redirect_url)
-        content = response.text
+        redirect_url = resolver.absolute(html.unescape(js_redirect.group(1)))
+        resolver.remember_redirect(course_url, redirect_url)
+        content = session.get(redirect_url).text
 
     return content
 
 
-def _extract_study_times(content: str) -> List[str]:
-    """提取上課時間"""
-    time_patterns = [
-        r"\d{4}[-/]\d{2}[-/]\d{2}\s+\d{2}:\d{2}",
-        r"\d{4}[-/]\d{2}[-/]\d{2}",
-    ]
-
-    study_times = []
-    for pattern in time_patterns:
-        matches = re.findall(pattern, content)
-        study_times.extend(matches)
-
-    return sorted(list(set(study_times)))
-
-
-def _extract_progress_info(
-    soup: BeautifulSoup, content: str
-) -> Tuple[Optional[int], Optional[bool]]:
-    """提取進度資訊"""
-    progress = None
-    is_completed = None
-
-    # 進度檢查
-    progress_indicators = soup.find_all(string=re.compile(r"(\d+)%"))
-    for indicator in progress_indicators:
-        match = re.search(r"(\d+)%", indicator)
-        if match:
-            progress = int(match.group(1))
-            is_completed = progress == 100
-            break
-
-    if is_completed is None:
-        if any(text in content for text in ["已完成", "完成", "Completed"]):
-            is_completed = True
-            progress = 100
-        elif any(text in content for text in ["未完成", "進行中", "In Progress"]):
-            is_completed = False
-            progress = progress if progress is not None else 0
-
-    return progress, is_completed
-
-
-def _extract_scorm_link(soup: BeautifulSoup, content: str, session: Optional[requests.Session] = None) -> Optional[str]:
-    """提取 SCORM 連結"""
-    scorm_link = None
-
-    # 從連結中查找
-    scorm_pattern = "/elearn/mod/scorm/view.php"
-    links = soup.find_all("a", href=True)
-    for link in links:
-        href = link["href"]
-        if scorm_pattern in href:
-            scorm_link = URLs.AP2_BASE + href if href.startswith("/") else href
-            break
-
-    if not scorm_link:
-        # 從內容中查找
-        match = re.search(
-            r'https?://[^\s"\'<>]+/elearn/mod/scorm/view\.php\?id=\d+', content
-        )
-        if match:
-            scorm_link = match.group(0)
+# 課程頁主要內容區塊的起點 (Moodle 的 region-main / role="main")，結束於頁尾
+_MAIN_REGION_START_RE = re.compile(
+    r'<(?:div|section)\b[^>]*(?:id="region-main"|role="main")[^>]*>', re.I)
+_MAIN_REGION_END_RE = re.compile(r"<footer\b|id=\"page-footer\"", re.I)
+_NON_TEXT_RE = re.compile(
+    r"<script\b.*?</script>|<style\b.*?</style>|<!--.*?-->|<[^>]+>", re.I | re.S)
+_SCORM_VIEW_HREF_RE = re.compile(
+    r'<a\b[^>]*?\bhref\s*=\s*["\']([^"\']*/elearn/mod/scorm/view\.php[^"\']*)["\']', re.I)
+_SCORM_VIEW_URL_RE = re.compile(
+    r'https?://[^\s"\'<>]+/elearn/mod/scorm/view\.php\?id=\d+')
+# 單次掃描的詳細資訊語法：依序比對上課時間、進度、完成條件與狀態字樣
+_DETAIL_TOKEN_RE = re.compile(
+    r"(?P<datetime>(?P<date>\d{4}[-/]\d{2}[-/]\d{2})\s+\d{2}:\d{2})"
+    r"|(?P<date_only>\d{4}[-/]\d{2}[-/]\d{2})"
+    r"|(?P<progress>\d+)%"
+    r"|(?P<required>完成條件為[：:]\s*閱讀時間達\d+分鐘以上)"
+    r"|(?P<done>完成|Completed)"
+    r"|(?P<pending>進行中|In Progress)"
+)
+
+
+def _main_region_text(content: str) -> str:
+    """取出課程頁主要內容區塊的純文字 (去除 script、style 與標籤)"""
+    start = _MAIN_REGION_START_RE.search(content)
+    if start:
+        end = _MAIN_REGION_END_RE.search(content, start.end())
+        region = content[start.start():end.start() if end else len(content)]
+    else:
+        region = content
+    return html.unescape(_NON_TEXT_RE.sub("", region))
+
+
+def extract_course_detail(content: str) -> CourseDetail:
+    """以單次掃描解析課程頁的進度、完成條件、上課時間與 SCORM 連結
+
+    只處理主要內容區塊的文字，所有樣式皆預先編譯，不需建立整份 DOM。
+    判斷規則：第一個百分比決定進度；
+    沒有百分比時，出現「完成」字樣視為已完成，否則「進行中」視為未完成。
+    """
+    detail = CourseDetail()
+    study_times = set()
+    saw_done = False
+    saw_pending = False
+
+    for match in _DETAIL_TOKEN_RE.finditer(_main_region_text(content)):
+        kind = match.lastgroup
+        if kind == "datetime":
+            study_times.add(match.group("datetime"))
+            study_times.add(match.group("date"))
+        elif kind == "date_only":
+            study_times.add(match.group("date_only"))
+        elif kind == "progress":
+            if detail.progress is None:
+                detail.progress = int(match.group("progress"))
+        elif kind == "required":
+            if detail.required_time_str is None:
+                detail.required_time_str = match.group("required")
+            saw_done = True
+        elif kind == "done":
+            saw_done = True
+        elif kind == "pending":
+            saw_pending = True
+
+    detail.study_times = sorted(study_times)
+
+    if detail.progress is not None:
+        detail.is_completed = detail.progress == 100
+    elif saw_done:
+        detail.is_completed = True
+        detail.progress = 100
+    elif saw_pending:
+        detail.is_completed = False
+        detail.progress = 0
+
+    href_match = _SCORM_VIEW_HREF_RE.search(content)
+    if href_match:
+        detail.scorm_link = ap_host.current().absolute(html.unescape(href_match.group(1)))
+    else:
+        url_match = _SCORM_VIEW_URL_RE.search(content)
+        if url_match:
+            detail.scorm_link = ap_host.current().rewrite(url_match.group(0))
 
+    return detail
+
+
+def _resolve_scorm_launch(session: requests.Session, scorm_link: str) -> Optional[str]:
+    """開啟 SCORM 頁面，找出「進入」按鈕指向的實際播放網址；找不到時回傳 None"""
     # [使用者要求] 當開啟「scorm」頁面時，再檢查一次目前的網頁是否有「進入」的按鈕
     # 如果有，需要再開啟一次按鈕的連結網頁 (通常是進入課程的按鈕)
-    if scorm_link and session:
-        try:
-            print(f"   [資訊] 正在分析 SCORM 啟動路徑: {scorm_link}")
+    resolver = ap_host.current()
+    scorm_link = resolver.absolute(scorm_link)
+    try:
+        logger.debug("正在分析 SCORM 啟動路徑: %s", scorm_link)
+        with metrics.stage("scorm"):
             resp = session.get(scorm_link)
+        with metrics.stage("parse"):
             inner_soup = BeautifulSoup(resp.text, "html.parser")
 
-            # 策略 1: 尋找明確標記為「進入」或「Enter」的表單或按鈕
-            # 涵蓋 input[type=submit], button, a 標籤
-            search_text = re.compile(r"進入|Enter|開始|啟動|Launch", re.I)
-
-            # 優先找表單按鈕 (SCORM 最常見的做法)
-            found_action = None
-            found_params = {}
-
-            # 檢查所有按鈕元件
-            btn_elements = inner_soup.find_all(["input", "button", "a"])
-            for elem in btn_elements:
-                text = ""
-                if elem.name == "input":
-                    text = elem.get("value", "") or elem.get("title", "")
-                else:
-                    text = elem.get_text(strip=True) or elem.get("title", "")
-
-                if search_text.search(text):
-                    # 如果是 A 標籤，直接拿連結
-                    if elem.name == "a" and elem.get("href"):
-                        href = elem.get("href")
-                        if "mod/scorm/player.php" in href or "mod/scorm/loadScorm.php" in href:
-                            found_action = href
-                            break
-
-                    # 如果是按鈕，找父層 Form
-                    form = elem.find_parent("form")
-                    if form and form.get("action"):
-                        found_action = form.get("action")
-                        # 收集隱藏參數
-                        for inp in form.find_all("input"):
-                            name = inp.get("name")
-                            val = inp.get("value")
-                            if name:  # 即使 val 是 None 也保留 key，有些可以用預設值
-                                found_params[name] = val if val is not None else ""
+        # 策略 1: 尋找明確標記為「進入」或「Enter」的表單或按鈕
+        # 涵蓋 input[type=submit], button, a 標籤
+        search_text = re.compile(r"進入|Enter|開始|啟動|Launch", re.I)
+
+        # 優先找表單按鈕 (SCORM 最常見的做法)
+        found_action = None
+        found_params = {}
+
+        # 檢查所有按鈕元件
+        btn_elements = inner_soup.find_all(["input", "button", "a"])
+        for elem in btn_elements:
+            text = ""
+            if elem.name == "input":
+                text = elem.get("value", "") or elem.get("title", "")
+            else:
+                text = elem.get_text(strip=True) or elem.get("title", "")
+
+            if search_text.search(text):
+                # 如果是 A 標籤，直接拿連結
+                if elem.name == "a" and elem.get("href"):
+                    href = elem.get("href")
+                    if "mod/scorm/player.php" in href or "mod/scorm/loadScorm.php" in href:
+                        found_action = href
                         break
 
-            # 策略 2: 如果沒找到按鈕，但在頁面中發現指向 player.php 的連結
-            if not found_action:
-                player_link = inner_soup.find(
-                    "a", href=re.compile(r"mod/scorm/player\.php"))
-                if player_link:
-                    found_action = player_link["href"]
-
-            # 如果有找到任何深層連結
-            if found_action:
-                # 處理相對路徑
-                if found_action.startswith("/"):
-                    final_base = URLs.AP2_BASE + found_action
-                elif not found_action.startswith("http"):
-                    # 處理同目錄下的 player.php 這種情況
-                    base_dir = os.path.dirname(scorm_link)
-                    final_base = f"{base_dir}/{found_action}"
-                else:
-                    final_base = found_action
-
-                # 組合參數 (如果是從 Form 來的)
-                if found_params:
-                    # 如果 action 已經有問號，用 & 接，否則用 ?
-                    sep = "&" if "?" in final_base else "?"
-                    query_str = "&".join(
-                        [f"{k}={v}" for k, v in found_params.items() if v])
-                    final_link = f"{final_base}{sep}{query_str}" if query_str else final_base
-                else:
-                    final_link = final_base
-
-                # 確保不重複加 ?
-                final_link = final_link.replace("??", "?").replace("&&", "&")
-
-                print(f"   [發現深層連結] 偵測到啟動點，自動更新網址為: {final_link}")
-                return final_link
+                # 如果是按鈕，找父層 Form
+                form = elem.find_parent("form")
+                if form and form.get("action"):
+                    found_action = form.get("action")
+                    # 收集隱藏參數
+                    for inp in form.find_all("input"):
+                        name = inp.get("name")
+                        val = inp.get("value")
+                        if name:  # 即使 val 是 None 也保留 key，有些可以用預設值
+                            found_params[name] = val if val is not None else ""
+                    break
+
+        # 策略 2: 如果沒找到按鈕，但在頁面中發現指向 player.php 的連結
+        if not found_action:
+            player_link = inner_soup.find(
+                "a", href=re.compile(r"mod/scorm/player\.php"))
+            if player_link:
+                found_action = player_link["href"]
+
+        # 如果有找到任何深層連結
+        if found_action:
+            # 處理相對路徑
+            if found_action.startswith("/"):
+                final_base = resolver.absolute(found_action)
+            elif not found_action.startswith("http"):
+                # 處理同目錄下的 player.php 這種情況
+                base_dir = os.path.dirname(scorm_link)
+                final_base = f"{base_dir}/{found_action}"
+            else:
+                final_base = resolver.rewrite(found_action)
+
+            # 組合參數 (如果是從 Form 來的)
+            if found_params:
+                # 如果 action 已經有問號，用 & 接，否則用 ?
+                sep = "&" if "?" in final_base else "?"
+                query_str = "&".join(
+                    [f"{k}={v}" for k, v in found_params.items() if v])
+                final_link = f"{final_base}{sep}{query_str}" if query_str else final_base
+            else:
+                final_link = final_base
+
+            # 確保不重複加 ?
+            final_link = final_link.replace("??", "?").replace("&&", "&")
+
+            logger.debug("偵測到 SCORM 啟動點，自動更新網址為: %s", final_link)
+            return final_link
 
-        except Exception as e:
-            print(f"   [提示] 分析 SCORM 頁面時發生異常: {e}")
+    except Exception as e:
+        logger.warning("分析 SCORM 頁面時發生異常: %s", e)
 
-    return scorm_link
+    return None
 
 
-def save_cookies(session: requests.Session, filename: str = Files.COOKIES) -> None:
-    """儲存 session cookies 到檔案"""
-    with open(filename, "w") as f:
-        json.dump(requests.utils.dict_from_cookiejar(session.cookies), f)
-    print(f"[資訊] Cookies 已儲存至 {filename}")
+def get_logged_in_session(
+    username: str, password: str, store: Optional[CookieStore] = None,
+    session: Optional[requests.Session] = None
+) -> Tuple[Optional[requests.Session], Optional[int]]:
+    """取得有效的 session，回傳 (session, 使用中的 cookie generation)
 
+    session 為預熱過連線的 session 時沿用 (見 prewarm.warm_up)。
+    先嘗試共用的 cookies；失效時取得檔案鎖後再檢查一次 generation，
+    若其他程序已經重新登入就直接沿用，否則才由本程序登入並寫回。
+    """
+    store = store or CookieStore()
 
-def load_cookies(session: requests.Session, filename: str = Files.COOKIES) -> bool:
-    """從檔案載入 cookies 到 session"""
-    if os.path.exists(filename):
-        try:
-            with open(filename, "r") as f:
-                cookies = json.load(f)
-                session.cookies.update(
-                    requests.utils.cookiejar_from_dict(cookies))
-            print(f"[資訊] 已從 {filename} 載入 Cookies")
-            return True
-        except Exception as e:
-            print(f"[警告] 載入 Cookies 失敗: {e}")
-    return False
+    generation, cookies = store.read()
+    auth = AuthManager(username, password, session)
+    if cookies:
+        auth.session.cookies.update(cookies)
+        print("[資訊] 正在檢查已儲存的 Session 是否有效...")
+        if auth.is_logged_in():
+            print("[成功] Session 仍然有效，跳過登入步驟。")
+            return auth.session, generation
 
+    with store.locked():
+        latest_generation, latest_cookies = store.read()
+        if latest_cookies and latest_generation != generation:
+            print("[資訊] 其他程序已重新登入，改用新的 Session...")
+            # 沿用同一個 (已預熱連線的) session，只換成最新的 cookies
+            auth.session.cookies.clear()
+            auth.session.cookies.update(latest_cookies)
+            if auth.is_logged_in():
+                return auth.session, latest_generation
 
-def is_session_valid(session: requests.Session) -> bool:
-    """檢查 session 是否仍然有效 (檢查主網域)"""
-    try:
-        response = session.get(URLs.HOME, timeout=10)
-        # 如果頁面包含 "登出" 或 "個人選單"，表示主網域 Session 有效
-        return (
-            "logout" in response.text.lower()
-            or "登出" in response.text
-            or "個人選單" in response.text
-        )
-    except Exception as e:
-        print(f"[警告] 檢查 Session 有效性時發生錯誤: {e}")
-        return False
+        print("[資訊] Session 已失效，準備重新登入。")
+        if not auth.login():
+            return None, None
+
+        new_generation = latest_generation + 1
+        store.write(auth.session.cookies, new_generation)
+        print(f"[資訊] Cookies 已儲存至 {store.path}")
+        return auth.session, new_generation
 
 
 def load_config(config_file: str = Files.CONFIG) -> Dict[str, str]:
@@ -470,76 +589,29 @@ def load_config(config_file: str = Files.CONFIG) -> Dict[str, str]:
     return config
 
 
-if __name__ == "__main__":
-    # 從 id.confg 讀取帳號密碼
-    config = load_config()
-    USER_ID = config.get("USER_ID", "")
-    USER_PW = config.get("USER_PW", "")
+def log_redirect_history(response: requests.Response) -> None:
+    """在 DEBUG 等級列出 SSO 的重新導向過程"""
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    for hop in response.history + [response]:
+        logger.debug("SSO 導向 -> %s %s", hop.status_code, hop.url,
+                     extra={"status": hop.status_code, "url": hop.url})
 
-    if not USER_ID or not USER_PW:
-        print("錯誤: 請確保 id.confg 中包含 USER_ID 和 USER_PW")
-        exit(1)
-
-    # 初始化 Session
-    session = requests.Session()
-    session.headers.update(
-        {
-            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        }
-    )
-
-    # 嘗試載入舊的 Session
-    logged_in = False
-    if load_cookies(session):
-        print("[資訊] 正在檢查舊 Session 是否有效...")
-        if is_session_valid(session):
-            print("[成功] Session 仍然有效，跳過登入步驟。")
-            logged_in = True
-        else:
-            print("[資訊] Session 已失效，準備重新登入。")
-
-    if not logged_in:
-        # 1. 登入
-        print("=" * 60)
-        print("正在登入學習平台...")
-        print("=" * 60)
-
-        # 重新獲取 session (避免舊 cookies 干擾)
-        session = login_and_get_session(USER_ID, USER_PW)
-
-        if not session:
-            print("\n[錯誤] 無法繼續執行，因為登入失敗。")
-            exit(1)
-
-        # 儲存新的 cookies
-        save_cookies(session)
-
-    # 2. 獲取課程名單頁面 (強制透過 SSO)
-    print("\n" + "=" * 60)
-    print("正在獲取課程名單 (透過 SSO)...")
-    print("=" * 60)
 
+def open_course_record(session: requests.Session) -> Tuple[requests.Response, str]:
+    """透過 SSO 進入 AP 網域的學習紀錄頁，回傳 (第 1 頁回應, 課程列表網址)"""
     sso_url = "https://elearning.taipei/mpage/sso_moodle?redirectPage=courserecord"
-    course_list_url = "https://ap1.elearning.taipei/elearn/courserecord/index.php"
 
     # 強制執行 SSO 以確保 ap 網域的 session 被初始化
-    print(f"[資訊] 存取 SSO: {sso_url}")
+    logger.info("存取 SSO: %s", sso_url)
     sso_response = session.get(sso_url, allow_redirects=True)
-    
-    print("   [除錯] SSO Redirect History:")
-    for history_resp in sso_response.history:
-        print(f"   -> {history_resp.status_code} {history_resp.url}")
-    print(f"   -> {sso_response.status_code} {sso_response.url}")
-
-    # 動態提取目前使用的 AP 網域
-    from urllib.parse import urlparse
-    parsed_url = urlparse(sso_response.url)
-    detected_base = f"{parsed_url.scheme}://{parsed_url.netloc}"
-    print(f"[資訊] 偵測到目前網域: {detected_base}")
-    
-    # 更新通用的 AP2_BASE 與目前的 course_list_url
-    URLs.AP2_BASE = detected_base
-    course_list_url = f"{detected_base}/elearn/courserecord/index.php"
+    log_redirect_history(sso_response)
+
+    # 動態提取目前使用的 AP 網域，之後所有課程 / SCORM 連結都改寫到此網域
+    resolver = ap_host.current()
+    resolver.learn(sso_response.url)
+    logger.info("偵測到目前網域: %s", resolver.base)
+    course_list_url = f"{resolver.base}/elearn/courserecord/index.php"
 
     # 判斷是否直接跳轉到了課程頁面
     is_valid_page = False
@@ -549,26 +621,28 @@ if __name__ == "__main__":
         return "課程完成與否" in text or "table__tbody" in text
 
     if is_course_list_page(sso_response.text):
-        print("[成功] SSO 直接跳轉至課程列表頁面!")
+        logger.info("SSO 直接跳轉至課程列表頁面")
         response = sso_response
         is_valid_page = True
     else:
-        print("[資訊] SSO 未直接跳轉至課程列表，嘗試手動存取...")
+        logger.info("SSO 未直接跳轉至課程列表，嘗試手動存取...")
         response = session.get(course_list_url)
         if is_course_list_page(response.text):
-             print("[成功] 手動存取課程列表成功!")
+             logger.info("手動存取課程列表成功")
              is_valid_page = True
 
     # 檢查是否真的拿到了課程頁面 (檢查欄位名稱 - 嚴格檢查)
     if not is_valid_page:
-        print("[資訊] 偵測到尚未進入學習紀錄頁面 (Validation Failed)，嘗試第二次 SSO 跳轉...")
+        logger.info("偵測到尚未進入學習紀錄頁面 (Validation Failed)，嘗試第二次 SSO 跳轉...")
         
-        # 顯示當前頁面標題以供除錯
-        try:
-            debug_soup = BeautifulSoup(response.text, "html.parser")
-            print(f"   [除錯] 目前所在頁面標題: {debug_soup.title.string.strip() if debug_soup.title else 'No Title'}")
-        except:
-            pass
+        # 顯示當前頁面標題以供除錯 (只在 DEBUG 等級才解析頁面)
+        if logger.isEnabledFor(logging.DEBUG):
+            try:
+                debug_soup = BeautifulSoup(response.text, "html.parser")
+                logger.debug("目前所在頁面標題: %s",
+                             debug_soup.title.string.strip() if debug_soup.title else "No Title")
+            except Exception:
+                pass
 
         # 重試邏輯
         sso_response = session.get(sso_url)
@@ -577,10 +651,39 @@ if __name__ == "__main__":
         else:
              response = session.get(course_list_url)
 
-    # 儲存 HTML 以便檢查結構
-    with open(Files.DEBUG_COURSES, "w", encoding="utf-8") as f:
-        f.write(response.text)
-
+    return response, course_list_url
+
+
+def fetch_record_page(
+    session: requests.Session, course_list_url: str, page: int, previous_html: str = ""
+) -> requests.Response:
+    """讀取學習紀錄的指定分頁 (第 1 頁為 GET，其餘為 POST)"""
+    course_list_url = ap_host.current().rewrite(course_list_url)
+    if page == 1:
+        return session.get(course_list_url)
+
+    # 準備 POST 參數
+    payload = {
+        "queryYear": "115",  # 依照 HTML 中的預設值
+        "mode": "0",        # 精簡模式
+        "cstatus": "0",     # 全部
+        "page": str(page),
+        "perPage": "10"     # 預設每頁 10 筆
+    }
+    # 注意：此處可能需要增加 CSRF token 或其他隱藏欄位，但通常這種分頁 POST 只需要 page
+    # 檢查 HTML 中是否有 sesskey
+    sesskey_match = re.search(
+        r'name="sesskey" value="([^"]+)"', previous_html)
+    if sesskey_match:
+        payload["sesskey"] = sesskey_match.group(1)
+
+    return session.post(course_list_url, data=payload)
+
+
+def _fetch_all_record_pages(
+    session: requests.Session, response: requests.Response, course_list_url: str
+) -> List[CourseInfo]:
+    """解析第 1 頁並以 POST 讀取其餘分頁的課程紀錄"""
     # 獲取總頁數
     soup = BeautifulSoup(response.text, "html.parser")
     total_pages = 1
@@ -591,57 +694,103 @@ if __name__ == "__main__":
         if pages:
             total_pages = max(pages)
 
-    print(f"[資訊] 偵測到總共有 {total_pages} 頁課程紀錄")
+    logger.info("偵測到總共有 %d 頁課程紀錄", total_pages)
 
     all_courses = []
 
     # 第一頁已經拿到了，直接解析
-    courses = extract_course_info_from_html(response.text)
+    with metrics.stage("parse"):
+        courses = extract_course_info_from_html(response.text)
     all_courses.extend(courses)
-    print(f"[資訊] 第 1/{total_pages} 頁：找到 {len(courses)} 個課程")
+    logger.debug("第 1/%d 頁：找到 %d 個課程", total_pages, len(courses),
+                 extra={"page": 1, "courses": len(courses)})
 
     # 獲取後續頁面
     for page in range(2, total_pages + 1):
-        print(f"[資訊] 正在獲取第 {page}/{total_pages} 頁...")
-        # 準備 POST 參數
-        payload = {
-            "queryYear": "115",  # 依照 HTML 中的預設值
-            "mode": "0",        # 精簡模式
-            "cstatus": "0",     # 全部
-            "page": str(page),
-            "perPage": "10"     # 預設每頁 10 筆
-        }
-        # 注意：此處可能需要增加 CSRF token 或其他隱藏欄位，但通常這種分頁 POST 只需要 page
-        # 檢查 HTML 中是否有 sesskey
-        sesskey_match = re.search(
-            r'name="sesskey" value="([^"]+)"', response.text)
-        if sesskey_match:
-            payload["sesskey"] = sesskey_match.group(1)
-
-        response = session.post(course_list_url, data=payload)
-        courses = extract_course_info_from_html(response.text)
+        logger.debug("正在獲取第 %d/%d 頁...", page, total_pages)
+        response = fetch_record_page(session, course_list_url, page, response.text)
+        with metrics.stage("parse"):
+            courses = extract_course_info_from_html(response.text)
+        for course in courses:
+            course.record_page = page
         all_courses.extend(courses)
-        print(f"[資訊] 第 {page}/{total_pages} 頁：找到 {len(courses)} 個課程")
+        logger.debug("第 %d/%d 頁：找到 %d 個課程", page, total_pages, len(courses),
+                     extra={"page": page, "courses": len(courses)})
+
+    return all_courses
+
+
+def main():
+    parser = cli.build_parser("Fetch incomplete courses and their SCORM links.")
+    cli.add_export_option(parser)
+    args = parser.parse_args()
 
-    courses = all_courses
+    with cli.run_context(args):
+        _run(args)
+
+
+def _run(args):
+    # 讀取設定與初始化解析器的同時，預先連線到入口網站與上次的 AP 主機
+    session = create_session()
+    with prewarm.warm_up(session, [URLs.HOME, ap_host.current().base]):
+        # 從 id.confg 讀取帳號密碼
+        config = load_config()
+        USER_ID = config.get("USER_ID", "")
+        USER_PW = config.get("USER_PW", "")
+        prewarm.load_parser()
+
+    if not USER_ID or not USER_PW:
+        print("錯誤: 請確保 id.confg 中包含 USER_ID 和 USER_PW")
+        exit(1)
+
+    # 1. 登入 (優先沿用其他程序共用的 Session)
+    print("=" * 60)
+    print("正在登入學習平台...")
+    print("=" * 60)
+
+    store = CookieStore()
+    session, cookie_generation = get_logged_in_session(USER_ID, USER_PW, store, session)
+
+    if not session:
+        print("\n[錯誤] 無法繼續執行，因為登入失敗。")
+        exit(1)
+
+    # 2. 獲取課程名單頁面 (強制透過 SSO)
+    print("\n" + "=" * 60)
+    print("正在獲取課程名單 (透過 SSO)...")
+    print("=" * 60)
+
+    with metrics.stage("sso"):
+        response, course_list_url = open_course_record(session)
+
+    with metrics.stage("pagination"):
+        courses = _fetch_all_record_pages(session, response, course_list_url)
 
     if not courses:
+        if recorder.active:
+            debug_hint = f"錄製封存 {recorder.active.directory}"
+        else:
+            # 只在解析失敗時才儲存 HTML 以便檢查結構
+            with open(Files.DEBUG_COURSES, "w", encoding="utf-8") as f:
+                f.write(response.text)
+            debug_hint = Files.DEBUG_COURSES
         print(
-            f"[警告] 找不到任何課程。請檢查 {Files.DEBUG_COURSES} 以確認頁面內容是否正確。"
+            f"[警告] 找不到任何課程。請檢查 {debug_hint} 以確認頁面內容是否正確。"
         )
-        # 如果是讀取舊 cookie 導致的失敗，刪除它
-        if logged_in and os.path.exists(Files.COOKIES):
+        # 可能是 Session 已過期但檢查通過；只在沒有其他程序更新過時才刪除
+        if store.invalidate(cookie_generation):
             print("[提示] 可能是 Session 已過期但檢查通過，下次執行將重新登入。")
-            os.remove(Files.COOKIES)
     else:
         print(f"[資訊] 總共找到 {len(courses)} 個課程")
+        # 連同 SSO 取得的 AP 主機 MoodleSession 一起寫回，poll_course.py 與 browser.py 才能直接使用
+        store.update(session.cookies, cookie_generation)
 
     # 3. 過濾未完成課程
     incomplete_courses = []
     for course in courses:
         if "未完成" in course.completion_status or "進行中" in course.completion_status:
             incomplete_courses.append(course)
-            print(f"發現未完成課程: {course.name}")
+            logger.debug("發現未完成課程: %s", course.name)
 
     # 4. 檢查詳細資訊
     if incomplete_courses:
@@ -650,20 +799,21 @@ if __name__ == "__main__":
         print("=" * 60)
 
         for i, course in enumerate(incomplete_courses, 1):
-            print(f"\n[{i}/{len(incomplete_courses)}] 檢查: {course.name}")
-            is_completed, progress, study_times, scorm_link, required_time_str = check_course_completion(
-                session, course.link
-            )
+            logger.info("[%d/%d] 檢查: %s", i, len(incomplete_courses), course.name)
+            with metrics.stage("detail"):
+                is_completed, progress, study_times, scorm_link, required_time_str = check_course_completion(
+                    session, course.link
+                )
 
             course.required_time_str = required_time_str
             if required_time_str:
-                print(f"   [找到完成條件] {required_time_str}")
+                logger.debug("找到完成條件: %s", required_time_str)
 
             course.progress = progress if progress is not None else 0
             course.study_times = study_times
             if scorm_link:
                 course.scorm_link = scorm_link
-                print(f"   [找到 SCORM 連結] {scorm_link}")
+                logger.debug("找到 SCORM 連結: %s", scorm_link)
 
     # 5. 輸出結果
     print("\n" + "=" * 60)
@@ -671,22 +821,51 @@ if __name__ == "__main__":
     print("=" * 60)
     print(f"未完成課程數: {len(incomplete_courses)}")
 
-    with open(Files.INCOMPLETE_COURSES, "w", encoding="utf-8") as f:
-        f.write("未完成的課程列表 (從網路即時下載)\n")
-        f.write("=" * 60 + "\n\n")
-        for i, course in enumerate(incomplete_courses, 1):
-            f.write(f"{i}. {course.name}\n")
-            f.write(f"   認證時數: {course.hours}\n")
-            if course.required_time_str:
-                f.write(f"   {course.required_time_str}\n")
-            if course.study_time:
-                f.write(f"   修課時間: {course.study_time}\n")
-            if course.progress is not None:
-                f.write(f"   進度: {course.progress}%\n")
-            if course.study_times:
-                f.write(f"   上課時間: {', '.join(course.study_times)}\n")
-
-            link_to_save = course.scorm_link or course.link
-            f.write(f"   連結: {link_to_save}\n\n")
+    with metrics.stage("write"):
+        with open(Files.INCOMPLETE_COURSES, "w", encoding="utf-8") as f:
+            f.write("未完成的課程列表 (從網路即時下載)\n")
+            f.write("=" * 60 + "\n\n")
+            for i, course in enumerate(incomplete_courses, 1):
+                f.write(f"{i}. {course.name}\n")
+                f.write(f"   認證時數: {course.hours}\n")
+                if course.required_time_str:
+                    f.write(f"   {course.required_time_str}\n")
+                if course.study_time:
+                    f.write(f"   修課時間: {course.study_time}\n")
+                if course.progress is not None:
+                    f.write(f"   進度: {course.progress}%\n")
+                if course.study_times:
+                    f.write(f"   上課時間: {', '.join(course.study_times)}\n")
+
+                link_to_save = course.scorm_link or course.link
+                f.write(f"   連結: {link_to_save}\n\n")
 
     print(f"\n結果已儲存至 {Files.INCOMPLETE_COURSES}")
+
+    # 6. 儲存課程狀態，供 poll_course.py 只重新讀取單一課程所在的分頁
+    state = CourseStateFile(course_list_url=course_list_url)
+    for course in incomplete_courses:
+        course_id = course_id_from_link(course.link)
+        if not course_id:
+            continue
+        entry = CourseState(
+            course_id=course_id,
+            name=course.name,
+            link=course.link,
+            study_link=course.scorm_link or course.link,
+            hours=course.hours,
+            required_time_str=course.required_time_str,
+            record_page=course.record_page,
+        )
+        entry.update_study_time(course.study_time)
+        state.courses[course_id] = entry
+    save_state(state)
+
+    if args.export:
+        with metrics.stage("write"):
+            cli.export_courses(args.export, (export.record_from_course(c, USER_ID) for c in courses))
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+可選的 HTTP/2 傳輸：以 httpx 的 HTTP/2 連線池取代 requests 底層的 urllib3，
+同一主機的平行請求 (學習紀錄分頁、課程頁、SCORM 頁) 共用一條多工連線，
+不必各自建立 TCP + TLS 連線。上層仍是 requests.Session，呼叫端與 hook 都不需修改。
+
+- 只處理 https (ALPN 協商)；伺服器不支援 HTTP/2 時 httpx 自動改用 HTTP/1.1
+- cookie 與轉址仍由 requests.Session 處理，httpx 只負責傳輸
+- 經由 proxy 的請求交回原本的 urllib3 傳輸
+- 未安裝 httpx[http2] 時維持 HTTP/1.1 並提示
+
+以 --http2 或環境變數 ELEARNING_HTTP2=1 啟用 (需 pip install "httpx[http2]")。
+"""
+
+import http.client
+import os
+import ssl
+import threading
+from typing import Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.cookies import extract_cookies_to_jar
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers, select_proxy
+
+import http_cache
+import logs
+
+try:
+    import h2  # noqa: F401 (httpx 的 HTTP/2 支援需要 h2)
+    import httpx
+except ImportError:
+    httpx = None
+
+
+DEFAULT_ENABLED = os.environ.get("ELEARNING_HTTP2", "") == "1"
+# HTTP/2 禁止的逐跳 (hop-by-hop) 標頭；requests 預設會帶 Connection: keep-alive
+HOP_BY_HOP_HEADERS = frozenset({"connection", "keep-alive", "proxy-connection", "transfer-encoding", "upgrade"})
+
+logger = logs.get_logger(__name__)
+
+
+def available() -> bool:
+    return httpx is not None
+
+
+class _RawResponse:
+    """取代 urllib3 回應的最小物件：requests 由 raw._original_response.msg 取出 Set-Cookie"""
+
+    def __init__(self, headers, body: bytes):
+        message = http.client.HTTPMessage()
+        for name, value in headers.multi_items():
+            message[name] = value  # 同名標頭 (多個 Set-Cookie) 會分別保留
+        self._original_response = type("OriginalResponse", (), {"msg": message})()
+        self.headers = message
+        self._body = body
+
+    def read(self, amt: Optional[int] = None, decode_content: bool = True) -> bytes:
+        body, self._body = self._body, b""
+        return body
+
+    def close(self) -> None:
+        pass
+
+    def release_conn(self) -> None:
+        pass
+
+
+def _ssl_context(verify, cert) -> ssl.SSLContext:
+    """依 requests 的 verify / cert 參數建立 TLS 設定"""
+    if verify is False:
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    elif isinstance(verify, str) and os.path.isdir(verify):
+        context = ssl.create_default_context(capath=verify)
+    elif isinstance(verify, str):
+        context = ssl.create_default_context(cafile=verify)
+    else:
+        context = ssl.create_default_context(cafile=requests.certs.where())
+    if cert:
+        certfile, keyfile = cert if isinstance(cert, tuple) else (cert, None)
+        context.load_cert_chain(certfile, keyfile)
+    return context
+
+
+def _timeouts(timeout) -> Dict[str, Optional[float]]:
+    connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+    return {"connect": connect, "read": read, "write": read, "pool": read}
+
+
+def _translate_error(error: Exception, request: requests.PreparedRequest) -> requests.RequestException:
+    """轉成 requests 的例外，讓 resilience.py 的重試判斷維持不變"""
+    if isinstance(error, httpx.ConnectTimeout):
+        return requests.ConnectTimeout(error, request=request)
+    if isinstance(error, httpx.TimeoutException):
+        return requests.ReadTimeout(error, request=request)
+    return requests.ConnectionError(error, request=request)
+
+
+_lock = threading.Lock()
+_transports: Dict[Tuple, "httpx.HTTPTransport"] = {}
+
+
+class Http2Adapter(HTTPAdapter):
+    """以 httpx.HTTPTransport(http2=True) 送出請求的 adapter；每組 TLS 設定共用一個連線池"""
+
+    def __init__(self, transports: Optional[Dict[Tuple, "httpx.HTTPTransport"]] = None, **kwargs):
+        super().__init__(**kwargs)
+        self._transports = _transports if transports is None else transports
+
+    def _transport(self, verify, cert) -> "httpx.HTTPTransport":
+        key = (verify, cert)
+        with _lock:
+            transport = self._transports.get(key)
+            if transport is None:
+                transport = httpx.HTTPTransport(http2=True, verify=_ssl_context(verify, cert))
+                self._transports[key] = transport
+            return transport
+
+    def send(self, request: requests.PreparedRequest, stream: bool = False, timeout=None, verify=True,
+             cert=None, proxies=None) -> requests.Response:
+        if select_proxy(request.url, proxies):
+            return super().send(request, stream=stream, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+
+        headers = [(name, value) for name, value in request.headers.items()
+                   if name.lower() not in HOP_BY_HOP_HEADERS]
+        body = request.body.encode("utf-8") if isinstance(request.body, str) else request.body
+        outgoing = httpx.Request(request.method, request.url, headers=headers, content=body,
+                                 extensions={"timeout": _timeouts(timeout)})
+        try:
+            incoming = self._transport(verify, cert).handle_request(outgoing)
+            try:
+                content = incoming.read()
+            finally:
+                incoming.close()
+        except httpx.TransportError as e:
+            raise _translate_error(e, request) from e
+        return self._build(request, incoming, content)
+
+    def _build(self, request: requests.PreparedRequest, incoming: "httpx.Response",
+               content: bytes) -> requests.Response:
+        response = requests.Response()
+        response.status_code = incoming.status_code
+        response.reason = incoming.reason_phrase
+        response.headers = CaseInsensitiveDict(incoming.headers.items())
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = _RawResponse(incoming.headers, content)
+        response._content = content
+        response._content_consumed = True
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.http_version = incoming.http_version
+        extract_cookies_to_jar(response.cookies, request, response.raw)
+        return response
+
+
+class Http2CachingAdapter(http_cache.CachingAdapter, Http2Adapter):
+    """快取層 (http_cache) 在上、HTTP/2 傳輸在下"""
+
+
+enabled = DEFAULT_ENABLED
+_warned = False
+
+
+def instrument(session: requests.Session) -> requests.Session:
+    """把 https 的 adapter 換成 HTTP/2 傳輸 (應在 http_cache 之後、resilience 之前呼叫)"""
+    global _warned
+    if not enabled:
+        return session
+    if not available():
+        if not _warned:
+            _warned = True
+            logger.warning("未安裝 httpx[http2] (pip install \"httpx[http2]\")，改用 HTTP/1.1")
+        return session
+    adapter = session.adapters.get("https://")
+    if isinstance(adapter, Http2Adapter):
+        return session
+    if isinstance(adapter, http_cache.CachingAdapter):
+        session.mount("https://", Http2CachingAdapter(adapter.cache))
+    else:
+        session.mount("https://", Http2Adapter())
+    return session
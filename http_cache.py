@@ -0,0 +1,302 @@
+"""
+HTTP 條件式請求快取：掛在 session 的 HTTPAdapter 上，對 GET 依網址規則決定 TTL，
+TTL 內直接回傳快取內容；過期後帶 If-None-Match / If-Modified-Since 重新驗證，
+伺服器回 304 時沿用快取的內容。內容與驗證資訊存在磁碟，前面再加一層有上限的記憶體 LRU；磁碟上的項目同樣有數量與時間上限，
+每個程序第一次使用快取時清除最舊與過期的項目。
+只快取 RULES 列出的頁面 (SCORM 啟動頁、課程介紹頁)，快取鍵包含網址與 session cookie，
+不同 session 不會互相沿用。首頁、學習紀錄、課程頁等反映登入狀態與修課進度的頁面、
+驗證碼、登入頁、會改變伺服器狀態的 GET (so.php 的 session 同步、報名) 與所有非 GET 請求一律不快取。
+連線失敗時 resilience.py 可透過 stale_response() 取得過期的快取內容繼續執行。
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Pattern
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from utils import Files
+
+
+MEMORY_ENTRIES = 128
+DISK_ENTRIES = 1024
+DISK_MAX_AGE = 7 * 24 * 3600  # 秒；離線沿用更舊的內容已沒有意義
+
+
+@dataclass
+class CacheRule:
+    """網址符合 pattern 時的快取策略；ttl 為 None 表示不快取，0 表示每次都重新驗證"""
+
+    pattern: Pattern
+    ttl: Optional[float]
+
+
+# 快取鍵包含的 session cookie (入口網站與 AP 主機)
+SESSION_COOKIES = ("laravel_session", "MoodleSession")
+
+# 依序比對，第一個符合的規則生效；沒有符合的網址不快取
+RULES: List[CacheRule] = [
+    CacheRule(re.compile(r"/mpage/captcha"), None),
+    CacheRule(re.compile(r"/mpage/(?:do-)?login"), None),  # _token 與 session 綁定
+    CacheRule(re.compile(r"/mpage/sso_moodle"), None),  # 負責建立 AP 網域的 session
+    CacheRule(re.compile(r"/elearn/courseinfo/so\.php"), None),  # 報名前同步 session 到 AP 網域
+    CacheRule(re.compile(r"/elearn/course/view\.php\?.*\bact=reg\b"), None),  # 報名動作
+    CacheRule(re.compile(r"/elearn/mod/scorm/view\.php"), 300),  # 啟動參數很少變動
+    # 課程介紹頁；搜尋頁 (view_type_list) 內含與登入 session 綁定的 _token，不快取
+    CacheRule(re.compile(r"/mpage/courseinfo\b"), 600),
+]
+
+
+@dataclass
+class CacheEntry:
+    url: str
+    status: int
+    headers: Dict[str, str]
+    stored_at: float
+    body: bytes = field(default=b"", repr=False)
+
+    @property
+    def etag(self) -> Optional[str]:
+        return self.headers.get("ETag") or self.headers.get("etag")
+
+    @property
+    def last_modified(self) -> Optional[str]:
+        return self.headers.get("Last-Modified") or self.headers.get("last-modified")
+
+
+def rule_for(url: str) -> Optional[CacheRule]:
+    for rule in RULES:
+        if rule.pattern.search(url):
+            return rule
+    return None
+
+
+def cache_key(request: requests.PreparedRequest) -> str:
+    """網址加上請求帶的 session cookie；登出或換帳號後不會用到其他 session 的內容"""
+    cookies = {}
+    for pair in request.headers.get("Cookie", "").split(";"):
+        name, _, value = pair.strip().partition("=")
+        if name in SESSION_COOKIES:
+            cookies[name] = value
+    session = "&".join(f"{name}={cookies[name]}" for name in SESSION_COOKIES if name in cookies)
+    return hashlib.sha256(f"{request.url}\n{session}".encode("utf-8")).hexdigest()
+
+
+class HttpCache:
+    """磁碟儲存 + 記憶體 LRU (執行緒安全)"""
+
+    def __init__(self, directory: str = Files.HTTP_CACHE_DIR, memory_entries: int = MEMORY_ENTRIES):
+        self.directory = directory
+        self.memory_entries = memory_entries
+        self._memory: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {"hit": 0, "revalidated": 0, "miss": 0, "bypass": 0, "stale": 0}
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, key: str):
+        return os.path.join(self.directory, f"{key}.json"), os.path.join(self.directory, f"{key}.body")
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return entry
+        meta_path, body_path = self._paths(key)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        entry = CacheEntry(body=body, **meta)
+        self._remember(key, entry)
+        return entry
+
+    def put(self, key: str, entry: CacheEntry) -> None:
+        meta_path, body_path = self._paths(key)
+        _atomic_write(body_path, entry.body)
+        meta = asdict(entry)
+        del meta["body"]
+        _atomic_write(meta_path, json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+        self._remember(key, entry)
+
+    def touch(self, key: str, entry: CacheEntry, headers: Dict[str, str]) -> None:
+        """304 後更新儲存時間與伺服器送來的新驗證資訊"""
+        for name in ("ETag", "Last-Modified"):
+            if headers.get(name):
+                entry.headers[name] = headers[name]
+        entry.stored_at = time.time()
+        self.put(key, entry)
+
+    def _remember(self, key: str, entry: CacheEntry) -> None:
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def prune(self, max_entries: int = DISK_ENTRIES, max_age: float = DISK_MAX_AGE) -> int:
+        """刪除磁碟上過期與超過數量上限的項目 (依寫入時間由舊到新)，回傳刪除的項目數"""
+        entries = []
+        try:
+            with os.scandir(self.directory) as scan:
+                for item in scan:
+                    if item.name.endswith(".json"):
+                        try:
+                            entries.append((item.stat().st_mtime, item.path))
+                        except OSError:
+                            pass
+        except OSError:
+            return 0
+        entries.sort()
+        cutoff = time.time() - max_age
+        excess = len(entries) - max_entries
+        removed = 0
+        for index, (mtime, meta_path) in enumerate(entries):
+            if index >= excess and mtime >= cutoff:
+                break
+            for path in (meta_path, meta_path[:-len(".json")] + ".body"):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            removed += 1
+        return removed
+
+    def count(self, outcome: str) -> None:
+        with self._lock:
+            self.stats[outcome] += 1
+
+    def hit_ratio(self) -> float:
+        served = self.stats["hit"] + self.stats["revalidated"]
+        cacheable = served + self.stats["miss"]
+        return served / cacheable if cacheable else 0.0
+
+
+def _atomic_write(path: str, data: bytes) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".cache-")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class CachingAdapter(HTTPAdapter):
+    """在連線層加上快取；回應會帶 cache_status 屬性 (hit / revalidated / miss / bypass)"""
+
+    def __init__(self, cache: HttpCache, **kwargs):
+        super().__init__(**kwargs)
+        self.cache = cache
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        rule = rule_for(request.url) if request.method == "GET" else None
+        if rule is None or rule.ttl is None:
+            self.cache.count("bypass")
+            response = super().send(request, **kwargs)
+            response.cache_status = "bypass"
+            return response
+
+        key = cache_key(request)
+        entry = self.cache.get(key)
+        if entry and time.time() - entry.stored_at < rule.ttl:
+            self.cache.count("hit")
+            return _response_from_entry(request, entry, "hit", self)
+
+        if entry:
+            if entry.etag:
+                request.headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                request.headers["If-Modified-Since"] = entry.last_modified
+
+        response = super().send(request, **kwargs)
+
+        if response.status_code == 304 and entry:
+            self.cache.touch(key, entry, response.headers)
+            self.cache.count("revalidated")
+            response.close()
+            return _response_from_entry(request, entry, "revalidated", self)
+
+        self.cache.count("miss")
+        response.cache_status = "miss"
+        if response.status_code == 200:
+            self.cache.put(key, CacheEntry(
+                url=request.url,
+                status=response.status_code,
+                headers={k: v for k, v in response.headers.items() if k.lower() != "set-cookie"},
+                stored_at=time.time(),
+                body=response.content,
+            ))
+        return response
+
+
+def _response_from_entry(request: requests.PreparedRequest, entry: CacheEntry, status: str,
+                         connection: Optional[HTTPAdapter] = None) -> requests.Response:
+    response = requests.Response()
+    response.status_code = entry.status
+    response.reason = "OK"
+    response.headers = CaseInsensitiveDict(entry.headers)
+    response.encoding = get_encoding_from_headers(response.headers)
+    response._content = entry.body
+    response.url = request.url
+    response.request = request
+    response.connection = connection
+    response.elapsed = datetime.timedelta(0)
+    response.cache_status = status
+    return response
+
+
+enabled = True
+_cache: Optional[HttpCache] = None
+
+
+def current() -> HttpCache:
+    """取得本程序共用的快取 (第一次使用時才建立目錄並清除舊項目)"""
+    global _cache
+    if _cache is None:
+        _cache = HttpCache()
+        _cache.prune()
+    return _cache
+
+
+def stale_response(request: requests.PreparedRequest) -> Optional[requests.Response]:
+    """主機無法連線時改用的快取內容 (不論是否過期)；不可快取的請求回傳 None"""
+    if not enabled or request.method != "GET":
+        return None
+    rule = rule_for(request.url)
+    if rule is None or rule.ttl is None:
+        return None
+    cache = current()
+    entry = cache.get(cache_key(request))
+    if entry is None:
+        return None
+    cache.count("stale")
+    return _response_from_entry(request, entry, "stale")
+
+
+def instrument(session: requests.Session) -> requests.Session:
+    """為 session 的 https / http 掛上快取 adapter"""
+    if enabled:
+        adapter = CachingAdapter(current())
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+    return session
+
+
+def print_summary() -> None:
+    if _cache is None:
+        return
+    stats = _cache.stats
+    print(f"HTTP 快取      命中 {stats['hit']}  304 {stats['revalidated']}  未命中 {stats['miss']}  "
+          f"不快取 {stats['bypass']}  離線沿用 {stats['stale']}  命中率 {_cache.hit_ratio():.1%}")
@@ -1,28 +1,37 @@
-import requests
 from bs4 import BeautifulSoup
-from get_course import load_config, load_cookies, is_session_valid, login_and_get_session
+import ap_host
+import cli
+import export
+import logs
+import metrics
+import prewarm
+from get_course import URLs, create_session, load_config, get_logged_in_session, log_redirect_history
 import re
 
+logger = logs.get_logger(__name__)
+
 
 def get_all_enrolled_courses(session):
     """Get all enrolled courses from ALL pages."""
-    sso_url = "https://elearning.taipei/mpage/sso_moodle?redirectPage=courserecord"
-    course_list_url = "https://ap1.elearning.taipei/elearn/courserecord/index.php"
+    with metrics.stage("sso"):
+        resolver, detected_base, initial_response = _open_course_list(session)
+    with metrics.stage("pagination"):
+        return _read_record_pages(session, resolver, detected_base, initial_response)
+
 
-    print(f"[資訊] 存取 SSO: {sso_url}")
+def _open_course_list(session):
+    """SSO 進入學習紀錄頁，回傳 (resolver, AP 網域, 第 1 頁回應)"""
+    sso_url = "https://elearning.taipei/mpage/sso_moodle?redirectPage=courserecord"
+    logger.info("存取 SSO: %s", sso_url)
     sso_response = session.get(sso_url, allow_redirects=True)
-    
-    print("   [除錯] SSO Redirect History:")
-    for history_resp in sso_response.history:
-        print(f"   -> {history_resp.status_code} {history_resp.url}")
-    print(f"   -> {sso_response.status_code} {sso_response.url}")
-
-    # 動態提取目前使用的 AP 網域
-    from urllib.parse import urlparse
-    parsed_url = urlparse(sso_response.url)
-    detected_base = f"{parsed_url.scheme}://{parsed_url.netloc}"
-    print(f"[資訊] 偵測到目前網域: {detected_base}")
-    
+    log_redirect_history(sso_response)
+
+    # 動態提取目前使用的 AP 網域 (由 ap_host 記錄，供後續改寫連結)
+    resolver = ap_host.current()
+    resolver.learn(sso_response.url)
+    detected_base = resolver.base
+    logger.info("偵測到目前網域: %s", detected_base)
+
     # 更新後續使用的網址
     course_list_url = f"{detected_base}/elearn/courserecord/index.php"
 
@@ -33,16 +42,16 @@ def get_all_enrolled_courses(session):
     # Check if SSO landed us on the correct page
     initial_response = None
     if is_course_list_page(sso_response.text):
-        print("[成功] SSO 直接跳轉至課程列表頁面!")
+        logger.info("SSO 直接跳轉至課程列表頁面")
         initial_response = sso_response
     else:
-        print("[資訊] SSO 未直接跳轉至課程列表，嘗試手動存取...")
+        logger.info("SSO 未直接跳轉至課程列表，嘗試手動存取...")
         resp = session.get(course_list_url)
         if is_course_list_page(resp.text):
-             print("[成功] 手動存取課程列表成功!")
+             logger.info("手動存取課程列表成功")
              initial_response = resp
         else:
-             print("[資訊] 偵測到尚未進入學習紀錄頁面 (Validation Failed)，嘗試第二次 SSO 跳轉...")
+             logger.info("偵測到尚未進入學習紀錄頁面 (Validation Failed)，嘗試第二次 SSO 跳轉...")
              sso_response = session.get(sso_url)
              if is_course_list_page(sso_response.text):
                  initial_response = sso_response
@@ -50,6 +59,11 @@ def get_all_enrolled_courses(session):
                  # Last resort
                  initial_response = session.get(course_list_url)
 
+    return resolver, detected_base, initial_response
+
+
+def _read_record_pages(session, resolver, detected_base, initial_response):
+    """逐頁讀取學習紀錄"""
     all_courses = []
     total_hours = 0.0
     page = 1
@@ -57,34 +71,35 @@ def get_all_enrolled_courses(session):
     while True:
         # Get course record page with pagination
         if page == 1 and initial_response:
-            print(f"正在讀取第 1 頁 (使用 SSO 結果)...")
+            logger.debug("正在讀取第 1 頁 (使用 SSO 結果)")
             resp = initial_response
             initial_response = None
         elif page == 1:
             record_url = f"{detected_base}/elearn/courserecord/index.php"
-            print(f"正在讀取第 {page} 頁...")
+            logger.debug("正在讀取第 %d 頁", page)
             resp = session.get(record_url)
         else:
             record_url = f"{detected_base}/elearn/courserecord/index.php?page={page}"
-            print(f"正在讀取第 {page} 頁...")
+            logger.debug("正在讀取第 %d 頁", page)
             resp = session.get(record_url)
 
-        soup = BeautifulSoup(resp.text, "html.parser")
+        with metrics.stage("parse"):
+            soup = BeautifulSoup(resp.text, "html.parser")
         table = soup.find("table", id="applySelection")
 
         if not table:
-            print(f"第 {page} 頁找不到課程表格")
+            logger.debug("第 %d 頁找不到課程表格", page)
             break
 
         tbody = table.find("tbody")
         if not tbody:
-            print(f"第 {page} 頁沒有課程內容")
+            logger.debug("第 %d 頁沒有課程內容", page)
             break
 
         rows = tbody.find_all("tr")
 
         if not rows:
-            print(f"第 {page} 頁沒有課程")
+            logger.debug("第 %d 頁沒有課程", page)
             break
 
         courses_on_page = 0
@@ -100,7 +115,7 @@ def get_all_enrolled_courses(session):
                 continue
 
             course_name = link.get_text(strip=True)
-            course_link = link.get("href", "")
+            course_link = resolver.absolute(link.get("href", ""))
 
             # Get hours
             hours_cell = row.find("td", {"data-column": "認證時數"})
@@ -133,7 +148,8 @@ def get_all_enrolled_courses(session):
             })
             courses_on_page += 1
 
-        print(f"  → 找到 {courses_on_page} 門課程")
+        logger.debug("第 %d 頁：找到 %d 門課程", page, courses_on_page,
+                     extra={"page": page, "courses": courses_on_page})
 
         # Ignore explicit pagination checks and Try to force next page
         # Many PHP sites support ?page=N even if the link is hard to find
@@ -145,15 +161,14 @@ def get_all_enrolled_courses(session):
             f"{c['name']}_{c['hours']}" for c in all_courses[:-courses_on_page]}
 
         if courses_on_page > 0 and current_page_courses_signatures.issubset(previous_courses_signatures):
-            print("  [停止] 本頁課程皆已重複，視為已達最後一頁。")
+            logger.debug("第 %d 頁課程皆已重複，視為已達最後一頁", page)
             break
 
-        print(f"  → 準備嘗試讀取第 {page + 1} 頁...")
         page += 1
 
         # Safety limit
         if page > 50:
-            print("警告：超過 50 頁，停止讀取")
+            logger.warning("超過 50 頁，停止讀取")
             break
 
     return all_courses, total_hours
@@ -183,19 +198,23 @@ def save_courses_to_file(courses, total_hours, filename="courses.txt"):
 
 
 def main():
-    config = load_config()
-    session = requests.Session()
-    session.headers.update({
-        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-    })
+    parser = cli.build_parser("List all enrolled courses and total hours.")
+    cli.add_export_option(parser)
+    args = parser.parse_args()
+
+    with cli.run_context(args):
+        _run(args)
+
+
+def _run(args):
+    session = create_session()
+    with prewarm.warm_up(session, [URLs.HOME, ap_host.current().base]):
+        config = load_config()
+        prewarm.load_parser()
 
     print("正在登入...")
-    if not load_cookies(session) or not is_session_valid(session):
-        print("Cookie 無效，重新登入...")
-        session = login_and_get_session(
-            config.get("USER_ID"), config.get("USER_PW"))
-    else:
-        print("✓ 使用已儲存的 Cookie\n")
+    session, _ = get_logged_in_session(
+        config.get("USER_ID"), config.get("USER_PW"), session=session)
 
     if not session:
         print("✗ 登入失敗！")
@@ -224,7 +243,11 @@ def main():
 
     # Save to file
     print(f"\n儲存課程列表到 courses.txt...")
-    save_courses_to_file(courses, total_hours, "courses.txt")
+    with metrics.stage("write"):
+        save_courses_to_file(courses, total_hours, "courses.txt")
+        if args.export:
+            account = config.get("USER_ID", "")
+            cli.export_courses(args.export, (export.record_from_row(c, account) for c in courses))
 
     print(f"\n✅ 完成！")
     print(f"   已報名課程總時數: {total_hours:.1f} 小時")
@@ -0,0 +1,143 @@
+"""
+結構化日誌：各模組以 logs.get_logger(__name__) 取得 logger。
+紀錄先放入佇列 (QueueHandler)，由背景執行緒 (QueueListener) 格式化並寫到 stderr，
+迴圈中的呼叫端只付出一次 queue.put；輸出經過緩衝，佇列清空時才 flush，
+即使以 python -u 執行也不會每筆一次 write。
+
+輸出格式：
+- human：與原本 print 相同的「[資訊] ...」樣式
+- json：每行一筆 JSON (ts、level、logger、stage、msg 與 extra 欄位)，方便機器解析
+
+逐頁 / 逐筆的訊息使用 DEBUG 等級，預設 (INFO) 不輸出；未啟用的等級只有一次等級判斷的成本。
+等級與格式可由 --log-level / --log-format 或環境變數 ELEARNING_LOG_LEVEL / ELEARNING_LOG_FORMAT 指定。
+"""
+
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from typing import Optional
+
+import metrics
+
+
+ROOT_LOGGER = "elearning"
+FORMATS = ("human", "json")
+LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+DEFAULT_LEVEL = os.environ.get("ELEARNING_LOG_LEVEL", "INFO").upper()
+DEFAULT_FORMAT = os.environ.get("ELEARNING_LOG_FORMAT", "human").lower()
+
+_PREFIXES = {
+    logging.DEBUG: "[除錯]",
+    logging.INFO: "[資訊]",
+    logging.WARNING: "[警告]",
+    logging.ERROR: "[錯誤]",
+    logging.CRITICAL: "[錯誤]",
+}
+# LogRecord 本身的屬性；其餘屬性視為呼叫端以 extra= 傳入的結構化欄位
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "stage"}
+
+
+def get_logger(name: str) -> logging.Logger:
+    """取得 elearning 底下的子 logger (name 通常為 __name__)"""
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+class HumanFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        text = f"{_PREFIXES.get(record.levelno, '[資訊]')} {record.getMessage()}"
+        if record.exc_info:
+            text += "\n" + self.formatException(record.exc_info)
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "stage": getattr(record, "stage", metrics.DEFAULT_STAGE),
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _StageFilter(logging.Filter):
+    """在呼叫端執行緒記下目前的量測階段 (背景執行緒無法得知)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.stage = metrics.current_stage()
+        return True
+
+
+class _DrainingStreamHandler(logging.StreamHandler):
+    """寫入緩衝串流，佇列清空時才 flush，大量紀錄時合併成較少次的系統呼叫"""
+
+    def __init__(self, stream, pending: queue.Queue):
+        super().__init__(stream)
+        self._pending = pending
+
+    def flush(self) -> None:
+        if self._pending.empty():
+            super().flush()
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[logging.handlers.QueueHandler] = None
+_stream = None
+
+
+def setup(level: str = DEFAULT_LEVEL, fmt: str = DEFAULT_FORMAT) -> None:
+    """設定佇列式日誌 (重複呼叫時只更新等級與格式)"""
+    global _listener, _queue_handler, _stream
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(getattr(logging, level.upper(), logging.INFO))
+    formatter = JsonFormatter() if fmt == "json" else HumanFormatter()
+
+    if _listener is not None:
+        # 先寫完佇列中已有的紀錄，再套用新的格式
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.setFormatter(formatter)
+        _listener.start()
+        return
+
+    pending: queue.Queue = queue.Queue()
+    # 另開一個有緩衝的 stderr，不受 python -u 的逐次寫入影響
+    _stream = open(sys.stderr.fileno(), "w", buffering=64 * 1024, encoding="utf-8",
+                   errors="replace", closefd=False)
+    output = _DrainingStreamHandler(_stream, pending)
+    output.setFormatter(formatter)
+
+    _queue_handler = logging.handlers.QueueHandler(pending)
+    _queue_handler.addFilter(_StageFilter())
+    root.addHandler(_queue_handler)
+    root.propagate = False
+
+    _listener = logging.handlers.QueueListener(pending, output)
+    _listener.start()
+    atexit.register(shutdown)
+
+
+def shutdown() -> None:
+    """處理完佇列中剩餘的紀錄並 flush"""
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    root = logging.getLogger(ROOT_LOGGER)
+    root.removeHandler(_queue_handler)
+    root.propagate = True
+    _listener.stop()
+    _listener = None
+    _queue_handler = None
+    _stream.flush()
@@ -0,0 +1,299 @@
+"""
+上課迴圈 (run_all.sh) 的即時狀態與控制介面。
+
+run_all.sh 在各階段邊界呼叫本程式更新 loop_status.json (目前課程、剩餘時間、排程佇列、
+上次重新整理耗時)；各 Python 入口結束時會累加本次的 HTTP 請求數。
+`serve` 提供本機 HTTP/JSON API，控制指令以旗標檔 (loop_control/) 傳給 run_all.sh，
+倒數迴圈每秒只需檢查檔案是否存在，不會增加任何重新整理或網路請求。
+
+用法：
+    python loop_status.py serve --port 8765 &
+    curl localhost:8765/status
+    curl -X POST localhost:8765/skip       # 略過目前課程
+    curl -X POST localhost:8765/refresh    # 立即重新檢查進度
+    curl -X POST localhost:8765/pause      # 暫停倒數 (/resume 繼續)
+
+控制指令沒有其他保護，預設只綁定 127.0.0.1；綁定其他位址 (供其他機器監控) 時必須以 --token
+(或環境變數 LOOP_STATUS_TOKEN) 設定權杖，所有請求都要帶 `Authorization: Bearer <權杖>`。
+狀態檔只在迴圈執行期間 (start 到 stop) 累加請求數，之後手動執行的程式不會計入。
+"""
+
+import argparse
+import hmac
+import ipaddress
+import json
+import os
+import sys
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from cookie_store import CookieStore
+from utils import Files, file_lock
+
+
+CONTROL_ACTIONS = ("skip", "refresh", "pause")
+DEFAULT_PORT = 8765
+TOKEN_ENV = "LOOP_STATUS_TOKEN"
+
+
+def _read(path: str = Files.LOOP_STATUS) -> Dict[str, Any]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write(data: Dict[str, Any], path: str = Files.LOOP_STATUS) -> None:
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".loop-status-")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def update(path: str = Files.LOOP_STATUS, **fields: Any) -> Dict[str, Any]:
+    """在檔案鎖內合併更新狀態欄位"""
+    with file_lock(path + ".lock"):
+        data = _read(path)
+        data.update(fields)
+        data["updated_at"] = time.time()
+        _write(data, path)
+    return data
+
+
+def add_requests(program: str, count: int, path: str = Files.LOOP_STATUS) -> None:
+    """累加某個入口程式的 HTTP 請求數 (只在迴圈執行中，即 start 之後、stop 之前記錄)"""
+    if not count or not os.path.exists(path):
+        return
+    with file_lock(path + ".lock"):
+        data = _read(path)
+        if not data.get("active"):
+            return
+        requests_by_program = data.setdefault("requests", {})
+        requests_by_program[program] = requests_by_program.get(program, 0) + count
+        _write(data, path)
+
+
+def _read_queue(queue_file: str) -> List[Dict[str, Any]]:
+    """讀取 planner.py next-window 輸出 (分鐘|網址|課程名稱)"""
+    queue = []
+    try:
+        with open(queue_file, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.rstrip("\n").split("|", 2)
+                if len(parts) == 3 and parts[1].startswith("http"):
+                    queue.append({"minutes": int(parts[0] or 0), "url": parts[1], "name": parts[2]})
+    except (OSError, ValueError):
+        pass
+    return queue
+
+
+def _control_path(action: str, control_dir: str = Files.LOOP_CONTROL_DIR) -> str:
+    return os.path.join(control_dir, action)
+
+
+def pending_controls(control_dir: str = Files.LOOP_CONTROL_DIR) -> List[str]:
+    return [action for action in CONTROL_ACTIONS if os.path.exists(_control_path(action, control_dir))]
+
+
+def set_control(action: str, active: bool = True, control_dir: str = Files.LOOP_CONTROL_DIR) -> None:
+    """建立或清除控制旗標檔"""
+    path = _control_path(action, control_dir)
+    if active:
+        os.makedirs(control_dir, exist_ok=True)
+        with open(path, "w") as f:
+            f.write(str(time.time()))
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def snapshot(path: str = Files.LOOP_STATUS, control_dir: str = Files.LOOP_CONTROL_DIR,
+             cookies_path: str = Files.COOKIES) -> Dict[str, Any]:
+    """目前狀態；剩餘秒數與 session 年齡在讀取時才計算"""
+    data = _read(path)
+    now = time.time()
+
+    countdown = data.get("countdown") or {}
+    if countdown.get("paused"):
+        remaining_seconds = countdown.get("remaining_seconds", 0)
+    elif countdown.get("ends_at"):
+        remaining_seconds = max(int(countdown["ends_at"] - now), 0)
+    else:
+        remaining_seconds = None
+
+    # cookies.json 在 SSO 後也會寫回，修改時間不是登入時間；改用檔案內記錄的 created_at
+    created_at = CookieStore(cookies_path).created_at()
+    session_age = int(now - created_at) if created_at is not None else None
+
+    requests_by_program = data.get("requests", {})
+    return {
+        "phase": data.get("phase", "idle"),
+        "active": bool(data.get("active")),
+        "current_course": data.get("current_course"),
+        "remaining_seconds": remaining_seconds,
+        "paused": bool(countdown.get("paused")),
+        "queue": data.get("queue", []),
+        "queue_position": data.get("queue_position"),
+        "last_refresh_seconds": data.get("last_refresh_seconds"),
+        "last_refresh_at": data.get("last_refresh_at"),
+        "requests": {"total": sum(requests_by_program.values()), **requests_by_program},
+        "session_age_seconds": session_age,
+        "pending_controls": pending_controls(control_dir),
+        "started_at": data.get("started_at"),
+        "updated_at": data.get("updated_at"),
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "elearning-loop/1.0"
+
+    def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self) -> bool:
+        token = self.server.token
+        if not token:
+            return True
+        header = self.headers.get("Authorization", "")
+        if header.startswith("Bearer ") and hmac.compare_digest(header[len("Bearer "):].encode(), token.encode()):
+            return True
+        self._send_json(401, {"error": "unauthorized"})
+        return False
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        if self.path.rstrip("/") in ("", "/status"):
+            self._send_json(200, snapshot())
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        action = self.path.strip("/")
+        if action in CONTROL_ACTIONS:
+            set_control(action)
+        elif action == "resume":
+            set_control("pause", active=False)
+        else:
+            self._send_json(404, {"error": f"unknown action '{action}'",
+                                  "actions": list(CONTROL_ACTIONS) + ["resume"]})
+            return
+        self._send_json(200, {"ok": True, "action": action, "status": snapshot()})
+
+    def log_message(self, format, *args):
+        # 監控端可能頻繁輪詢，不逐筆輸出存取紀錄
+        pass
+
+
+def _is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def serve(host: str, port: int, token: Optional[str] = None) -> None:
+    if not token and not _is_loopback(host):
+        print(f"[錯誤] 綁定 {host} 時其他機器也能送出控制指令，請以 --token 或 {TOKEN_ENV} 設定權杖")
+        sys.exit(1)
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.token = token
+    print(f"[資訊] 上課狀態 API: http://{host}:{port}/status")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Study loop status file and local HTTP/JSON control API.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="Serve GET /status and POST /skip|/refresh|/pause|/resume")
+    serve_parser.add_argument("--host", default="127.0.0.1",
+                              help="Bind address; non-loopback addresses require --token (default: 127.0.0.1)")
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port (default: {DEFAULT_PORT})")
+    serve_parser.add_argument("--token", default=os.environ.get(TOKEN_ENV),
+                              help=f"Bearer token required on every request (default: ${TOKEN_ENV})")
+
+    subparsers.add_parser("start", help="Reset the status file and clear pending controls at loop start")
+    subparsers.add_parser("stop", help="Mark the loop finished so later runs stop adding to its request counts")
+
+    phase = subparsers.add_parser("phase", help="Set the current loop phase")
+    phase.add_argument("name", help="e.g. refresh, studying, polling, done")
+
+    refresh = subparsers.add_parser("refresh", help="Record how long the last full refresh took")
+    refresh.add_argument("started", type=float, help="Unix time the refresh started (date +%%s.%%N)")
+
+    course = subparsers.add_parser("course", help="Set the course being studied and the current queue")
+    course.add_argument("--name", required=True)
+    course.add_argument("--url", required=True)
+    course.add_argument("--minutes", type=int, required=True, help="Remaining minutes for this course")
+    course.add_argument("--queue-file", help="planner.py next-window output for the current window")
+    course.add_argument("--position", type=int, help="1-based position of the course in the queue")
+
+    countdown = subparsers.add_parser("countdown", help="Start or resume the countdown with SECONDS left")
+    countdown.add_argument("seconds", type=int)
+    pause = subparsers.add_parser("paused", help="Mark the countdown paused with SECONDS left")
+    pause.add_argument("seconds", type=int)
+
+    clear = subparsers.add_parser("clear", help="Clear a control flag after run_all.sh has acted on it")
+    clear.add_argument("action", choices=CONTROL_ACTIONS)
+
+    subparsers.add_parser("show", help="Print the current status as JSON")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args.host, args.port, args.token)
+    elif args.command == "start":
+        for action in CONTROL_ACTIONS:
+            set_control(action, active=False)
+        with file_lock(Files.LOOP_STATUS + ".lock"):
+            _write({"phase": "starting", "active": True, "started_at": time.time(), "requests": {}})
+    elif args.command == "stop":
+        for action in CONTROL_ACTIONS:
+            set_control(action, active=False)
+        data = _read()
+        update(active=False, stopped_at=time.time(),
+               phase=data.get("phase") if data.get("phase") == "done" else "stopped")
+    elif args.command == "phase":
+        update(phase=args.name)
+    elif args.command == "refresh":
+        now = time.time()
+        update(last_refresh_seconds=round(now - args.started, 3), last_refresh_at=now)
+    elif args.command == "course":
+        fields: Dict[str, Any] = {
+            "phase": "studying",
+            "current_course": {"name": args.name, "url": args.url, "remaining_minutes": args.minutes},
+            "queue_position": args.position,
+        }
+        if args.queue_file:
+            fields["queue"] = _read_queue(args.queue_file)
+        update(**fields)
+    elif args.command == "countdown":
+        update(countdown={"ends_at": time.time() + args.seconds, "paused": False})
+    elif args.command == "paused":
+        update(countdown={"remaining_seconds": args.seconds, "paused": True})
+    elif args.command == "clear":
+        set_control(args.action, active=False)
+    elif args.command == "show":
+        json.dump(snapshot(), sys.stdout, ensure_ascii=False, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
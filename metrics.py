@@ -0,0 +1,285 @@
+"""
+HTTP 請求量測：透過 requests 的 response hook 記錄每個請求的延遲、大小、
+狀態碼、轉址次數與主機，依階段 (login、sso、pagination...) 彙整成直方圖，
+並可匯出為 JSON 與 Prometheus textfile 格式。
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+
+from utils import Files
+
+
+# 直方圖的延遲分界 (秒)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+DEFAULT_STAGE = "other"
+
+# 各執行緒目前的階段堆疊 (以 thread ident 為鍵，讓取樣器也能讀取)
+_stage_stacks: Dict[int, List[str]] = {}
+# 與 _stage_stacks 對應的進入時間 (time.monotonic)，供 resilience 計算階段期限
+_stage_started: Dict[int, List[float]] = {}
+
+# 階段進入 / 離開時的通知對象 (例如 profiling)
+_stage_listeners: List[Tuple[Callable[[str], None], Callable[[str], None]]] = []
+
+
+@dataclass
+class StageStats:
+    """單一階段的累計數據"""
+
+    latencies: List[float] = field(default_factory=list)
+    bytes: int = 0
+    redirects: int = 0
+    statuses: Dict[str, int] = field(default_factory=dict)
+    hosts: Dict[str, int] = field(default_factory=dict)
+    wall_seconds: float = 0.0
+    entries: int = 0
+    cache: Dict[str, int] = field(default_factory=dict)
+
+    def bucket_counts(self) -> List[int]:
+        """各分界的累積次數 (Prometheus histogram 語意)"""
+        return [sum(1 for v in self.latencies if v <= le) for le in LATENCY_BUCKETS]
+
+    def percentile(self, q: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class Metrics:
+    """執行緒安全的量測彙整器"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages: Dict[str, StageStats] = {}
+
+    def _stats(self, stage_name: str) -> StageStats:
+        if stage_name not in self.stages:
+            self.stages[stage_name] = StageStats()
+        return self.stages[stage_name]
+
+    def record_response(self, stage_name: str, response: requests.Response) -> None:
+        """記錄一次 HTTP 往返 (轉址的每一跳各算一次)；快取直接命中的回應只計入快取統計"""
+        cache_status = getattr(response, "cache_status", None)
+        if cache_status:
+            with self._lock:
+                stats = self._stats(stage_name)
+                stats.cache[cache_status] = stats.cache.get(cache_status, 0) + 1
+            # 直接命中與離線沿用的快取都沒有網路往返
+            if cache_status in ("hit", "stale"):
+                return
+        host = urlparse(response.url).netloc
+        latency = response.elapsed.total_seconds()
+        size = len(response.content or b"")
+        with self._lock:
+            stats = self._stats(stage_name)
+            stats.latencies.append(latency)
+            stats.bytes += size
+            if response.is_redirect:
+                stats.redirects += 1
+            status = str(response.status_code)
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            stats.hosts[host] = stats.hosts.get(host, 0) + 1
+
+    def record_stage_time(self, stage_name: str, seconds: float) -> None:
+        """記錄階段的實際耗時 (含解析等非網路時間)"""
+        with self._lock:
+            stats = self._stats(stage_name)
+            stats.wall_seconds += seconds
+            stats.entries += 1
+
+    def request_count(self) -> int:
+        with self._lock:
+            return sum(len(s.latencies) for s in self.stages.values())
+
+    def to_dict(self) -> Dict[str, Dict]:
+        with self._lock:
+            result = {}
+            for name, stats in sorted(self.stages.items()):
+                result[name] = {
+                    "requests": len(stats.latencies),
+                    "latency_sum": round(sum(stats.latencies), 4),
+                    "latency_p50": round(stats.percentile(0.5), 4),
+                    "latency_p90": round(stats.percentile(0.9), 4),
+                    "latency_max": round(max(stats.latencies, default=0.0), 4),
+                    "buckets": dict(zip(
+                        [str(le) for le in LATENCY_BUCKETS], stats.bucket_counts())),
+                    "bytes": stats.bytes,
+                    "redirects": stats.redirects,
+                    "statuses": dict(stats.statuses),
+                    "hosts": dict(stats.hosts),
+                    "wall_seconds": round(stats.wall_seconds, 4),
+                    "entries": stats.entries,
+                    "cache": dict(stats.cache),
+                }
+            return result
+
+    def to_prometheus(self) -> str:
+        """輸出 Prometheus textfile collector 格式"""
+        data = self.to_dict()
+        lines = [
+            "# HELP elearning_http_request_duration_seconds HTTP round trip latency per stage.",
+            "# TYPE elearning_http_request_duration_seconds histogram",
+        ]
+        for name, stats in data.items():
+            for le, count in stats["buckets"].items():
+                lines.append(
+                    f'elearning_http_request_duration_seconds_bucket{{stage="{name}",le="{le}"}} {count}')
+            lines.append(
+                f'elearning_http_request_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {stats["requests"]}')
+            lines.append(
+                f'elearning_http_request_duration_seconds_sum{{stage="{name}"}} {stats["latency_sum"]}')
+            lines.append(
+                f'elearning_http_request_duration_seconds_count{{stage="{name}"}} {stats["requests"]}')
+
+        lines += [
+            "# HELP elearning_http_requests_total HTTP round trips per stage and status.",
+            "# TYPE elearning_http_requests_total counter",
+        ]
+        lines += [f'elearning_http_requests_total{{stage="{n}",status="{status}"}} {count}'
+                  for n, s in data.items() for status, count in s["statuses"].items()]
+        lines += [
+            "# HELP elearning_http_host_requests_total HTTP round trips per stage and host.",
+            "# TYPE elearning_http_host_requests_total counter",
+        ]
+        lines += [f'elearning_http_host_requests_total{{stage="{n}",host="{host}"}} {count}'
+                  for n, s in data.items() for host, count in s["hosts"].items()]
+
+        lines += [
+            "# HELP elearning_http_response_bytes_total Response body bytes per stage.",
+            "# TYPE elearning_http_response_bytes_total counter",
+        ]
+        lines += [f'elearning_http_response_bytes_total{{stage="{n}"}} {s["bytes"]}'
+                  for n, s in data.items()]
+        lines += [
+            "# HELP elearning_http_redirects_total Redirect responses per stage.",
+            "# TYPE elearning_http_redirects_total counter",
+        ]
+        lines += [f'elearning_http_redirects_total{{stage="{n}"}} {s["redirects"]}'
+                  for n, s in data.items()]
+        lines += [
+            "# HELP elearning_http_cache_total HTTP cache outcomes (hit/revalidated/miss/bypass) per stage.",
+            "# TYPE elearning_http_cache_total counter",
+        ]
+        lines += [f'elearning_http_cache_total{{stage="{n}",result="{result}"}} {count}'
+                  for n, s in data.items() for result, count in s["cache"].items()]
+        lines += [
+            "# HELP elearning_stage_seconds_total Wall clock time spent inside each stage.",
+            "# TYPE elearning_stage_seconds_total counter",
+        ]
+        lines += [f'elearning_stage_seconds_total{{stage="{n}"}} {s["wall_seconds"]}'
+                  for n, s in data.items()]
+        return "\n".join(lines) + "\n"
+
+    def export(self, directory: str = ".") -> None:
+        """寫出 metrics.json 與 metrics.prom (原子性取代，供 textfile collector 讀取)"""
+        os.makedirs(directory, exist_ok=True)
+        _atomic_write(os.path.join(directory, Files.METRICS_JSON),
+                      json.dumps(self.to_dict(), ensure_ascii=False, indent=2))
+        _atomic_write(os.path.join(directory, Files.METRICS_PROM), self.to_prometheus())
+
+    def print_summary(self) -> None:
+        """輸出各階段耗時摘要"""
+        data = self.to_dict()
+        if not data:
+            return
+        print("\n" + "=" * 60)
+        print("HTTP 請求統計 (依階段)")
+        print("=" * 60)
+        for name, stats in sorted(data.items(), key=lambda item: -item[1]["wall_seconds"]):
+            cache = stats["cache"]
+            served = cache.get("hit", 0) + cache.get("revalidated", 0)
+            cacheable = served + cache.get("miss", 0)
+            cache_text = f"  快取 {served}/{cacheable}" if cacheable else ""
+            print(
+                f"{name:<14} 請求 {stats['requests']:>4}  網路 {stats['latency_sum']:>8.2f}s  "
+                f"階段 {stats['wall_seconds']:>8.2f}s  p90 {stats['latency_p90']:.2f}s  "
+                f"{stats['bytes'] / 1024:>8.1f} KB  轉址 {stats['redirects']}{cache_text}"
+            )
+
+
+def _atomic_write(path: str, text: str) -> None:
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".metrics-")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+# 預設的全域量測器
+registry = Metrics()
+
+
+def current_stage(thread_id: Optional[int] = None) -> str:
+    """取得指定執行緒 (預設為目前執行緒) 所在的階段"""
+    stack = _stage_stacks.get(thread_id or threading.get_ident())
+    return stack[-1] if stack else DEFAULT_STAGE
+
+
+def current_stage_started(thread_id: Optional[int] = None) -> Optional[float]:
+    """目前階段的進入時間 (time.monotonic)；不在任何階段中時回傳 None"""
+    started = _stage_started.get(thread_id or threading.get_ident())
+    return started[-1] if started else None
+
+
+def add_stage_listener(on_enter: Callable[[str], None], on_exit: Callable[[str], None]) -> None:
+    """註冊階段進入 / 離開的回呼"""
+    _stage_listeners.append((on_enter, on_exit))
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """標記目前執行緒所在的階段；期間的 HTTP 請求都會歸入此階段"""
+    stack = _stage_stacks.setdefault(threading.get_ident(), [])
+    started = _stage_started.setdefault(threading.get_ident(), [])
+    stack.append(name)
+    started.append(time.monotonic())
+    for on_enter, _ in _stage_listeners:
+        on_enter(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.record_stage_time(name, time.perf_counter() - start)
+        for _, on_exit in reversed(_stage_listeners):
+            on_exit(name)
+        started.pop()
+        stack.pop()
+
+
+def in_stage(name: str, func: Callable, *args, **kwargs):
+    """在其他執行緒中以指定階段執行 func (只歸類請求，不重複計算階段耗時)"""
+    stack = _stage_stacks.setdefault(threading.get_ident(), [])
+    started = _stage_started.setdefault(threading.get_ident(), [])
+    stack.append(name)
+    started.append(time.monotonic())
+    try:
+        return func(*args, **kwargs)
+    finally:
+        started.pop()
+        stack.pop()
+
+
+def _response_hook(response: requests.Response, *args, **kwargs) -> requests.Response:
+    registry.record_response(current_stage(), response)
+    return response
+
+
+def instrument(session: requests.Session) -> requests.Session:
+    """為 session 掛上量測 hook"""
+    hooks = session.hooks.setdefault("response", [])
+    if _response_hook not in hooks:
+        hooks.append(_response_hook)
+    return session
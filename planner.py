@@ -0,0 +1,147 @@
+"""
+依剩餘時間與重新載入間隔 (RELOAD_INTERVAL) 產生上課排程：
+課程依序填滿每個時段 (跨時段的課程下個時段接續)，使重新整理次數最少。
+run_all.sh 每個時段只上排程中的課程，輪詢後的補課只用時段內剩下的分鐘數，
+因此實際的重新整理次數與耗時和排程的估計一致。
+
+用法 (供 run_all.sh 使用)：
+    python planner.py next-window   # 輸出下一個時段的 min|url|course_name
+"""
+
+import argparse
+import json
+import os
+import sys
+from dataclasses import asdict, dataclass, field
+from typing import List, Sequence
+
+from utils import Files
+
+
+DEFAULT_RELOAD_INTERVAL = 30  # 分鐘，與 run_all.sh 的 RELOAD_INTERVAL 一致
+DEFAULT_REFRESH_COST = 2.0  # 每次重新整理 (登入檢查、SSO、讀取分頁) 的估計分鐘數
+
+
+@dataclass
+class Segment:
+    """時段中的一段上課：在同一個課程頁停留 minutes 分鐘"""
+
+    course_name: str
+    link: str
+    minutes: int
+
+
+@dataclass
+class StudyWindow:
+    """兩次重新整理之間的一個時段"""
+
+    segments: List[Segment] = field(default_factory=list)
+
+    @property
+    def minutes(self) -> int:
+        return sum(segment.minutes for segment in self.segments)
+
+
+@dataclass
+class StudyPlan:
+    reload_interval: int
+    refresh_cost: float
+    windows: List[StudyWindow] = field(default_factory=list)
+
+    @property
+    def refresh_cycles(self) -> int:
+        return len(self.windows)
+
+    @property
+    def study_minutes(self) -> int:
+        return sum(window.minutes for window in self.windows)
+
+    @property
+    def estimated_wall_minutes(self) -> float:
+        return self.study_minutes + self.refresh_cycles * self.refresh_cost
+
+    def to_dict(self) -> dict:
+        return {
+            "reload_interval": self.reload_interval,
+            "refresh_cost": self.refresh_cost,
+            "refresh_cycles": self.refresh_cycles,
+            "study_minutes": self.study_minutes,
+            "estimated_wall_minutes": self.estimated_wall_minutes,
+            "windows": [
+                {"minutes": window.minutes, "segments": [asdict(s) for s in window.segments]}
+                for window in self.windows
+            ],
+        }
+
+
+def plan_one_per_window(courses: Sequence, reload_interval: int = DEFAULT_RELOAD_INTERVAL,
+                        refresh_cost: float = DEFAULT_REFRESH_COST) -> StudyPlan:
+    """原本 run_all.sh 的做法：最短優先，每個時段只上一門課 (最多 reload_interval 分鐘)"""
+    plan = StudyPlan(reload_interval=reload_interval, refresh_cost=refresh_cost)
+    for course in sorted(courses, key=lambda c: c.wait_min):
+        remaining = course.wait_min
+        while remaining > 0:
+            minutes = min(remaining, reload_interval)
+            plan.windows.append(StudyWindow([Segment(course.course_name, course.link, minutes)]))
+            remaining -= minutes
+    return plan
+
+
+def plan_study(courses: Sequence, reload_interval: int = DEFAULT_RELOAD_INTERVAL,
+               refresh_cost: float = DEFAULT_REFRESH_COST) -> StudyPlan:
+    """環繞 (McNaughton) 時段排程 (以 wait_min，即依累積速率換算的實際上課分鐘數排程)
+
+    課程由短至長依序填入時段，填滿 reload_interval 分鐘就換下一個時段；
+    跨越時段邊界的課程在下一個時段接續上課 (課程本來就可以分次上)。
+    時段數 = ceil(總分鐘數 / reload_interval)，即重新整理次數的下限；
+    只有最後一個時段可能未滿，短課程排在前面儘早完成。
+    """
+    plan = StudyPlan(reload_interval=reload_interval, refresh_cost=refresh_cost)
+    window = StudyWindow()
+    for course in sorted((c for c in courses if c.wait_min > 0), key=lambda c: c.wait_min):
+        remaining = course.wait_min
+        while remaining > 0:
+            if window.minutes >= reload_interval:
+                plan.windows.append(window)
+                window = StudyWindow()
+            minutes = min(remaining, reload_interval - window.minutes)
+            window.segments.append(Segment(course.course_name, course.link, minutes))
+            remaining -= minutes
+    if window.segments:
+        plan.windows.append(window)
+    return plan
+
+
+def write_plan(plan: StudyPlan, file_path: str = Files.STUDY_PLAN) -> None:
+    """寫出結構化排程 (JSON)"""
+    with open(file_path, "w", encoding="utf-8") as f:
+        json.dump(plan.to_dict(), f, ensure_ascii=False, indent=2)
+
+
+def load_next_window(file_path: str = Files.STUDY_PLAN) -> List[Segment]:
+    """讀取排程中的第一個時段"""
+    if not os.path.exists(file_path):
+        return []
+    with open(file_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    windows = data.get("windows", [])
+    if not windows:
+        return []
+    return [Segment(**segment) for segment in windows[0]["segments"]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Study plan helper.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("next-window", help="Print the next window as min|url|course_name lines")
+    args = parser.parse_args()
+
+    if args.command == "next-window":
+        segments = load_next_window()
+        for segment in segments:
+            print(f"{segment.minutes}|{segment.link}|{segment.course_name}")
+        sys.exit(0 if segments else 1)
+
+
+if __name__ == "__main__":
+    main()
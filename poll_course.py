@@ -0,0 +1,160 @@
+"""
+單一課程進度輪詢：上課時段結束後只重新讀取該課程所在的學習紀錄分頁，
+更新修課時間與剩餘分鐘數，並決定是否繼續上同一門課。
+
+用法 (供 run_all.sh 使用)：
+    python poll_course.py "<上課網址>" --studied <本次上課分鐘數>
+
+輸出「剩餘修課分鐘數 建議計時分鐘數」(後者依 study_history 估計的累積速率換算)；
+結束代碼：
+    0  尚未完成，可繼續上同一門課
+    10 已完成
+    2  無法輪詢 (session 失效或找不到課程)，需要重新執行完整流程
+"""
+
+import sys
+from typing import Optional, Tuple
+
+import requests
+
+import ap_host
+import cli
+import logs
+import metrics
+import prewarm
+from cookie_store import CookieStore
+from course_state import CourseState, CourseStateFile, course_id_from_link, load_state, save_state
+from get_course import (
+    SessionExpiredError,
+    create_session,
+    extract_course_info_from_html,
+    fetch_record_page,
+    open_course_record,
+)
+from study_history import StudyHistory
+from utils import parse_time_to_minutes
+
+
+EXIT_CONTINUE = 0
+EXIT_COMPLETED = 10
+EXIT_NEED_REFRESH = 2
+
+logger = logs.get_logger(__name__)
+
+
+def poll_course_progress(
+    session: requests.Session, course_list_url: str, course: CourseState,
+    first_page: Optional[requests.Response] = None
+) -> Optional[str]:
+    """讀取課程所在的分頁並回傳最新的修課時間；找不到時回傳 None
+
+    課程可能因排序變動而移到相鄰分頁，因此依序嘗試原分頁、下一頁與上一頁。
+    第 1 頁以外需要前一頁的 sesskey，所以先讀取第 1 頁 (共 1~2 個請求)；
+    已有第 1 頁 (例如 SSO 直接跳轉到學習紀錄) 時傳入 first_page 沿用。
+    第 1 頁沒有任何紀錄列時拋出 SessionExpiredError；其他分頁沒有紀錄列只代表超過最後一頁。
+    """
+    first_rows = None
+    for page in dict.fromkeys([course.record_page, course.record_page + 1, max(course.record_page - 1, 1)]):
+        with metrics.stage("poll"):
+            if first_page is None:
+                first_page = fetch_record_page(session, course_list_url, 1)
+            response = first_page if page == 1 else fetch_record_page(session, course_list_url, page, first_page.text)
+
+        with metrics.stage("parse"):
+            rows = extract_course_info_from_html(response.text)
+            if page == 1:
+                first_rows = rows
+            elif not rows and first_rows is None:
+                first_rows = extract_course_info_from_html(first_page.text)
+        if not first_rows and not rows:
+            # 通常代表 AP 網域的 session 已失效 (或 cookies 中沒有 AP 主機的 MoodleSession)
+            raise SessionExpiredError(f"學習紀錄第 {page} 頁沒有任何課程")
+        for row in rows:
+            if course_id_from_link(row.link) == course.course_id:
+                course.record_page = page
+                return row.study_time
+    return None
+
+
+def poll_with_sso(
+    session: requests.Session, state: CourseStateFile, course: CourseState
+) -> Tuple[Optional[str], bool]:
+    """輪詢課程進度；AP 網域的 session 無效時經 SSO 重新進入學習紀錄再讀一次
+
+    回傳 (修課時間, 是否經過 SSO)；經過 SSO 時 state.course_list_url 會更新為目前的 AP 主機。
+    重新進入後仍沒有紀錄 (入口網站的 session 也已失效) 時拋出 SessionExpiredError。
+    """
+    try:
+        return poll_course_progress(session, state.course_list_url, course), False
+    except SessionExpiredError:
+        pass
+    with metrics.stage("sso"):
+        first_page, state.course_list_url = open_course_record(session)
+    return poll_course_progress(session, state.course_list_url, course, first_page), True
+
+
+def main():
+    parser = cli.build_parser("Re-read one course's record row and update its remaining minutes.")
+    parser.add_argument("url", help="Study URL (SCORM or course link) or course id from course_state.json")
+    parser.add_argument("--studied", type=float, default=0,
+                        help="Minutes actually spent on the course since the last poll (recorded in study_history.json)")
+    args = parser.parse_args()
+
+    with cli.run_context(args):
+        sys.exit(_run(args))
+
+
+def _run(args) -> int:
+    # 讀取課程狀態與 cookies 的同時預先連線到 AP 主機
+    session = create_session()
+    store = CookieStore()
+    with prewarm.warm_up(session, [ap_host.current().base]):
+        state = load_state()
+        generation, cookies = store.read()
+        prewarm.load_parser()
+
+    course = state.find_by_link(args.url)
+    if not course or not state.course_list_url:
+        logger.warning("找不到課程狀態: %s", args.url)
+        return EXIT_NEED_REFRESH
+    if not cookies:
+        return EXIT_NEED_REFRESH
+    session.cookies.update(cookies)
+
+    try:
+        study_time, reentered = poll_with_sso(session, state, course)
+    except SessionExpiredError:
+        logger.warning("Session 已失效，需要重新登入")
+        return EXIT_NEED_REFRESH
+    except requests.RequestException as e:
+        logger.warning("輪詢課程進度失敗: %s", e)
+        return EXIT_NEED_REFRESH
+    if reentered:
+        # 寫回新的 AP 主機 MoodleSession，下次輪詢與瀏覽器不必再經過 SSO
+        store.update(session.cookies, generation)
+        save_state(state)
+
+    if study_time is None:
+        logger.warning("無法在學習紀錄中找到課程: %s", course.name)
+        return EXIT_NEED_REFRESH
+
+    before = course.remaining_min
+    accrued = parse_time_to_minutes(study_time) - parse_time_to_minutes(course.study_time)
+    remaining = course.update_study_time(study_time)
+    save_state(state)
+
+    history = StudyHistory()
+    history.record(course.course_id, args.studied, accrued)
+    history.save()
+    wait = history.wall_minutes(course.course_id, remaining)
+
+    print(f"{remaining} {wait}")
+    logger.info("%s: 修課時間 %s (+%d 分鐘 / 上課 %g 分鐘)，剩餘 %d 分鐘 (先前 %d 分鐘)，"
+                "估計速率 %.2f，建議計時 %d 分鐘", course.name, study_time, accrued, args.studied, remaining, before,
+                history.accrual_rate(course.course_id), wait,
+                extra={"course_id": course.course_id, "remaining_min": remaining, "wait_min": wait})
+    return EXIT_CONTINUE if remaining > 0 else EXIT_COMPLETED
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+啟動預熱：各入口在讀取設定、cookies 與初始化 HTML 解析器的同時，
+於背景執行緒解析 elearning.taipei 與上次的 AP 主機 (ap_host.json) 的 DNS，並對各主機送出一個 HEAD 請求
+完成 TCP + TLS 交握。請求完成後連線留在 session 的連線池，第一個真正的請求 (Session 檢查 / SSO / 輪詢) 直接沿用。
+
+第一個實際經過網路的請求的 TTFB (送出到收到回應標頭) 與距離預熱開始的時間會寫入日誌，
+等待預熱完成所花的時間計入 metrics 的 prewarm 階段。
+
+HTTP/2 傳輸 (http2.py) 的連線池沒有預先連線的介面，只預先解析 DNS。
+以 --no-prewarm 停用。
+"""
+
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Sequence
+from urllib.parse import urlsplit
+
+import requests
+from bs4 import BeautifulSoup
+
+import http2
+import logs
+import metrics
+import resilience
+
+
+PREWARM_TIMEOUT = 5.0
+
+logger = logs.get_logger(__name__)
+
+
+@dataclass
+class WarmResult:
+    url: str
+    dns_ms: Optional[float] = None
+    connect_ms: Optional[float] = None  # TCP + TLS 交握與 HEAD 請求
+    error: Optional[str] = None
+
+
+def _transport_adapter(session: requests.Session, url: str):
+    """略過 resilience 等包裝層，取得實際持有連線池的 adapter"""
+    adapter = session.get_adapter(url)
+    while hasattr(adapter, "inner"):
+        adapter = adapter.inner
+    return adapter
+
+
+def _warm(session: requests.Session, url: str) -> WarmResult:
+    result = WarmResult(url)
+    parts = urlsplit(url)
+    start = time.perf_counter()
+    try:
+        socket.getaddrinfo(parts.hostname, parts.port or 443, type=socket.SOCK_STREAM)
+        result.dns_ms = (time.perf_counter() - start) * 1000
+
+        adapter = _transport_adapter(session, url)
+        if isinstance(adapter, http2.Http2Adapter):
+            return result
+        # 與 Session.request 相同的環境設定 (proxy、憑證)，連線才會放進實際請求使用的連線池；
+        # 直接交給傳輸層的 adapter，不計入 metrics 也不寫入錄製檔
+        settings = session.merge_environment_settings(url, {}, None, None, None)
+        request = requests.Request("HEAD", url).prepare()
+        response = adapter.send(request, timeout=PREWARM_TIMEOUT, verify=settings["verify"],
+                                proxies=settings["proxies"], cert=settings["cert"])
+        # 讀完回應 (HEAD 沒有內容) 後連線歸還連線池；TLS 1.3 的 session ticket 也在此時一併讀掉
+        response.content
+        result.connect_ms = (time.perf_counter() - start) * 1000 - result.dns_ms
+    except Exception as e:
+        # 預熱失敗不影響後續流程，實際請求時會再連線 (並由 resilience 重試)
+        result.error = f"{type(e).__name__}: {e}"
+    return result
+
+
+class Prewarm:
+    """背景預熱多個主機的連線"""
+
+    def __init__(self, session: requests.Session, urls: Sequence[str]):
+        self.started = time.perf_counter()
+        breaker = resilience.current()
+        targets = []
+        for url in urls:
+            host = urlsplit(url).hostname
+            # 同一主機只預熱一次；斷路中的主機不預熱
+            if host and host not in {urlsplit(t).hostname for t in targets} and not breaker.is_open(host):
+                targets.append(url)
+        self._executor = ThreadPoolExecutor(max_workers=max(len(targets), 1), thread_name_prefix="prewarm")
+        self._futures = [self._executor.submit(_warm, session, url) for url in targets]
+
+    def wait(self, timeout: float = PREWARM_TIMEOUT) -> List[WarmResult]:
+        done, _ = wait_futures(self._futures, timeout)
+        self._executor.shutdown(wait=False)
+        results = [future.result() for future in self._futures if future in done]
+        for result in results:
+            if result.error:
+                logger.debug("預熱 %s 失敗: %s", result.url, result.error)
+            else:
+                logger.debug("預熱 %s：DNS %.0f ms，連線 %s", result.url, result.dns_ms,
+                             f"{result.connect_ms:.0f} ms" if result.connect_ms is not None else "略過",
+                             extra={"dns_ms": result.dns_ms, "connect_ms": result.connect_ms})
+        if len(results) < len(self._futures):
+            logger.debug("預熱逾時 (%.0f 秒)，%d 個主機未完成", timeout, len(self._futures) - len(results))
+        return results
+
+
+def report_first_response(session: requests.Session, started: float) -> None:
+    """第一個實際經過網路的回應到達時，記錄其 TTFB"""
+    reported = False
+
+    def hook(response: requests.Response, *args, **kwargs) -> requests.Response:
+        nonlocal reported
+        # 快取直接命中 / 離線沿用的回應沒有網路往返
+        if reported or getattr(response, "cache_status", None) in ("hit", "stale"):
+            return response
+        reported = True
+        ttfb_ms = response.elapsed.total_seconds() * 1000
+        since_start_ms = (time.perf_counter() - started) * 1000
+        logger.info("首個請求 TTFB %.0f ms (%s，距預熱開始 %.0f ms)", ttfb_ms, urlsplit(response.url).hostname,
+                    since_start_ms, extra={"ttfb_ms": round(ttfb_ms, 1), "since_start_ms": round(since_start_ms, 1)})
+        return response
+
+    # 只標記不移除：hook 清單正在被走訪時移除會讓後面的 hook 被跳過
+    session.hooks.setdefault("response", []).append(hook)
+
+
+def load_parser() -> None:
+    """先建立一次 html.parser 的 BeautifulSoup，讓解析器在等待連線時完成初始化"""
+    BeautifulSoup("<html><body></body></html>", "html.parser")
+
+
+enabled = True
+
+
+@contextmanager
+def warm_up(session: requests.Session, urls: Sequence[str]) -> Iterator[None]:
+    """with 區塊 (讀取設定、cookies 等本機工作) 執行期間在背景預熱連線，離開區塊時等待完成"""
+    started = time.perf_counter()
+    report_first_response(session, started)
+    if not enabled:
+        yield
+        return
+    prewarm = Prewarm(session, urls)
+    try:
+        yield
+    finally:
+        with metrics.stage("prewarm"):
+            prewarm.wait()
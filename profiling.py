@@ -0,0 +1,158 @@
+"""
+內建效能分析：依 metrics.stage() 標記的階段分別收集 cProfile 與 tracemalloc
+資料，並以取樣方式產生 flamegraph 可用的 folded stacks。
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import metrics
+
+
+ROOT_STAGE = "other"
+SAMPLE_INTERVAL = 0.005  # 取樣間隔 (秒)
+TOP_FUNCTIONS = 25
+
+
+@dataclass
+class StageProfile:
+    """單一階段的分析資料"""
+
+    profile: cProfile.Profile
+    wall_seconds: float = 0.0
+    entries: int = 0
+    memory_delta: int = 0
+    memory_peak: int = 0
+
+
+class Profiler:
+    """階段式分析器
+
+    同一時間只有一個 cProfile 啟用：進入巢狀階段時暫停外層，離開時恢復，
+    因此每個階段的統計只包含自身 (不含內層階段) 的耗時。
+    """
+
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        self.stages: Dict[str, StageProfile] = {}
+        self.samples: Counter = Counter()
+        self._thread_id = threading.get_ident()
+        self._active: List[str] = []
+        self._enter_times: List[float] = []
+        self._enter_memory: List[int] = []
+        self._sampler: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def _stage_profile(self, name: str) -> StageProfile:
+        if name not in self.stages:
+            self.stages[name] = StageProfile(profile=cProfile.Profile())
+        return self.stages[name]
+
+    def start(self) -> None:
+        tracemalloc.start()
+        metrics.add_stage_listener(self._on_enter, self._on_exit)
+        self._active.append(ROOT_STAGE)
+        self._enter_times.append(time.perf_counter())
+        self._enter_memory.append(tracemalloc.get_traced_memory()[0])
+        self._stage_profile(ROOT_STAGE).profile.enable()
+
+        self._sampler = threading.Thread(target=self._sample_loop, daemon=True)
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._sampler:
+            self._sampler.join()
+        while self._active:
+            self._on_exit(self._active[-1])
+        tracemalloc.stop()
+
+    def _on_enter(self, name: str) -> None:
+        if threading.get_ident() != self._thread_id:
+            return
+        if self._active:
+            self.stages[self._active[-1]].profile.disable()
+        self._active.append(name)
+        self._enter_times.append(time.perf_counter())
+        self._enter_memory.append(tracemalloc.get_traced_memory()[0])
+        tracemalloc.reset_peak()
+        self._stage_profile(name).profile.enable()
+
+    def _on_exit(self, name: str) -> None:
+        if threading.get_ident() != self._thread_id or not self._active:
+            return
+        stage_profile = self.stages[self._active.pop()]
+        stage_profile.profile.disable()
+        current, peak = tracemalloc.get_traced_memory()
+        stage_profile.wall_seconds += time.perf_counter() - self._enter_times.pop()
+        stage_profile.memory_delta += current - self._enter_memory.pop()
+        stage_profile.memory_peak = max(stage_profile.memory_peak, peak)
+        stage_profile.entries += 1
+        if self._active:
+            self.stages[self._active[-1]].profile.enable()
+
+    def _sample_loop(self) -> None:
+        """定期擷取各執行緒的呼叫堆疊 (folded 格式：stage;frame;frame count)"""
+        sampler_id = threading.get_ident()
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == sampler_id:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(
+                        f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stage_name = metrics.current_stage(thread_id)
+                self.samples[";".join([stage_name] + frames[::-1])] += 1
+
+    def write_report(self) -> str:
+        """輸出 report.txt、各階段 .prof 與 stacks.folded，回傳報告路徑"""
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        report = io.StringIO()
+        report.write("=" * 80 + "\n")
+        report.write("階段效能分析 (耗時含內層階段；函式統計僅計入階段本身)\n")
+        report.write("=" * 80 + "\n")
+        ordered = sorted(self.stages.items(), key=lambda item: -item[1].wall_seconds)
+        for name, stage_profile in ordered:
+            report.write(
+                f"{name:<14} 耗時 {stage_profile.wall_seconds:>9.3f}s  次數 {stage_profile.entries:>4}  "
+                f"記憶體增減 {stage_profile.memory_delta / 1024:>10.1f} KB  "
+                f"峰值 {stage_profile.memory_peak / 1024:>10.1f} KB\n"
+            )
+
+        for name, stage_profile in ordered:
+            prof_path = os.path.join(self.output_dir, f"{name}.prof")
+            stage_profile.profile.dump_stats(prof_path)
+
+            stream = io.StringIO()
+            try:
+                stats = pstats.Stats(stage_profile.profile, stream=stream)
+            except TypeError:
+                # 該階段沒有任何呼叫紀錄
+                continue
+            stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+            report.write("\n" + "-" * 80 + "\n")
+            report.write(f"[{name}] 累計耗時前 {TOP_FUNCTIONS} 名\n")
+            report.write(stream.getvalue())
+
+        report_path = os.path.join(self.output_dir, "report.txt")
+        with open(report_path, "w", encoding="utf-8") as f:
+            f.write(report.getvalue())
+
+        with open(os.path.join(self.output_dir, "stacks.folded"), "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+        return report_path
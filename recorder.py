@@ -0,0 +1,248 @@
+"""
+錄製模式：將每一組 HTTP 請求 / 回應寫入壓縮、僅附加 (append-only) 並帶索引的
+封存檔，供之後離線重現與測試解析器。
+
+封存目錄結構：
+- segment-000001.gz ...：每筆紀錄各自是一個 gzip member，可直接以 offset 隨機讀取
+- index.jsonl：每筆紀錄一行 (segment、offset、length、method、url、status、stage)
+- 單一 segment 超過 max_segment_bytes 時換新檔；超過 max_segments 時刪除最舊的 segment，
+  並從索引移除指向該 segment 的紀錄
+- 密碼、sesskey、SSO token 等敏感欄位 (表單與網址查詢字串) 及 cookie header 皆以 *** 取代
+"""
+
+import base64
+import glob
+import gzip
+import json
+import os
+import re
+import tempfile
+import time
+from typing import Any, Dict, Iterator, Optional, Set
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+
+import metrics
+from utils import Files, file_lock
+
+
+INDEX_FILE = "index.jsonl"
+SEGMENT_PATTERN = "segment-{:06d}.gz"
+
+# 需要遮蔽的表單欄位與 header
+SECRET_FIELDS = {"password", "_token", "captcha", "sesskey", "USER_PW"}
+# 需要遮蔽的網址查詢參數 (不分大小寫；SSO 跳轉網址帶有一次性 token)
+SECRET_QUERY_FIELDS = {name.lower() for name in SECRET_FIELDS} | {"token", "ticket"}
+SECRET_HEADERS = {"cookie", "set-cookie", "authorization"}
+REDACTED = "***"
+
+
+def _redact_url(url: Optional[str]) -> Optional[str]:
+    """遮蔽網址查詢字串中的敏感參數"""
+    if not url or "?" not in url:
+        return url
+    parts = urlsplit(url)
+    pairs = parse_qsl(parts.query, keep_blank_values=True)
+    if not any(k.lower() in SECRET_QUERY_FIELDS for k, _ in pairs):
+        return url
+    query = urlencode([(k, REDACTED if k.lower() in SECRET_QUERY_FIELDS else v) for k, v in pairs], safe="*")
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, query, parts.fragment))
+
+
+def _redact_headers(headers) -> Dict[str, str]:
+    redacted = {}
+    for key, value in headers.items():
+        if key.lower() in SECRET_HEADERS:
+            value = REDACTED
+        elif key.lower() == "location":
+            value = _redact_url(value)
+        redacted[key] = value
+    return redacted
+
+
+def _redact_body(body: Any) -> Optional[str]:
+    """遮蔽 x-www-form-urlencoded 內容中的敏感欄位"""
+    if body is None:
+        return None
+    if isinstance(body, bytes):
+        try:
+            body = body.decode("utf-8")
+        except UnicodeDecodeError:
+            return f"<{len(body)} bytes>"
+    pairs = parse_qsl(body, keep_blank_values=True)
+    if not pairs:
+        return body
+    return urlencode([(k, REDACTED if k in SECRET_FIELDS else v) for k, v in pairs])
+
+
+def _encode_body(content: bytes) -> Dict[str, str]:
+    try:
+        return {"body": content.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"body_b64": base64.b64encode(content).decode("ascii")}
+
+
+class Recorder:
+    """將 HTTP 往返寫入封存目錄"""
+
+    def __init__(self, directory: str = Files.RECORDINGS_DIR,
+                 max_segment_bytes: int = 64 * 1024 * 1024, max_segments: int = 20):
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segments = max_segments
+        self.records = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _segment_numbers(self):
+        numbers = []
+        for path in glob.glob(os.path.join(self.directory, "segment-*.gz")):
+            match = re.search(r"segment-(\d+)\.gz$", path)
+            if match:
+                numbers.append(int(match.group(1)))
+        return sorted(numbers)
+
+    def _current_segment(self) -> str:
+        """目前可寫入的 segment 檔名 (必要時輪替)"""
+        numbers = self._segment_numbers()
+        number = numbers[-1] if numbers else 1
+        path = os.path.join(self.directory, SEGMENT_PATTERN.format(number))
+        if os.path.exists(path) and os.path.getsize(path) >= self.max_segment_bytes:
+            number += 1
+            path = os.path.join(self.directory, SEGMENT_PATTERN.format(number))
+            numbers.append(number)
+
+        # 超過保留數量時刪除最舊的 segment，並從索引移除對應的紀錄
+        removed = set()
+        for old in numbers[:-self.max_segments]:
+            os.remove(os.path.join(self.directory, SEGMENT_PATTERN.format(old)))
+            removed.add(SEGMENT_PATTERN.format(old))
+        if removed:
+            self._prune_index(removed)
+        return path
+
+    def _prune_index(self, removed: Set[str]) -> None:
+        """改寫 index.jsonl，只保留仍存在的 segment 的紀錄 (呼叫端持有鎖)"""
+        index_path = os.path.join(self.directory, INDEX_FILE)
+        if not os.path.exists(index_path):
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".index-")
+        with os.fdopen(fd, "w", encoding="utf-8") as out, open(index_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    segment = json.loads(line)["segment"]
+                except (ValueError, KeyError, TypeError):
+                    continue
+                if segment not in removed:
+                    out.write(line)
+        os.replace(tmp_path, index_path)
+
+    def record(self, response: requests.Response) -> None:
+        """寫入一次 HTTP 往返"""
+        request = response.request
+        entry = {
+            "time": time.time(),
+            "stage": metrics.current_stage(),
+            "method": request.method,
+            "url": _redact_url(request.url),
+            "request_headers": _redact_headers(request.headers),
+            "request_body": _redact_body(request.body),
+            "status": response.status_code,
+            "final_url": _redact_url(response.url),
+            "response_headers": _redact_headers(response.headers),
+            "elapsed": response.elapsed.total_seconds(),
+        }
+        entry.update(_encode_body(response.content or b""))
+        data = gzip.compress(json.dumps(entry, ensure_ascii=False).encode("utf-8"))
+
+        with file_lock(os.path.join(self.directory, ".lock")):
+            segment = self._current_segment()
+            with open(segment, "ab") as f:
+                offset = f.tell()
+                f.write(data)
+            index_entry = {
+                "segment": os.path.basename(segment),
+                "offset": offset,
+                "length": len(data),
+                "time": entry["time"],
+                "stage": entry["stage"],
+                "method": entry["method"],
+                "url": entry["url"],
+                "status": entry["status"],
+            }
+            with open(os.path.join(self.directory, INDEX_FILE), "a", encoding="utf-8") as f:
+                f.write(json.dumps(index_entry, ensure_ascii=False) + "\n")
+        self.records += 1
+
+
+# 目前啟用中的錄製器 (由 cli 的 --record 開啟)
+active: Optional[Recorder] = None
+
+
+def start(directory: str) -> Recorder:
+    global active
+    active = Recorder(directory)
+    return active
+
+
+def stop() -> None:
+    global active
+    active = None
+
+
+def _response_hook(response: requests.Response, *args, **kwargs) -> requests.Response:
+    # 快取直接命中 / 離線沿用的回應沒有實際的網路往返，不錄製
+    if active and getattr(response, "cache_status", None) not in ("hit", "stale"):
+        try:
+            active.record(response)
+        except OSError as e:
+            print(f"[警告] 錄製回應失敗: {e}")
+    return response
+
+
+def instrument(session: requests.Session) -> requests.Session:
+    """為 session 掛上錄製 hook (只在錄製模式啟用時寫入)"""
+    hooks = session.hooks.setdefault("response", [])
+    if _response_hook not in hooks:
+        hooks.append(_response_hook)
+    return session
+
+
+def iter_index(directory: str, url_pattern: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """逐行讀取索引，可用正規表示式過濾網址"""
+    pattern = re.compile(url_pattern) if url_pattern else None
+    index_path = os.path.join(directory, INDEX_FILE)
+    if not os.path.exists(index_path):
+        return
+    with open(index_path, "r", encoding="utf-8") as f:
+        for line in f:
+            entry = json.loads(line)
+            if pattern and not pattern.search(entry["url"]):
+                continue
+            yield entry
+
+
+def read_record(directory: str, index_entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """依索引讀取單筆紀錄；segment 已被輪替刪除時回傳 None"""
+    path = os.path.join(directory, index_entry["segment"])
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        f.seek(index_entry["offset"])
+        data = f.read(index_entry["length"])
+    return json.loads(gzip.decompress(data).decode("utf-8"))
+
+
+def iter_records(directory: str, url_pattern: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """依序讀取封存中的紀錄 (供解析器回歸測試與效能測試使用)"""
+    for entry in iter_index(directory, url_pattern):
+        record = read_record(directory, entry)
+        if record is not None:
+            yield record
+
+
+def record_text(record: Dict[str, Any]) -> str:
+    """取得紀錄的回應內容文字"""
+    if "body" in record:
+        return record["body"]
+    return base64.b64decode(record["body_b64"]).decode("utf-8", errors="replace")
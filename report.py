@@ -0,0 +1,283 @@
+"""
+全體帳號時數與完成度報表：把 export.py 匯出的課程紀錄載入為 NumPy 欄位，
+以向量化運算計算各帳號的總時數、完成率、剩餘分鐘分布與預估完成日期。
+未安裝 numpy 時改用逐筆計算 (結果相同，供小量資料與對照使用)。
+
+用法：
+    python report.py --work-dir accounts             # 讀取 batch.py 各帳號的 courses.jsonl
+    python report.py --input fleet.parquet --json report.json
+"""
+
+import argparse
+import datetime
+import json
+import math
+import os
+import sys
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import export
+from utils import Files
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+DEFAULT_DAILY_MINUTES = 480  # 每個帳號每天可上課的分鐘數
+PERCENTILES = (50, 90, 99)
+HISTOGRAM_EDGES = (0, 30, 60, 120, 240)  # 剩餘分鐘的分組下限，最後一組無上限
+REPORT_COLUMNS = ("account", "hours", "required_minutes", "study_minutes", "status")
+
+
+@dataclass
+class AccountSummary:
+    account: str
+    courses: int
+    completed: int
+    total_hours: float
+    completed_hours: float
+    completion_ratio: float
+    remaining_minutes: int
+    projected_finish: str
+
+
+@dataclass
+class FleetReport:
+    accounts: List[AccountSummary] = field(default_factory=list)
+    remaining_percentiles: Dict[str, float] = field(default_factory=dict)
+    remaining_histogram: List[Tuple[str, int]] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return {
+            "accounts": [asdict(a) for a in self.accounts],
+            "remaining_percentiles": self.remaining_percentiles,
+            "remaining_histogram": [{"bucket": label, "courses": count}
+                                    for label, count in self.remaining_histogram],
+        }
+
+
+def is_completed_status(status: str) -> bool:
+    """學習紀錄的「課程完成與否」是否代表已完成"""
+    return "完成" in status and "未完成" not in status and "進行中" not in status
+
+
+def _histogram_labels() -> List[str]:
+    labels = [f"{low}-{high}" for low, high in zip(HISTOGRAM_EDGES, HISTOGRAM_EDGES[1:])]
+    return labels + [f"{HISTOGRAM_EDGES[-1]}+"]
+
+
+def _finish_date(today: datetime.date, remaining: int, daily_minutes: int) -> str:
+    return (today + datetime.timedelta(days=math.ceil(remaining / daily_minutes))).isoformat()
+
+
+def _percentile(sorted_values: Sequence[int], q: float) -> float:
+    """與 numpy.percentile 預設 (線性內插) 相同的百分位數"""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q / 100
+    low = math.floor(position)
+    high = min(low + 1, len(sorted_values) - 1)
+    return float(sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low))
+
+
+def summarize_records(records: Iterable[export.CourseRecord], daily_minutes: int = DEFAULT_DAILY_MINUTES,
+                      today: Optional[datetime.date] = None) -> FleetReport:
+    """逐筆計算 (不需要 numpy)"""
+    today = today or datetime.date.today()
+    totals: Dict[str, List[float]] = {}
+    incomplete_remaining = []
+    for record in records:
+        completed = is_completed_status(record.status)
+        remaining = 0
+        if not completed:
+            # 沒有修課時間的紀錄 (enroll / list_course 匯出) 視為尚未上課
+            remaining = max(record.required_minutes - (record.study_minutes or 0), 0)
+            incomplete_remaining.append(remaining)
+        t = totals.setdefault(record.account, [0, 0, 0.0, 0.0, 0])
+        t[0] += 1
+        t[1] += completed
+        t[2] += record.hours
+        t[3] += record.hours if completed else 0.0
+        t[4] += remaining
+
+    report = FleetReport()
+    for account in sorted(totals):
+        courses, completed, hours, completed_hours, remaining = totals[account]
+        report.accounts.append(AccountSummary(
+            account=account,
+            courses=int(courses),
+            completed=int(completed),
+            total_hours=round(hours, 2),
+            completed_hours=round(completed_hours, 2),
+            completion_ratio=round(completed / courses, 4),
+            remaining_minutes=int(remaining),
+            projected_finish=_finish_date(today, int(remaining), daily_minutes),
+        ))
+
+    incomplete_remaining.sort()
+    report.remaining_percentiles = {
+        f"p{q}": _percentile(incomplete_remaining, q) for q in PERCENTILES}
+    report.remaining_percentiles["max"] = float(incomplete_remaining[-1]) if incomplete_remaining else 0.0
+    counts = [0] * len(HISTOGRAM_EDGES)
+    for remaining in incomplete_remaining:
+        index = sum(1 for edge in HISTOGRAM_EDGES[1:] if remaining >= edge)
+        counts[index] += 1
+    report.remaining_histogram = list(zip(_histogram_labels(), counts))
+    return report
+
+
+def load_columns(records: Iterable[export.CourseRecord]) -> Dict[str, "np.ndarray"]:
+    """把紀錄轉成欄位陣列；帳號與狀態在讀取時就以字典編碼成整數"""
+    account_index: Dict[str, int] = {}
+    status_index: Dict[str, int] = {}
+    account_codes, status_codes, hours, required, minutes = [], [], [], [], []
+    for record in records:
+        account_codes.append(account_index.setdefault(record.account, len(account_index)))
+        status_codes.append(status_index.setdefault(record.status, len(status_index)))
+        hours.append(record.hours)
+        required.append(record.required_minutes)
+        minutes.append(record.study_minutes or 0)
+    return _encode_columns(list(account_index), account_codes, list(status_index), status_codes,
+                           hours, required, minutes)
+
+
+def load_columns_from_file(path: str) -> Dict[str, "np.ndarray"]:
+    """讀取匯出檔；Parquet / Arrow 直接以欄位 (dictionary encode) 讀取，不經過逐筆物件"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".parquet", ".arrow") and export.pyarrow is not None:
+        if ext == ".parquet":
+            available = export.pyarrow.parquet.read_schema(path).names
+            table = export.pyarrow.parquet.read_table(
+                path, columns=[name for name in REPORT_COLUMNS if name in available])
+        else:
+            table = export.pyarrow.ipc.open_file(path).read_all()
+        accounts = table.column("account").combine_chunks().dictionary_encode()
+        statuses = table.column("status").combine_chunks().dictionary_encode()
+        hours = table.column("hours").to_numpy()
+        if "required_minutes" in table.column_names:
+            required = table.column("required_minutes").to_numpy()
+        else:
+            # 沒有此欄位的舊匯出檔：以認證時數的一半計算
+            required = np.floor(np.floor(hours * 60) / 2)
+        return _encode_columns(
+            accounts.dictionary.to_pylist(), accounts.indices.to_numpy(zero_copy_only=False),
+            statuses.dictionary.to_pylist(), statuses.indices.to_numpy(zero_copy_only=False),
+            hours, required, table.column("study_minutes").fill_null(0).to_numpy())
+    return load_columns(export.iter_records(path))
+
+
+def _encode_columns(account_names: List[str], account_codes, status_names: List[str], status_codes,
+                    hours, required, minutes) -> Dict[str, "np.ndarray"]:
+    completed_by_status = np.array([is_completed_status(s) for s in status_names], dtype=bool)
+    status_codes = np.asarray(status_codes, dtype=np.int64)
+    return {
+        "account_names": np.array(account_names, dtype=object),
+        "account": np.asarray(account_codes, dtype=np.int64),
+        "hours": np.asarray(hours, dtype=np.float64),
+        "required_minutes": np.asarray(required, dtype=np.int64),
+        "study_minutes": np.asarray(minutes, dtype=np.int64),
+        "completed": completed_by_status[status_codes] if status_names else np.zeros(0, dtype=bool),
+    }
+
+
+def summarize_columns(columns: Dict[str, "np.ndarray"], daily_minutes: int = DEFAULT_DAILY_MINUTES,
+                      today: Optional[datetime.date] = None) -> FleetReport:
+    """向量化計算：以 bincount 依帳號彙總，整欄計算剩餘分鐘"""
+    today = today or datetime.date.today()
+    names = columns["account_names"]
+    codes = columns["account"]
+    hours = columns["hours"]
+    completed = columns["completed"]
+    size = len(names)
+
+    remaining = np.where(completed, 0, np.maximum(columns["required_minutes"] - columns["study_minutes"], 0))
+
+    courses = np.bincount(codes, minlength=size)
+    completed_count = np.bincount(codes, weights=completed, minlength=size)
+    total_hours = np.bincount(codes, weights=hours, minlength=size)
+    completed_hours = np.bincount(codes, weights=np.where(completed, hours, 0.0), minlength=size)
+    remaining_sum = np.bincount(codes, weights=remaining, minlength=size).astype(np.int64)
+    finish = np.datetime64(today) + np.ceil(remaining_sum / daily_minutes).astype("timedelta64[D]")
+
+    report = FleetReport()
+    for i in sorted(range(size), key=lambda i: names[i]):
+        report.accounts.append(AccountSummary(
+            account=str(names[i]),
+            courses=int(courses[i]),
+            completed=int(completed_count[i]),
+            total_hours=round(float(total_hours[i]), 2),
+            completed_hours=round(float(completed_hours[i]), 2),
+            completion_ratio=round(float(completed_count[i] / courses[i]), 4),
+            remaining_minutes=int(remaining_sum[i]),
+            projected_finish=str(finish[i]),
+        ))
+
+    incomplete_remaining = remaining[~completed]
+    if incomplete_remaining.size:
+        values = np.percentile(incomplete_remaining, PERCENTILES)
+        report.remaining_percentiles = {f"p{q}": float(v) for q, v in zip(PERCENTILES, values)}
+        report.remaining_percentiles["max"] = float(incomplete_remaining.max())
+    else:
+        report.remaining_percentiles = {f"p{q}": 0.0 for q in PERCENTILES}
+        report.remaining_percentiles["max"] = 0.0
+    buckets = np.searchsorted(np.asarray(HISTOGRAM_EDGES[1:]), incomplete_remaining, side="right")
+    counts = np.bincount(buckets, minlength=len(HISTOGRAM_EDGES))
+    report.remaining_histogram = [(label, int(c)) for label, c in zip(_histogram_labels(), counts)]
+    return report
+
+
+def build_report(path: Optional[str] = None, work_dir: Optional[str] = None,
+                 daily_minutes: int = DEFAULT_DAILY_MINUTES,
+                 today: Optional[datetime.date] = None) -> FleetReport:
+    """讀取單一匯出檔或 batch.py 工作目錄並產生報表 (有 numpy 時使用向量化版本)"""
+    if np is None:
+        records = export.iter_records(path) if path else export.iter_account_records(work_dir)
+        return summarize_records(records, daily_minutes, today)
+    columns = load_columns_from_file(path) if path else load_columns(export.iter_account_records(work_dir))
+    return summarize_columns(columns, daily_minutes, today)
+
+
+def print_report(report: FleetReport) -> None:
+    print("=" * 96)
+    print("全體帳號時數與完成度報表")
+    print("=" * 96)
+    for a in report.accounts:
+        print(f"{a.account:<16} 課程: {a.courses:>5}  完成: {a.completed:>5} ({a.completion_ratio:6.1%})  "
+              f"時數: {a.completed_hours:7.1f}/{a.total_hours:7.1f}  "
+              f"剩餘: {a.remaining_minutes:>6} 分鐘  預估完成: {a.projected_finish}")
+    print("-" * 96)
+    percentiles = "  ".join(f"{k}: {v:.0f}" for k, v in report.remaining_percentiles.items())
+    print(f"未完成課程剩餘分鐘  {percentiles}")
+    print("分布: " + "  ".join(f"{label}: {count}" for label, count in report.remaining_histogram))
+    print("=" * 96)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fleet-wide hours and completion report.")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--input", help="Combined export (.jsonl/.csv/.parquet/.arrow) from export.py")
+    source.add_argument("--work-dir", default="accounts",
+                        help=f"batch.py base directory with per-account {Files.COURSE_EXPORT} (default: accounts)")
+    parser.add_argument("--daily-minutes", type=int, default=DEFAULT_DAILY_MINUTES,
+                        help=f"Study minutes per account per day used for projections (default: {DEFAULT_DAILY_MINUTES})")
+    parser.add_argument("--json", metavar="PATH", help="Also write the report as JSON")
+    args = parser.parse_args()
+
+    try:
+        report = build_report(args.input, None if args.input else args.work_dir, args.daily_minutes)
+    except (OSError, ValueError) as e:
+        print(f"錯誤: {e}")
+        sys.exit(1)
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report.to_dict(), f, ensure_ascii=False, indent=2)
+        print(f"\n報表已儲存至 {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""
+連線韌性：包在 session 的 adapter 外層，為每個請求加上依階段決定的期限、
+帶抖動的指數退避重試，以及依主機 (elearning.taipei、ap1、ap2 ...) 的斷路器。
+
+- 期限：進入 metrics 階段 (metrics.stage) 時開始計時，階段內所有請求 (含重試) 共用同一個期限，
+  每次嘗試的 timeout 取剩餘時間 (期限已過時只給 MIN_ATTEMPT_TIMEOUT 且不再重試)；
+  不在任何已設定期限的階段中的請求，各自使用 DEFAULT_DEADLINE。呼叫端明確指定 timeout 時沿用呼叫端的值
+- 重試：連線錯誤、逾時與 502/503/504 才重試；非 GET 請求只在連線建立逾時
+  (請求尚未送出) 時重試，避免重複送出表單
+- 斷路器：同一主機連續失敗達門檻後直接失敗，RESET_TIMEOUT 秒後放行一個試探請求；
+  狀態存在 circuit.json，run_all.sh 接續執行的各程序會共用
+- 斷路或重試用盡時，可快取的 GET 改用 http_cache 中的舊內容 (cache_status 為 stale)，
+  讓整個流程以上次的資料繼續，而不是卡住
+"""
+
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import http_cache
+import logs
+import metrics
+from utils import Files, file_lock
+
+
+# 各階段 (從進入階段起算，階段內所有請求共用) 的期限 (秒)；
+# pagination 涵蓋讀取全部分頁，login 涵蓋驗證碼重試 (含手動輸入)
+STAGE_DEADLINES: Dict[str, float] = {
+    "login": 90.0,
+    "session_check": 10.0,
+    "sso": 45.0,
+    "pagination": 180.0,
+    "detail": 30.0,
+    "course_view": 20.0,
+    "scorm": 20.0,
+    "poll": 20.0,
+    "search": 30.0,
+    "enroll": 30.0,
+}
+DEFAULT_DEADLINE = 30.0  # 單一請求 (含重試)
+CONNECT_TIMEOUT = 5.0
+MIN_ATTEMPT_TIMEOUT = 1.0
+
+MAX_ATTEMPTS = 3
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8.0
+RETRY_STATUSES = frozenset({502, 503, 504})
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 60.0
+
+logger = logs.get_logger(__name__)
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """主機處於斷路狀態，請求未送出"""
+
+
+def backoff_delay(attempt: int) -> float:
+    """第 attempt 次失敗後的等待秒數 (full jitter)"""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+@dataclass
+class HostState:
+    failures: int = 0
+    opened_at: float = 0.0
+    probe_at: float = 0.0  # 半開時放行試探請求的時間 (0 表示沒有進行中的試探)
+
+
+class CircuitBreaker:
+    """依主機記錄連續失敗次數；狀態只在變化時寫入檔案，檔案被其他程序更新時重新讀取"""
+
+    def __init__(self, file_path: str = Files.CIRCUIT, threshold: int = FAILURE_THRESHOLD,
+                 reset_timeout: float = RESET_TIMEOUT):
+        self.file_path = file_path
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._signature: Optional[tuple] = None
+        self.hosts: Dict[str, HostState] = self._load()
+
+    def _file_signature(self) -> Optional[tuple]:
+        try:
+            stat = os.stat(self.file_path)
+        except (OSError, TypeError, ValueError):
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _load(self) -> Dict[str, HostState]:
+        self._signature = self._file_signature() if self.file_path else None
+        if self._signature is None:
+            return {}
+        try:
+            with open(self.file_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return {host: HostState(**state) for host, state in data.items()}
+        except (OSError, ValueError, TypeError):
+            return {}
+
+    def _refresh(self) -> None:
+        """circuit.json 的 mtime 改變 (其他程序記錄了失敗或恢復) 時重新讀取"""
+        if self.file_path and self._file_signature() != self._signature:
+            self.hosts = self._load()
+
+    def _persist(self, host: str) -> None:
+        """只更新單一主機的紀錄 (其他程序可能同時更新別的主機)"""
+        if not self.file_path:
+            return
+        with file_lock(self.file_path + ".lock"):
+            hosts = self._load()
+            hosts[host] = self.hosts[host]
+            self._write(hosts)
+
+    def _write(self, hosts: Dict[str, HostState]) -> None:
+        """以暫存檔寫入全部主機的紀錄 (呼叫端持有檔案鎖)"""
+        directory = os.path.dirname(os.path.abspath(self.file_path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".circuit-")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({h: asdict(s) for h, s in hosts.items()}, f)
+        os.replace(tmp_path, self.file_path)
+        self.hosts = hosts
+        self._signature = self._file_signature()
+
+    def _tripped(self, state: Optional[HostState]) -> bool:
+        return bool(state and state.failures >= self.threshold)
+
+    def _probing(self, state: HostState, now: float) -> bool:
+        # 試探請求的程序中途結束時，冷卻時間過後再放行下一個試探
+        return bool(state.probe_at and now - state.probe_at < self.reset_timeout)
+
+    def is_open(self, host: str) -> bool:
+        """斷路中，或冷卻時間已過但試探請求尚未有結果"""
+        with self._lock:
+            self._refresh()
+            state = self.hosts.get(host)
+            now = time.time()
+            return self._tripped(state) and (now - state.opened_at < self.reset_timeout
+                                             or self._probing(state, now))
+
+    def allow(self, host: str) -> bool:
+        """斷路中回傳 False；冷卻時間過後 (半開) 所有程序合計只放行一個試探請求，其結果決定是否恢復"""
+        with self._lock:
+            self._refresh()
+            state = self.hosts.get(host)
+            if not self._tripped(state):
+                return True
+            now = time.time()
+            if now - state.opened_at < self.reset_timeout or self._probing(state, now):
+                return False
+            if not self.file_path:
+                state.probe_at = now
+                return True
+            # 在檔案鎖內確認沒有其他程序已經開始試探
+            with file_lock(self.file_path + ".lock"):
+                self.hosts = self._load()
+                state = self.hosts.get(host)
+                if not self._tripped(state):
+                    return True
+                if now - state.opened_at < self.reset_timeout or self._probing(state, now):
+                    return False
+                state.probe_at = now
+                self._write(self.hosts)
+            logger.info("%s 冷卻時間已過，放行一個試探請求", host)
+            return True
+
+    def success(self, host: str) -> None:
+        with self._lock:
+            self._refresh()
+            state = self.hosts.get(host)
+            if state and (state.failures or state.probe_at):
+                if state.failures >= self.threshold:
+                    logger.info("%s 已恢復連線，解除斷路", host)
+                self.hosts[host] = HostState()
+                self._persist(host)
+
+    def failure(self, host: str) -> None:
+        with self._lock:
+            self._refresh()
+            state = self.hosts.setdefault(host, HostState())
+            state.failures += 1
+            if state.failures >= self.threshold:
+                if state.failures == self.threshold:
+                    logger.warning("%s 連續失敗 %d 次，暫停連線 %.0f 秒", host, state.failures, self.reset_timeout)
+                # 試探失敗時重新開始冷卻
+                state.opened_at = time.time()
+                state.probe_at = 0.0
+            self._persist(host)
+
+
+def _deadline() -> float:
+    """目前階段的期限 (time.monotonic)；階段沒有設定期限時從現在起算 DEFAULT_DEADLINE"""
+    budget = STAGE_DEADLINES.get(metrics.current_stage())
+    started = metrics.current_stage_started()
+    if budget is None or started is None:
+        return time.monotonic() + DEFAULT_DEADLINE
+    return started + budget
+
+
+def _retryable(method: str, error: Optional[Exception]) -> bool:
+    if method in IDEMPOTENT_METHODS:
+        return True
+    return isinstance(error, requests.ConnectTimeout)
+
+
+class ResilientAdapter(HTTPAdapter):
+    """包裝既有的 adapter (例如 http_cache.CachingAdapter)，加上期限、重試與斷路器"""
+
+    def __init__(self, inner: HTTPAdapter, breaker: CircuitBreaker):
+        super().__init__()
+        self.inner = inner
+        self.breaker = breaker
+
+    def send(self, request: requests.PreparedRequest, stream: bool = False, timeout=None,
+             **kwargs) -> requests.Response:
+        host = urlsplit(request.url).hostname or ""
+        deadline = _deadline()
+
+        if not self.breaker.allow(host):
+            return self._fallback(request, CircuitOpenError(f"{host} 暫停連線中 (斷路器)", request=request))
+
+        attempt = 0
+        while True:
+            attempt += 1
+            attempt_timeout = timeout
+            if attempt_timeout is None:
+                remaining = max(deadline - time.monotonic(), MIN_ATTEMPT_TIMEOUT)
+                attempt_timeout = (min(CONNECT_TIMEOUT, remaining), remaining)
+
+            error: Optional[Exception] = None
+            response: Optional[requests.Response] = None
+            try:
+                response = self.inner.send(request, stream=stream, timeout=attempt_timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    self.breaker.success(host)
+                    return response
+
+            self.breaker.failure(host)
+            delay = backoff_delay(attempt)
+            give_up = (attempt >= MAX_ATTEMPTS
+                       or not _retryable(request.method, error)
+                       or time.monotonic() + delay >= deadline
+                       or not self.breaker.allow(host))
+            if give_up:
+                if response is not None:
+                    return response
+                return self._fallback(request, error)
+
+            logger.info("%s %s 失敗 (%s)，%.1f 秒後重試 (%d/%d)", request.method, request.url,
+                        type(error).__name__ if error else response.status_code, delay, attempt, MAX_ATTEMPTS,
+                        extra={"host": host, "attempt": attempt})
+            if response is not None:
+                response.close()
+            time.sleep(delay)
+
+    def _fallback(self, request: requests.PreparedRequest, error: Exception) -> requests.Response:
+        response = http_cache.stale_response(request)
+        if response is None:
+            raise error
+        logger.warning("%s 無法連線 (%s)，改用快取內容", request.url, type(error).__name__)
+        return response
+
+    def close(self) -> None:
+        self.inner.close()
+        super().close()
+
+
+enabled = True
+_breaker: Optional[CircuitBreaker] = None
+
+
+def current() -> CircuitBreaker:
+    """取得本程序共用的斷路器"""
+    global _breaker
+    if _breaker is None:
+        _breaker = CircuitBreaker()
+    return _breaker
+
+
+def instrument(session: requests.Session) -> requests.Session:
+    """把 session 已掛載的 https / http adapter 包上韌性層 (應在其他 adapter 掛載後呼叫)"""
+    if enabled:
+        for prefix in ("https://", "http://"):
+            adapter = session.adapters.get(prefix)
+            if adapter is not None and not isinstance(adapter, ResilientAdapter):
+                session.mount(prefix, ResilientAdapter(adapter, current()))
+    return session
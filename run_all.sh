@@ -2,64 +2,147 @@
 
 # 設定腳本路徑（取得此腳本所在的絕對路徑）
 SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
+RELOAD_INTERVAL=30  # 設定每 30 分鐘重新載入一次 (避免平台工作逾時)
+STATUS_PORT="${STATUS_PORT:-8765}"  # 狀態 API 埠號 (curl localhost:8765/status)
+CONTROL_DIR="loop_control"  # 狀態 API 寫入的控制旗標 (skip / refresh / pause)，與其他狀態檔同在工作目錄
 
-# 清理瀏覽器的函數：強制結束所有瀏覽器程序，確保只有一個頁面被開啟
+# 常駐瀏覽器無法使用時 (找不到 Chromium、缺少 websocket-client 等) 改用系統瀏覽器開啟
+LEGACY_BROWSER=false
+
+# 清理瀏覽器的函數：強制結束所有瀏覽器程序，確保只有一個頁面被開啟 (僅供系統瀏覽器備援使用)
 cleanup_browser() {
     echo "[$(date +%H:%M:%S)] 正在強制清理既有瀏覽器程序，確保環境單純..."
-    # 使用 killall 強制結束程序，這是確保只有一個課堂頁面被開啟最可靠的方法
     killall "Brave Browser" 2>/dev/null
     killall "Google Chrome" 2>/dev/null
     killall "Safari" 2>/dev/null
 
     # 刪除 session 紀錄，防止啟動時回復上次的分頁 (Chromium 核心適用)
-    # 這能解決「Brave 沒有正常關閉，是否要回復頁面」的小視窗問題
     rm -rf "$HOME/Library/Application Support/BraveSoftware/Brave-Browser/"*/Sessions/* 2>/dev/null
     rm -rf "$HOME/Library/Application Support/Google/Chrome/"*/Sessions/* 2>/dev/null
-
-    # 稍微多等一下讓系統釋放資源
     sleep 3
 }
 
-while true; do
-    # 每次重新開始流程時都先清理一次瀏覽器
-    cleanup_browser
+# 以系統瀏覽器開啟網址 (原本的做法：macOS 以 Brave 開新視窗，其他系統用 xdg-open)
+legacy_open_course_page() {
+    if [ "$(uname)" = "Darwin" ]; then
+        cleanup_browser
+        open -a "Brave Browser" -F "$1" --args --new-window --restore-last-session=0 --hide-crash-restore-bubble
+    else
+        xdg-open "$1" > /dev/null 2>&1
+    fi
+}
+
+# 開啟課程頁面的函數：以常駐瀏覽器 (browser.py，透過 DevTools Protocol 控制) 的唯一分頁開啟網址
+open_course_page() {
+    # 為了確保瀏覽器真的會重新載入，我們在網址後加上時間戳記
+    local timestamp url_to_open
+    timestamp=$(date +%s)
+    if [[ "$1" == *\?* ]]; then
+        url_to_open="${1}&t=${timestamp}"
+    else
+        url_to_open="${1}?t=${timestamp}"
+    fi
+
+    # 瀏覽器只在第一次啟動，之後都沿用同一個程序與分頁，達成「只開啟目前課堂頁面」
+    echo "[$(date +%H:%M:%S)] 正在開啟課程頁面..."
+    if python3 "$SCRIPT_DIR/browser.py" open "$url_to_open" < /dev/null; then
+        LEGACY_BROWSER=false
+    else
+        echo "[警告] 常駐瀏覽器無法開啟課程頁面，改用系統瀏覽器開啟..."
+        legacy_open_course_page "$url_to_open"
+        LEGACY_BROWSER=true
+    fi
+}
+
+# 離開課程頁面的函數：把分頁導向空白頁 (觸發 SCORM 儲存進度)，瀏覽器保持執行
+close_course_page() {
+    if [ "$LEGACY_BROWSER" = true ]; then
+        cleanup_browser
+        LEGACY_BROWSER=false
+    else
+        python3 "$SCRIPT_DIR/browser.py" blank < /dev/null
+    fi
+}
+
+# 連續失敗時的等待：指數退避 (30 秒起，最多 10 分鐘) 加上隨機抖動，避免多台機器同時重試
+failure_count=0
+backoff_sleep() {
+    local delay=$(( 30 * (1 << (failure_count < 5 ? failure_count : 5)) ))
+    [ "$delay" -gt 600 ] && delay=600
+    delay=$(( delay / 2 + RANDOM % (delay / 2 + 1) ))
+    failure_count=$((failure_count + 1))
+    echo "[資訊] $delay 秒後重試 (連續失敗 $failure_count 次)..."
+    sleep "$delay"
+}
+
+# 更新上課迴圈狀態 (loop_status.json)，供狀態 API 讀取
+loop_status() {
+    python3 "$SCRIPT_DIR/loop_status.py" "$@" < /dev/null > /dev/null 2>&1
+}
 
+# 啟動狀態 / 控制 API
+loop_status start
+python3 "$SCRIPT_DIR/loop_status.py" serve --port "$STATUS_PORT" < /dev/null > /dev/null 2>&1 &
+STATUS_PID=$!
+echo "[資訊] 上課狀態 API: http://127.0.0.1:$STATUS_PORT/status"
+
+# 腳本結束時關閉由 browser.py 啟動的瀏覽器與狀態 API，並結束狀態檔的請求數統計
+trap 'python3 "$SCRIPT_DIR/browser.py" stop > /dev/null 2>&1; kill "$STATUS_PID" 2> /dev/null; loop_status stop' EXIT
+
+while true; do
     echo "============================================================"
     echo "開始執行自動上課檢查流程 (時間: $(date))"
     echo "============================================================"
 
+    # 這次重新整理本身就滿足了排隊中的 refresh 指令
+    loop_status clear refresh
+    loop_status phase refresh
+    refresh_started=$(date +%s.%N)
+
     echo "步驟 1: 從臺北 e 大獲取未完成課程名單"
     python3 -u "$SCRIPT_DIR/get_course.py"
 
     if [ $? -ne 0 ]; then
-        echo "警告: get_course.py 執行可能失敗，1 分鐘後重試..."
-        sleep 60
-        continue
+        if [ -s "$SCRIPT_DIR/incomplete_courses.txt" ] && [ "$failure_count" -lt 3 ]; then
+            # 平台暫時無法連線時沿用上次的課程名單繼續上課，不讓整個流程停住
+            failure_count=$((failure_count + 1))
+            echo "警告: get_course.py 執行失敗，沿用上次的未完成課程名單繼續 (連續失敗 $failure_count 次)..."
+        else
+            echo "警告: get_course.py 執行失敗。"
+            backoff_sleep
+            continue
+        fi
+    else
+        failure_count=0
     fi
 
     echo ""
     echo "步驟 2: 計算剩餘時間並產生 URL 清單"
-    python3 -u "$SCRIPT_DIR/gen_url.py"
+    python3 -u "$SCRIPT_DIR/gen_url.py" --reload-interval "$RELOAD_INTERVAL"
 
     if [ $? -ne 0 ]; then
         echo "錯誤: gen_url.py 執行失敗。"
-        sleep 60
+        backoff_sleep
         continue
     fi
+    loop_status refresh "$refresh_started"
 
     echo ""
     echo "步驟 3: 自動依序上課 (開啟網頁 -> 等待倒數 -> 重新檢查)"
     if [ -f "$SCRIPT_DIR/urls.txt" ] && [ -s "$SCRIPT_DIR/urls.txt" ]; then
-        # [修改] 依據課程剩餘所需時間排序，由短至長優先上課
-        echo "[資訊] 正在依據剩餘時間排序課程 (最短優先)..."
-        # urls.txt 格式為 min|url|course_name，我們依據第一欄 (min) 進行數值排序
-        sort -t'|' -k1,1n "$SCRIPT_DIR/urls.txt" > "$SCRIPT_DIR/urls_tmp.txt"
-        mv "$SCRIPT_DIR/urls_tmp.txt" "$SCRIPT_DIR/urls.txt"
+        # 依據 study_plan.json 取出下一個時段：課程依序填滿 RELOAD_INTERVAL 分鐘，
+        # 跨時段的課程下個時段接續，整個時段結束後才重新檢查進度
+        echo "[資訊] 正在讀取上課排程的下一個時段..."
+        python3 "$SCRIPT_DIR/planner.py" next-window > "$SCRIPT_DIR/window_tmp.txt"
 
-        total_courses=$(wc -l < "$SCRIPT_DIR/urls.txt")
+        total_courses=$(wc -l < "$SCRIPT_DIR/window_tmp.txt")
+        # 時段內未排入課程的分鐘數：輪詢發現課程尚未完成時只用這些分鐘補課，
+        # 時段長度維持不超過 RELOAD_INTERVAL，重新整理次數與 gen_url.py 的估計一致
+        window_slack=$(( RELOAD_INTERVAL - $(awk -F'|' '{s += $1} END {print s + 0}' "$SCRIPT_DIR/window_tmp.txt") ))
+        [ "$window_slack" -lt 0 ] && window_slack=0
         current_count=0
         recheck_needed=false
-        RELOAD_INTERVAL=30  # 設定每 30 分鐘重新載入一次 (避免平台工作逾時)
+        force_refresh=false
         
         while read -r line; do
             current_count=$((current_count + 1))
@@ -71,63 +154,93 @@ while true; do
                 echo "課程名稱: $course_name"
                 echo "剩餘所需時間: $min 分鐘"
                 
-                # 為了確保瀏覽器真的會重新載入，我們在網址後加上時間戳記
-                timestamp=$(date +%s)
-                if [[ "$url" == *\?* ]]; then
-                    url_to_open="${url}&t=${timestamp}"
-                else
-                    url_to_open="${url}?t=${timestamp}"
-                fi
-                
                 echo "網址: $url"
                 echo "------------------------------------------------------------"
+                loop_status course --name "$course_name" --url "$url" --minutes "$min" \
+                    --queue-file "$SCRIPT_DIR/window_tmp.txt" --position "$current_count"
                 
-                # 在開啟新頁面前，先確保清理完畢，達成「只開啟目前課堂頁面」
-                cleanup_browser
-                
-                # 等待 5 秒後開啟網頁，確保環境已清理
-                echo "[$(date +%H:%M:%S)] 等待 5 秒後開啟網頁..."
-                sleep 5
-
-                # 使用具體參數開啟 Brave，加入 --hide-crash-restore-bubble 與 --restore-last-session=0 徹底防止回復舊分頁
-                open -a "Brave Browser" -F "$url_to_open" --args --new-window --restore-last-session=0 --hide-crash-restore-bubble
-                
-                # 設定本次等待時間，最多為 RELOAD_INTERVAL 分鐘
+                # 排程中的每一段皆不超過 RELOAD_INTERVAL 分鐘
                 wait_min=$min
-                limit_reached=false
-                if [ "$wait_min" -ge "$RELOAD_INTERVAL" ]; then
-                    wait_min=$RELOAD_INTERVAL
-                    limit_reached=true
+                if [ "$wait_min" -le 0 ]; then
+                    echo "此課程剩餘時間為 0。"
                 fi
 
-                if [ "$wait_min" -gt 0 ]; then
+                while [ "$wait_min" -gt 0 ]; do
+                    open_course_page "$url"
+
                     wait_seconds=$((wait_min * 60))
                     echo "[$(date +%H:%M:%S)] 開始計時 $wait_min 分鐘 ($wait_seconds 秒)..."
+                    loop_status countdown "$wait_seconds"
                     
-                    if [ "$limit_reached" = true ]; then
-                        echo "提示: 此課程時間較長，將於 $RELOAD_INTERVAL 分鐘後自動重新載入以更新進度。"
-                    fi
-                    
+                    # 倒數時每秒只檢查控制旗標檔是否存在，不需要啟動任何程序
                     while [ $wait_seconds -gt 0 ]; do
+                        if [ -e "$CONTROL_DIR/pause" ]; then
+                            # 暫停時離開課程頁面，恢復後重新開啟並從剩餘秒數繼續
+                            close_course_page
+                            loop_status paused "$wait_seconds"
+                            printf "\n[資訊] 已暫停 (剩餘 %02d:%02d)，等待 resume 指令...\n" $((wait_seconds/60)) $((wait_seconds%60))
+                            while [ -e "$CONTROL_DIR/pause" ] && [ ! -e "$CONTROL_DIR/skip" ] && [ ! -e "$CONTROL_DIR/refresh" ]; do
+                                sleep 1
+                            done
+                            if [ ! -e "$CONTROL_DIR/skip" ] && [ ! -e "$CONTROL_DIR/refresh" ]; then
+                                loop_status countdown "$wait_seconds"
+                                open_course_page "$url"
+                            fi
+                        fi
+                        if [ -e "$CONTROL_DIR/skip" ] || [ -e "$CONTROL_DIR/refresh" ]; then
+                            break
+                        fi
                         printf "\r剩餘時間: %02d:%02d " $((wait_seconds/60)) $((wait_seconds%60))
                         sleep 1
                         wait_seconds=$((wait_seconds - 1))
                     done
                     echo -e "\n時間到！"
-                    cleanup_browser
-                else
-                    echo "此課程剩餘時間為 0。"
-                fi
+                    close_course_page
+
+                    if [ -e "$CONTROL_DIR/skip" ]; then
+                        loop_status clear skip
+                        echo "[資訊] 依控制指令略過此課程。"
+                        break
+                    fi
+                    if [ -e "$CONTROL_DIR/refresh" ]; then
+                        echo "[資訊] 依控制指令立即重新檢查進度。"
+                        force_refresh=true
+                        break
+                    fi
+
+                    # 只重新讀取這門課所在的學習紀錄分頁，確認進度後決定是否繼續上同一門課
+                    # 輸出為「剩餘修課分鐘數 建議計時分鐘數」(依歷史累積速率換算)
+                    loop_status phase polling
+                    poll_output=$(python3 "$SCRIPT_DIR/poll_course.py" "$url" --studied "$wait_min" < /dev/null)
+                    poll_status=$?
+                    read -r remaining next_wait <<< "$poll_output"
+                    wait_min=0
+                    if [ $poll_status -eq 0 ] && [ -n "$next_wait" ] && [ "$next_wait" -gt 0 ]; then
+                        wait_min=$(( next_wait < window_slack ? next_wait : window_slack ))
+                        window_slack=$((window_slack - wait_min))
+                        if [ "$wait_min" -gt 0 ]; then
+                            echo "[資訊] 課程尚未完成 (剩餘 $remaining 分鐘)，以本時段剩餘時間繼續上課 $wait_min 分鐘..."
+                        else
+                            echo "[資訊] 課程尚未完成 (剩餘 $remaining 分鐘)，下個時段接續。"
+                        fi
+                    elif [ $poll_status -eq 10 ]; then
+                        echo "[資訊] 課程已完成！"
+                    else
+                        echo "[資訊] 無法單獨確認此課程進度，本時段結束後將重新執行完整流程。"
+                    fi
+                done
                 
-                # 每次處理完一個課程（不論是完成或是達到 30 分鐘上限），都跳出內層迴圈
-                # 這樣外層迴圈 (while true) 會重新抓取最新課程狀態並再次隨機挑選
-                echo "[資訊] 課程頁面已關閉，準備進入下一波隨機挑選..."
                 recheck_needed=true
-                break
+                if [ "$force_refresh" = true ]; then
+                    break
+                fi
             fi
-        done < "$SCRIPT_DIR/urls.txt"
-        
+        done < "$SCRIPT_DIR/window_tmp.txt"
+        rm -f "$SCRIPT_DIR/window_tmp.txt"
+
+        # 整個時段結束後，外層迴圈 (while true) 會重新抓取最新課程狀態並重新排程
         if [ "$recheck_needed" = true ]; then
+            echo "[資訊] 本時段已結束，準備重新檢查進度..."
             sleep 3
             continue
         fi
@@ -136,6 +249,7 @@ while true; do
         sleep 10
     else
         echo "找不到未完成課程或 urls.txt 為空，任務圓滿結束！"
+        loop_status phase done
         break
     fi
 done
@@ -0,0 +1,297 @@
+"""
+上課迴圈模擬器：以虛擬時鐘重現 run_all.sh 的流程 (重新整理 -> 排程 -> 依時段上課 -> 輪詢進度)，
+比較不同排程策略與 RELOAD_INTERVAL 的總耗時、重新整理次數與 HTTP 請求數，
+不需要實際等待；數個月的上課排程幾秒內就能跑完。
+
+每個帳號是一個 generator (對應一個 run_all.sh)，每一步 yield 所花費的分鐘數，
+由事件佇列 (heapq) 依虛擬時間推進；排程與計時長度直接使用 planner.py 與 study_history.py。
+
+伺服器端的修課時間以「真實累積速率」模擬：每次開啟課程頁實際停留 studied 分鐘，
+伺服器累計 (studied - 開啟損耗) × 速率 分鐘 (頁面顯示取整數)；計時長度則由 StudyHistory 依觀察估計。
+
+用法：
+    python simulate.py --accounts 100                          # 合成課程
+    python simulate.py --input incomplete_courses.txt --rate 0.9
+    python simulate.py --reload-intervals 15,30,60 --json sim.json
+"""
+
+import argparse
+import heapq
+import json
+import math
+import random
+import sys
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+
+import planner
+from gen_url import CourseResult, parse_course_file
+from study_history import StudyHistory
+
+
+DEFAULT_MAX_DAYS = 365
+
+
+@dataclass
+class SimCourse:
+    name: str
+    link: str
+    remaining: float  # 伺服器端剩餘修課分鐘數 (伺服器以秒累計，頁面只顯示整數分鐘)
+    rate: float  # 真實累積速率 (伺服器修課分鐘 / 實際停留分鐘)
+
+    @property
+    def shown_remaining(self) -> int:
+        """學習紀錄頁顯示的剩餘分鐘數"""
+        return max(math.ceil(self.remaining - 1e-9), 0)
+
+
+@dataclass
+class CostModel:
+    """非上課時間的成本 (秒) 與請求數"""
+
+    request_seconds: float = 0.4  # 每個 HTTP 請求的平均耗時
+    process_seconds: float = 1.5  # 每次啟動 Python 程式 (import、讀設定)
+    browser_seconds: float = 2.0  # 開啟 / 離開課程頁
+    open_loss_minutes: float = 0.5  # 每次開啟課程頁不被計入的分鐘數
+    records_per_page: int = 10
+    poll_requests: int = 2
+
+    def refresh_requests(self, courses: int, incomplete: int) -> int:
+        """get_course.py：登入檢查 1 + SSO 跳轉 3 + 學習紀錄分頁 + 每門未完成課程的課程頁與 SCORM 頁"""
+        pages = max(math.ceil(courses / self.records_per_page), 1)
+        return 1 + 3 + pages + 2 * incomplete
+
+    def refresh_minutes(self, requests: int) -> float:
+        # get_course.py、gen_url.py、planner.py 各啟動一次
+        return (requests * self.request_seconds + 3 * self.process_seconds) / 60
+
+    def poll_minutes(self) -> float:
+        return (self.poll_requests * self.request_seconds + self.process_seconds) / 60
+
+
+@dataclass
+class Strategy:
+    name: str
+    plan: Callable[..., planner.StudyPlan]
+    reload_interval: int
+    use_history: bool = True
+
+    @property
+    def label(self) -> str:
+        history = "" if self.use_history else " (無速率估計)"
+        return f"{self.name} / {self.reload_interval} 分{history}"
+
+
+STRATEGIES: Dict[str, Callable[..., planner.StudyPlan]] = {
+    "shortest-first": planner.plan_one_per_window,
+    "window-packing": planner.plan_study,
+}
+
+
+@dataclass
+class AccountStats:
+    refresh_cycles: int = 0
+    polls: int = 0
+    page_opens: int = 0
+    requests: int = 0
+    study_minutes: float = 0.0
+    finish_minutes: Optional[float] = None  # None 表示超過模擬期限仍未完成
+
+
+@dataclass
+class SimResult:
+    strategy: str
+    accounts: int
+    finished: int
+    mean_wall_hours: float
+    max_wall_days: float
+    refresh_cycles: int
+    polls: int
+    page_opens: int
+    requests: int
+    overhead_ratio: float  # 非上課時間佔總時間的比例
+    compute_seconds: float = 0.0
+
+
+def account_loop(courses: List[SimCourse], strategy: Strategy, cost: CostModel,
+                 stats: AccountStats) -> Iterator[float]:
+    """一個帳號的 run_all.sh 迴圈；每次 yield 經過的分鐘數"""
+    history = StudyHistory(file_path="")
+    by_link = {course.link: course for course in courses}
+
+    def wait_minutes(course: SimCourse) -> int:
+        if strategy.use_history:
+            return history.wall_minutes(course.link, course.shown_remaining)
+        return course.shown_remaining
+
+    while True:
+        # 步驟 1、2：get_course.py + gen_url.py (+ planner.py next-window)
+        incomplete = [course for course in courses if course.shown_remaining > 0]
+        requests = cost.refresh_requests(len(courses), len(incomplete))
+        stats.refresh_cycles += 1
+        stats.requests += requests
+        yield cost.refresh_minutes(requests)
+        if not incomplete:
+            return
+
+        results = [CourseResult(remaining_min=course.shown_remaining, link=course.link, course_name=course.name,
+                                output="", wait_min=wait_minutes(course)) for course in incomplete]
+        plan = strategy.plan(results, strategy.reload_interval, cost.refresh_minutes(requests))
+        if not plan.windows:
+            return
+
+        # 步驟 3：依序上完時段中的課程，每段結束後輪詢該課程進度；
+        # 尚未完成時只用時段內未排入課程的分鐘數補課 (與 run_all.sh 相同)
+        slack = max(strategy.reload_interval - plan.windows[0].minutes, 0)
+        for segment in plan.windows[0].segments:
+            course = by_link[segment.link]
+            wait = segment.minutes
+            while wait > 0:
+                stats.page_opens += 1
+                stats.study_minutes += wait
+                yield wait + cost.browser_seconds / 60
+
+                shown_before = course.shown_remaining
+                course.remaining = max(course.remaining - max(wait - cost.open_loss_minutes, 0) * course.rate, 0)
+                accrued = shown_before - course.shown_remaining
+                stats.polls += 1
+                stats.requests += cost.poll_requests
+                yield cost.poll_minutes()
+
+                history.record(course.link, wait, accrued)
+                wait = min(wait_minutes(course), slack)
+                slack -= wait
+
+
+def simulate(accounts: Sequence[List[SimCourse]], strategy: Strategy, cost: CostModel,
+             max_days: float = DEFAULT_MAX_DAYS) -> SimResult:
+    """以事件佇列同時推進所有帳號的虛擬時鐘"""
+    started = time.perf_counter()
+    max_minutes = max_days * 24 * 60
+    stats = [AccountStats() for _ in accounts]
+    events = []
+    for index, courses in enumerate(accounts):
+        copies = [SimCourse(**asdict(course)) for course in courses]
+        heapq.heappush(events, (0.0, index, account_loop(copies, strategy, cost, stats[index])))
+
+    while events:
+        now, index, process = heapq.heappop(events)
+        try:
+            delay = next(process)
+        except StopIteration:
+            stats[index].finish_minutes = now
+            continue
+        if now + delay > max_minutes:
+            process.close()
+            continue
+        heapq.heappush(events, (now + delay, index, process))
+
+    finished = [s for s in stats if s.finish_minutes is not None]
+    wall = [s.finish_minutes for s in finished]
+    total_wall = sum(wall)
+    total_study = sum(s.study_minutes for s in finished)
+    return SimResult(
+        strategy=strategy.label,
+        accounts=len(stats),
+        finished=len(finished),
+        mean_wall_hours=round(total_wall / len(wall) / 60, 2) if wall else 0.0,
+        max_wall_days=round(max(wall) / 1440, 2) if wall else 0.0,
+        refresh_cycles=sum(s.refresh_cycles for s in stats),
+        polls=sum(s.polls for s in stats),
+        page_opens=sum(s.page_opens for s in stats),
+        requests=sum(s.requests for s in stats),
+        overhead_ratio=round(1 - total_study / total_wall, 4) if total_wall else 0.0,
+        compute_seconds=round(time.perf_counter() - started, 3),
+    )
+
+
+def synthetic_accounts(count: int, seed: int = 0, mean_rate: float = 0.9) -> List[List[SimCourse]]:
+    """隨機課程組合：認證時數 1~6 小時、已有部分進度、每門課的累積速率略有差異"""
+    rng = random.Random(seed)
+    accounts = []
+    for a in range(count):
+        courses = []
+        for c in range(rng.randint(5, 20)):
+            target = int(rng.choice([1, 1.5, 2, 3, 4, 6]) * 60 / 2)
+            remaining = target - int(target * rng.choice([0, 0, 0.25, 0.5, 0.9]))
+            rate = min(max(rng.gauss(mean_rate, 0.15), 0.3), 1.2)
+            courses.append(SimCourse(f"課程 {c + 1}", f"sim://{a}/{c}", max(remaining, 1), rate))
+        accounts.append(courses)
+    return accounts
+
+
+def accounts_from_file(path: str, rate: float) -> List[List[SimCourse]]:
+    """以 incomplete_courses.txt 的課程作為單一帳號的課程組合"""
+    return [[SimCourse(result.course_name, result.link, result.remaining_min, rate)
+             for result in parse_course_file(path)]]
+
+
+def print_results(results: List[SimResult]) -> None:
+    print("=" * 110)
+    print(f"{'策略':<28} {'完成':>7} {'平均耗時(時)':>12} {'最久(天)':>9} {'重新整理':>8} "
+          f"{'輪詢':>7} {'開啟頁面':>8} {'HTTP 請求':>10} {'額外時間':>8} {'計算(秒)':>8}")
+    print("-" * 110)
+    for r in sorted(results, key=lambda r: (-r.finished, r.mean_wall_hours)):
+        print(f"{r.strategy:<28} {r.finished:>3}/{r.accounts:<3} {r.mean_wall_hours:>12.2f} {r.max_wall_days:>9.2f} "
+              f"{r.refresh_cycles:>8} {r.polls:>7} {r.page_opens:>8} {r.requests:>10} "
+              f"{r.overhead_ratio:>8.1%} {r.compute_seconds:>8.2f}")
+    print("=" * 110)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate study-loop scheduling strategies on a virtual clock.")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--input", help="Replay courses from an incomplete_courses.txt file (one account)")
+    source.add_argument("--accounts", type=int, default=50, help="Number of synthetic accounts (default: 50)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rate", type=float, default=0.9,
+                        help="True server accrual rate (mean for synthetic courses, default: 0.9)")
+    parser.add_argument("--strategies", default=",".join(STRATEGIES),
+                        help=f"Comma-separated strategies (default: {','.join(STRATEGIES)})")
+    parser.add_argument("--reload-intervals", default="15,30,45,60",
+                        help="Comma-separated RELOAD_INTERVAL values in minutes (default: 15,30,45,60)")
+    parser.add_argument("--no-history", action="store_true",
+                        help="Also run every strategy without accrual-rate estimation")
+    parser.add_argument("--open-loss", type=float, default=CostModel.open_loss_minutes,
+                        help="Minutes not credited per course page open (default: %(default)s)")
+    parser.add_argument("--request-seconds", type=float, default=CostModel.request_seconds,
+                        help="Average seconds per HTTP request (default: %(default)s)")
+    parser.add_argument("--max-days", type=float, default=DEFAULT_MAX_DAYS,
+                        help=f"Give up on accounts not finished within this many virtual days (default: {DEFAULT_MAX_DAYS})")
+    parser.add_argument("--json", metavar="PATH", help="Also write the results as JSON")
+    args = parser.parse_args()
+
+    try:
+        if args.input:
+            accounts = accounts_from_file(args.input, args.rate)
+        else:
+            accounts = synthetic_accounts(args.accounts, args.seed, args.rate)
+        intervals = [int(value) for value in args.reload_intervals.split(",") if value]
+        names = [name for name in args.strategies.split(",") if name]
+        unknown = [name for name in names if name not in STRATEGIES]
+        if unknown:
+            raise ValueError(f"未知的策略 {', '.join(unknown)} (可用: {', '.join(STRATEGIES)})")
+    except (OSError, ValueError) as e:
+        print(f"錯誤: {e}")
+        sys.exit(1)
+
+    cost = CostModel(open_loss_minutes=args.open_loss, request_seconds=args.request_seconds)
+    strategies = [Strategy(name, STRATEGIES[name], interval) for name in names for interval in intervals]
+    if args.no_history:
+        strategies += [Strategy(s.name, s.plan, s.reload_interval, use_history=False) for s in list(strategies)]
+
+    courses = sum(len(a) for a in accounts)
+    print(f"帳號數: {len(accounts)}  課程數: {courses}  "
+          f"剩餘修課時間: {sum(c.remaining for a in accounts for c in a) / 60:.0f} 小時")
+    results = [simulate(accounts, strategy, cost, args.max_days) for strategy in strategies]
+    print_results(results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump([asdict(r) for r in results], f, ensure_ascii=False, indent=2)
+        print(f"\n結果已儲存至 {args.json}")
+
+
+if __name__ == "__main__":
+    main()
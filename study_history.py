@@ -0,0 +1,91 @@
+"""
+上課歷史：記錄每門課每次實際上課的分鐘數與伺服器端修課時間的增加量，
+估計各課程的累積速率，用來決定計時長度，減少因等待不足而重開課程的次數。
+"""
+
+import json
+import math
+import os
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional
+
+import logs
+from utils import Files
+
+
+# 估計速率時的先驗：假設伺服器修課時間與實際時間相同，權重相當於 PRIOR_MINUTES 分鐘的觀察
+PRIOR_RATE = 1.0
+PRIOR_MINUTES = 30.0
+# 只使用最近幾筆觀察 (平台行為可能改變)
+RECENT_OBSERVATIONS = 5
+# 速率的合理範圍，避免單次異常觀察造成極端的計時長度
+MIN_RATE = 0.2
+MAX_RATE = 2.0
+
+logger = logs.get_logger(__name__)
+
+
+@dataclass
+class Observation:
+    time: float
+    studied_min: float  # 實際上課 (開著頁面) 的分鐘數
+    accrued_min: float  # 伺服器端修課時間增加的分鐘數
+
+
+class StudyHistory:
+    """以課程 ID 為鍵的上課歷史"""
+
+    def __init__(self, file_path: str = Files.STUDY_HISTORY):
+        self.file_path = file_path
+        self.courses: Dict[str, List[Observation]] = {}
+        if not os.path.exists(file_path):
+            return
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.courses = {
+                course_id: [Observation(**entry) for entry in entries]
+                for course_id, entries in data.items()
+            }
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            # 檔案損毀 (例如寫入中斷) 時從空的歷史開始，速率估計退回先驗
+            logger.warning("無法讀取 %s (%s)，上課歷史重新開始記錄", file_path, e)
+
+    def record(self, course_id: str, studied_min: float, accrued_min: float) -> None:
+        if studied_min <= 0:
+            return
+        self.courses.setdefault(course_id, []).append(
+            Observation(time=time.time(), studied_min=studied_min, accrued_min=max(accrued_min, 0)))
+
+    def _global_rate(self) -> float:
+        """所有課程的整體速率，作為沒有個別歷史時的先驗"""
+        studied = sum(o.studied_min for obs in self.courses.values() for o in obs[-RECENT_OBSERVATIONS:])
+        accrued = sum(o.accrued_min for obs in self.courses.values() for o in obs[-RECENT_OBSERVATIONS:])
+        return (accrued + PRIOR_RATE * PRIOR_MINUTES) / (studied + PRIOR_MINUTES)
+
+    def accrual_rate(self, course_id: Optional[str]) -> float:
+        """估計伺服器修課時間每分鐘實際上課的增加量 (以整體速率為先驗平滑)"""
+        prior = self._global_rate()
+        recent = self.courses.get(course_id, [])[-RECENT_OBSERVATIONS:] if course_id else []
+        studied = sum(o.studied_min for o in recent)
+        accrued = sum(o.accrued_min for o in recent)
+        rate = (accrued + prior * PRIOR_MINUTES) / (studied + PRIOR_MINUTES)
+        return min(max(rate, MIN_RATE), MAX_RATE)
+
+    def wall_minutes(self, course_id: Optional[str], remaining_min: int) -> int:
+        """依估計速率換算剩餘修課時間所需的實際上課分鐘數"""
+        if remaining_min <= 0:
+            return 0
+        return math.ceil(remaining_min / self.accrual_rate(course_id))
+
+    def save(self) -> None:
+        directory = os.path.dirname(os.path.abspath(self.file_path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".study-history-")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({
+                course_id: [asdict(o) for o in observations]
+                for course_id, observations in self.courses.items()
+            }, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.file_path)
@@ -0,0 +1,69 @@
+"""
+測試共用的工具：以假的傳輸層回應請求，cookie、轉址與 hook 仍由真正的 requests.Session 處理。
+"""
+
+import http.client
+from typing import Callable, List, Tuple
+
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+from requests.cookies import extract_cookies_to_jar
+from requests.structures import CaseInsensitiveDict
+
+
+Handler = Callable[[requests.PreparedRequest], Tuple[int, List[Tuple[str, str]], str]]
+
+
+class ReplayRaw:
+    """requests 由 raw._original_response.msg 取出 Set-Cookie，轉址時會讀取並釋放 raw"""
+
+    def __init__(self, headers: List[Tuple[str, str]]):
+        message = http.client.HTTPMessage()
+        for name, value in headers:
+            message[name] = value
+        self._original_response = type("OriginalResponse", (), {"msg": message})()
+
+    def read(self, *args, **kwargs) -> bytes:
+        return b""
+
+    def close(self) -> None:
+        pass
+
+    def release_conn(self) -> None:
+        pass
+
+
+class ReplayAdapter(HTTPAdapter):
+    """依請求回傳 handler 產生的 (狀態碼, header, 內容)，並記錄請求過的網址"""
+
+    def __init__(self, handler: Handler):
+        super().__init__()
+        self.handler = handler
+        self.urls: List[str] = []
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        self.urls.append(request.url)
+        status, headers, body = self.handler(request)
+        response = requests.Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict(headers)
+        response.raw = ReplayRaw(headers)
+        response._content = body.encode("utf-8")
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        extract_cookies_to_jar(response.cookies, request, response.raw)
+        return response
+
+
+@pytest.fixture
+def replay_session():
+    """replay_session(handler) 回傳 (掛上 ReplayAdapter 的 session, adapter)"""
+    def make(handler: Handler) -> Tuple[requests.Session, ReplayAdapter]:
+        adapter = ReplayAdapter(handler)
+        session = requests.Session()
+        session.mount("https://", adapter)
+        return session, adapter
+    return make
@@ -0,0 +1,20 @@
+import pytest
+
+from course_state import CourseState, CourseStateFile, load_state, save_state
+
+
+@pytest.mark.parametrize("content", ["{\"course_list_url\": \"https://ap1", "[]", "{\"courses\": {\"1\": {\"x\": 1}}}"])
+def test_corrupt_state_file_loads_empty(tmp_path, content):
+    path = tmp_path / "course_state.json"
+    path.write_text(content, encoding="utf-8")
+    state = load_state(str(path))
+    assert state.courses == {}
+    assert state.course_list_url == ""
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "course_state.json")
+    state = CourseStateFile(course_list_url="https://ap1.elearning.taipei/elearn/courserecord/index.php",
+                            courses={"1": CourseState(course_id="1", name="課程", link="l", study_link="s")})
+    save_state(state, path)
+    assert load_state(path) == state
@@ -0,0 +1,61 @@
+import random
+import re
+
+import pytest
+
+import ap_host
+import corpus
+import enroll
+
+
+COURSE_LIST_URL = f"{corpus.AP_BASE}/elearn/courserecord/index.php"
+
+
+@pytest.fixture(autouse=True)
+def fixed_ap_host(monkeypatch):
+    monkeypatch.setattr(ap_host, "_resolver", ap_host.HostResolver(file_path=""))
+
+
+@pytest.fixture
+def record_pages():
+    rng = random.Random(0)
+    return [corpus.courserecord_page(rng, 10) for _ in range(3)]
+
+
+def page_ids(page_html):
+    return re.findall(r"view\.php\?id=(\d+)", page_html)
+
+
+@pytest.fixture
+def verify(replay_session, record_pages):
+    """以三頁學習紀錄執行 verify_enrollment；回傳 (結果, 讀取的頁碼)"""
+    def run(new_ids):
+        pages = []
+
+        def handler(request):
+            if request.url != COURSE_LIST_URL:
+                return 200, [], "<html><body>SSO</body></html>"
+            page = 1
+            if request.method == "POST":
+                page = int(re.search(r"page=(\d+)", request.body).group(1))
+            pages.append(page)
+            if page > len(record_pages):
+                return 200, [], corpus.courserecord_page(random.Random(0), 0)
+            return 200, [], record_pages[page - 1]
+
+        session, adapter = replay_session(handler)
+        return enroll.verify_enrollment(session, new_ids), pages, adapter
+    return run
+
+
+def test_verify_reads_pages_until_all_found_without_sso(verify, record_pages):
+    ok, pages, adapter = verify([page_ids(record_pages[1])[0]])
+    assert ok
+    assert pages == [1, 2]
+    assert adapter.urls == [COURSE_LIST_URL, COURSE_LIST_URL]
+
+
+def test_verify_stops_when_pages_run_out(verify):
+    ok, pages, _ = verify(["1"])
+    assert not ok
+    assert pages == [1, 2, 3, 4]
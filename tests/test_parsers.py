@@ -0,0 +1,33 @@
+"""
+以固定語料 (corpus.py) 比對實際流程使用的各解析器輸出與 bench_baseline.json 記錄的摘要；
+解析器行為有意變更時以 `python bench.py regress --update` 重新產生基準。
+"""
+
+import json
+import os
+
+import pytest
+
+import ap_host
+import bench
+
+
+with open(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), bench.BASELINE_FILE),
+          "r", encoding="utf-8") as f:
+    BASELINE = json.load(f)
+SUITES = bench._regress_suites(BASELINE["seed"])
+
+
+@pytest.fixture(autouse=True)
+def fixed_ap_host(monkeypatch):
+    # 固定 AP 主機，避免讀到本機 ap_host.json 而改變輸出
+    monkeypatch.setattr(ap_host, "_resolver", ap_host.HostResolver(file_path=""))
+
+
+@pytest.mark.parametrize("name", sorted(SUITES))
+def test_parser_output_matches_baseline(name):
+    func, items = SUITES[name]
+    expected = BASELINE["suites"][name]["digests"]
+    assert len(items) == len(expected)
+    changed = [i for i, item in enumerate(items) if bench._digest(func(item)) != expected[i]]
+    assert changed == []
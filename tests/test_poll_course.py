@@ -0,0 +1,114 @@
+import random
+from urllib.parse import urlsplit
+
+import pytest
+from requests.cookies import RequestsCookieJar, create_cookie
+
+import corpus
+import poll_course
+from cookie_store import CookieStore
+from course_state import CourseState, CourseStateFile, course_id_from_link
+from get_course import URLs, SessionExpiredError, extract_course_info_from_html
+
+
+AP_HOST = urlsplit(corpus.AP_BASE).hostname
+COURSE_LIST_URL = f"{corpus.AP_BASE}/elearn/courserecord/index.php"
+AP_LOGIN_URL = f"{corpus.AP_BASE}/elearn/auth/sso/login.php?token=t1"
+MOODLE_LOGIN_PAGE = ('<html><body><div id="region-main"><form action="/elearn/login/index.php" method="post">'
+                     '<input name="username"><input type="password" name="password"></form></div></body></html>')
+
+
+@pytest.fixture
+def record_page():
+    return corpus.courserecord_page(random.Random(0), 10)
+
+
+@pytest.fixture
+def row(record_page):
+    return extract_course_info_from_html(record_page)[0]
+
+
+@pytest.fixture
+def store(tmp_path):
+    """只有入口網站 cookie 的 cookies.json"""
+    store = CookieStore(str(tmp_path / "cookies.json"))
+    portal = RequestsCookieJar()
+    portal.set_cookie(create_cookie("laravel_session", "p1", domain="elearning.taipei", path="/"))
+    store.write(portal, 1)
+    return store
+
+
+@pytest.fixture
+def poll(replay_session, record_page, row, store):
+    """以指定的 cookies 輪詢一次，SSO 後把 cookie 寫回 store；回傳 (修課時間, 是否經過 SSO, adapter)"""
+    def handler(request):
+        cookie = request.headers.get("Cookie", "")
+        if request.url == URLs.SSO:
+            if "laravel_session=" not in cookie:
+                return 302, [("Location", URLs.LOGIN_PAGE)], ""
+            return 302, [("Location", AP_LOGIN_URL)], ""
+        if request.url == AP_LOGIN_URL:
+            # AP 主機的 session cookie 沒有 Domain 屬性，只屬於該主機
+            return 303, [("Location", COURSE_LIST_URL),
+                         ("Set-Cookie", "MoodleSession=m1; Path=/elearn/; Secure; HttpOnly")], ""
+        if request.url == COURSE_LIST_URL:
+            return 200, [], record_page if "MoodleSession=m1" in cookie else MOODLE_LOGIN_PAGE
+        return 200, [], "<html><body>登入</body></html>"
+
+    def run(cookies):
+        session, adapter = replay_session(handler)
+        session.cookies.update(cookies)
+        course_id = course_id_from_link(row.link)
+        state = CourseStateFile(course_list_url=COURSE_LIST_URL, courses={
+            course_id: CourseState(course_id=course_id, name=row.name, link=row.link, study_link=row.link,
+                                   hours=row.hours)})
+        study_time, reentered = poll_course.poll_with_sso(session, state, state.courses[course_id])
+        if reentered:
+            store.update(session.cookies, 1)
+        return study_time, reentered, adapter
+    return run
+
+
+def test_portal_cookie_only_reenters_via_sso(poll, store, row):
+    study_time, reentered, _ = poll(store.read()[1])
+    assert reentered
+    assert study_time == row.study_time
+
+
+def test_sso_saves_host_only_moodle_session(poll, store):
+    poll(store.read()[1])
+    saved = {(cookie.name, cookie.domain) for cookie in store.read()[1]}
+    assert ("MoodleSession", AP_HOST) in saved
+
+
+def test_saved_moodle_session_polls_with_one_request(poll, store, row):
+    poll(store.read()[1])
+    study_time, reentered, adapter = poll(store.read()[1])
+    assert not reentered
+    assert study_time == row.study_time
+    assert len(adapter.urls) == 1
+
+
+def test_no_cookies_raises_session_expired(poll):
+    with pytest.raises(SessionExpiredError):
+        poll(RequestsCookieJar())
+
+
+def test_empty_next_page_is_end_of_pagination(replay_session, record_page, row):
+    """課程不在第 1 頁時會接著讀第 2 頁；第 2 頁沒有紀錄列只代表超過最後一頁，不是 session 失效"""
+    def handler(request):
+        if request.method == "POST":
+            return 200, [], "<html><body><table></table></body></html>"
+        return 200, [], record_page
+
+    session, adapter = replay_session(handler)
+    course = CourseState(course_id="missing", name="不存在的課程", link="", study_link="")
+    assert poll_course.poll_course_progress(session, COURSE_LIST_URL, course) is None
+    assert len(adapter.urls) == 2
+
+
+def test_login_page_on_first_page_raises_session_expired(replay_session):
+    session, _ = replay_session(lambda request: (200, [], MOODLE_LOGIN_PAGE))
+    course = CourseState(course_id="1", name="課程", link="", study_link="", record_page=2)
+    with pytest.raises(SessionExpiredError):
+        poll_course.poll_course_progress(session, COURSE_LIST_URL, course)
@@ -0,0 +1,42 @@
+import datetime
+
+import pytest
+
+import export
+import report
+from get_course import CourseInfo
+
+
+TODAY = datetime.date(2026, 1, 1)
+
+
+def course(hours, study_time, required_time_str=None):
+    return CourseInfo(name="課程", hours=hours, study_time=study_time,
+                      link="https://ap1.elearning.taipei/elearn/course/view.php?id=1",
+                      completion_status="未完成", required_time_str=required_time_str)
+
+
+def test_required_minutes_follows_completion_condition():
+    # 與 gen_url 相同：有完成條件時以條件計算，否則為認證時數的一半
+    assert export.record_from_course(course("3", "10分")).required_minutes == 90
+    assert export.record_from_course(course("3", "10分", "閱讀時間達30分鐘以上")).required_minutes == 30
+
+
+def test_old_exports_without_required_minutes_use_half_of_hours(tmp_path):
+    path = tmp_path / "old.jsonl"
+    path.write_text('{"account": "a", "course_id": "1", "name": "n", "hours": 2.0, '
+                    '"study_minutes": 30, "status": "未完成"}\n', encoding="utf-8")
+    assert next(export.iter_records(str(path))).required_minutes == 60
+
+
+@pytest.mark.skipif(report.np is None, reason="需要 numpy")
+def test_loop_and_vectorized_remaining_agree():
+    records = [export.record_from_course(course("3", "10分", "閱讀時間達30分鐘以上"), "a"),
+               export.record_from_course(course("2", "0分"), "a")]
+    expected = report.summarize_records(records, today=TODAY)
+    assert expected.accounts[0].remaining_minutes == 20 + 60
+    assert report.summarize_columns(report.load_columns(records), today=TODAY).to_dict() == expected.to_dict()
+
+
+def test_course_without_study_time_has_no_study_minutes():
+    assert export.record_from_course(course("2", "")).study_minutes is None
@@ -0,0 +1,78 @@
+import time
+
+import pytest
+
+import metrics
+import resilience
+
+
+HOST = "ap1.elearning.taipei"
+RESET_TIMEOUT = 0.2
+
+
+@pytest.fixture
+def breakers(tmp_path):
+    """共用同一個 circuit.json 的兩個斷路器 (模擬兩個程序)"""
+    path = str(tmp_path / "circuit.json")
+    return (resilience.CircuitBreaker(path, threshold=2, reset_timeout=RESET_TIMEOUT),
+            resilience.CircuitBreaker(path, threshold=2, reset_timeout=RESET_TIMEOUT))
+
+
+def trip(breaker):
+    for _ in range(breaker.threshold):
+        breaker.failure(HOST)
+
+
+def test_trip_recorded_by_another_process_takes_effect(breakers):
+    first, second = breakers
+    assert second.allow(HOST)
+    trip(first)
+    assert second.is_open(HOST)
+    assert not second.allow(HOST)
+
+
+def test_only_one_probe_after_cooldown(breakers):
+    first, second = breakers
+    trip(first)
+    time.sleep(RESET_TIMEOUT * 1.25)
+    probes = [first.allow(HOST), first.allow(HOST), second.allow(HOST)]
+    assert probes.count(True) == 1
+
+
+def test_failed_probe_restarts_cooldown(breakers):
+    first, second = breakers
+    trip(first)
+    time.sleep(RESET_TIMEOUT * 1.25)
+    assert first.allow(HOST)
+    first.failure(HOST)
+    assert not second.allow(HOST)
+
+
+def test_successful_probe_closes_circuit(breakers):
+    first, second = breakers
+    trip(first)
+    time.sleep(RESET_TIMEOUT * 1.25)
+    assert second.allow(HOST)
+    second.success(HOST)
+    assert first.allow(HOST)
+    assert first.allow(HOST)
+
+
+def test_breaker_without_file_keeps_state_in_memory():
+    breaker = resilience.CircuitBreaker("", threshold=1, reset_timeout=RESET_TIMEOUT)
+    breaker.failure(HOST)
+    assert not breaker.allow(HOST)
+
+
+def test_requests_in_a_stage_share_its_deadline(monkeypatch):
+    monkeypatch.setitem(resilience.STAGE_DEADLINES, "pagination", 5.0)
+    with metrics.stage("pagination"):
+        first = resilience._deadline()
+        time.sleep(0.05)
+        assert resilience._deadline() == first
+        assert first <= time.monotonic() + 5.0 - 0.05
+
+
+def test_request_outside_a_stage_gets_its_own_budget():
+    before = time.monotonic()
+    assert resilience._deadline() >= before + resilience.DEFAULT_DEADLINE
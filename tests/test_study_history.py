@@ -0,0 +1,12 @@
+import pytest
+
+from study_history import StudyHistory
+
+
+@pytest.mark.parametrize("content", ["{\"c1\": [{\"time\": 1", "[1, 2]", "{\"c1\": [{\"minutes\": 3}]}"])
+def test_corrupt_file_starts_with_empty_history(tmp_path, content):
+    path = tmp_path / "study_history.json"
+    path.write_text(content, encoding="utf-8")
+    history = StudyHistory(str(path))
+    assert history.courses == {}
+    assert history.accrual_rate("c1") == pytest.approx(1.0)
@@ -0,0 +1,65 @@
+import pytest
+
+from bench import _reference_parse_time_to_minutes
+from utils import _parse_minutes, parse_time_to_minutes, parse_times_to_minutes
+
+try:
+    from hypothesis import given, strategies as st
+except ImportError:
+    given = None
+
+
+# 觀察到的各種時間格式 (含空白、雜訊與邊界值)
+DURATIONS = [
+    "1小時30分", "1 小時 30 分", "12  小時59  分", "2小時", "45分", "0分", "3時", "3時15分", "15分3時",
+    "1.5", "1.5小時", "2", "0", "", " ", "未知", "-",
+    "完成條件為：閱讀時間達120分鐘以上", "閱讀時間達30分鐘以上",
+    " 1小時30分\n", "\t45分", "1小時30分 ",
+]
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    _parse_minutes.cache_clear()
+
+
+@pytest.mark.parametrize("value", DURATIONS)
+def test_matches_reference_implementation(value):
+    assert parse_time_to_minutes(value) == _reference_parse_time_to_minutes(value)
+
+
+@pytest.mark.parametrize("value, minutes", [
+    ("1小時30分", 90),
+    ("2小時", 120),
+    ("45分", 45),
+    ("1.5", 90),
+    ("", 0),
+    (None, 0),
+    ("閱讀時間達30分鐘以上", 30),
+])
+def test_known_values(value, minutes):
+    assert parse_time_to_minutes(value) == minutes
+
+
+def test_batch_matches_single():
+    assert parse_times_to_minutes(DURATIONS) == [parse_time_to_minutes(value) for value in DURATIONS]
+
+
+if given is not None:
+    _space = st.sampled_from(["", " ", "  "])
+    _padding = st.sampled_from(["", " ", "\t", "\n"])
+    _durations = st.one_of(
+        st.builds(lambda h, m, s: f"{h}{s}小時{m}{s}分", st.integers(0, 99), st.integers(0, 59), _space),
+        st.builds(lambda h, s: f"{h}{s}小時", st.integers(0, 99), _space),
+        st.builds(lambda m, s: f"{m}{s}分", st.integers(0, 999), _space),
+        st.builds(lambda h, m: f"{h}時{m}分", st.integers(0, 99), st.integers(0, 59)),
+        st.builds(lambda m, h: f"{m}分{h}時", st.integers(0, 59), st.integers(0, 99)),
+        st.builds(lambda h, d: f"{h}.{d}", st.integers(0, 99), st.integers(0, 9)),
+        st.builds(lambda m: f"完成條件為：閱讀時間達{m}分鐘以上", st.integers(1, 999)),
+        st.text(max_size=20),
+    )
+
+    @given(st.builds(lambda before, value, after: before + value + after, _padding, _durations, _padding))
+    def test_matches_reference_on_generated_formats(value):
+        _parse_minutes.cache_clear()
+        assert parse_time_to_minutes(value) == _reference_parse_time_to_minutes(value)
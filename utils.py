@@ -2,9 +2,16 @@
 共享工具模組，包含兩個檔案都會用到的通用功能
 """
 
+from contextlib import contextmanager
 from dataclasses import dataclass
+from functools import lru_cache
 import re
-from typing import Optional
+from typing import Dict, Iterable, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 
 @dataclass
@@ -17,6 +24,60 @@ class Files:
     DEBUG_COURSES = "debug_courserecord.html"
     INCOMPLETE_COURSES = "incomplete_courses.txt"
     URLS_TXT = "urls.txt"
+    STUDY_PLAN = "study_plan.json"
+    COURSE_STATE = "course_state.json"
+    STUDY_HISTORY = "study_history.json"
+    AP_HOST = "ap_host.json"
+    COURSE_EXPORT = "courses.jsonl"
+    HTTP_CACHE_DIR = "http_cache"
+    METRICS_JSON = "metrics.json"
+    METRICS_PROM = "metrics.prom"
+    RECORDINGS_DIR = "recordings"
+    LOOP_STATUS = "loop_status.json"
+    LOOP_CONTROL_DIR = "loop_control"
+    CIRCUIT = "circuit.json"
+
+
+@contextmanager
+def file_lock(lock_path: str) -> Iterator[None]:
+    """以 flock 取得跨程序排他鎖 (不支援 fcntl 的平台則不上鎖)"""
+    with open(lock_path, "a") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+# 時長語法：數字後接「小時 / 時」或「分」(如 1小時30分、40分、2時、閱讀時間達90分鐘以上)
+_DURATION_TOKEN_RE = re.compile(r"(\d+)\s*(?:(小時|時)|分)")
+# 純數字 (可含小數) 視為小時，例如認證時數 "1.5"
+_DECIMAL_HOURS_RE = re.compile(r"^\d+(\.\d+)?$")
+
+
+@lru_cache(maxsize=4096)
+def _parse_minutes(time_str: str) -> int:
+    """單次掃描解析已 strip 的時間字串 (結果會被快取)"""
+    hours = None
+    minutes = None
+    for match in _DURATION_TOKEN_RE.finditer(time_str):
+        if match.group(2):
+            if hours is None:
+                hours = int(match.group(1))
+        elif minutes is None:
+            minutes = int(match.group(1))
+        if hours is not None and minutes is not None:
+            break
+
+    total_min = (hours or 0) * 60 + (minutes or 0)
+
+    # 如果完全沒對應到小時或分鐘，但有純數字，則視為小時 (針對認證時數純數字情況)
+    if total_min == 0 and _DECIMAL_HOURS_RE.match(time_str):
+        return int(float(time_str) * 60)
+
+    return total_min
 
 
 def parse_time_to_minutes(time_str: Optional[str]) -> int:
@@ -27,31 +88,22 @@ def parse_time_to_minutes(time_str: Optional[str]) -> int:
     - "1.5" -> 90 (視為小時)
     - "40分" -> 40
     - "2時" -> 120
+    - "閱讀時間達90分鐘以上" -> 90
     """
     if not time_str:
         return 0
+    return _parse_minutes(time_str.strip())
 
-    time_str = time_str.strip()
-    total_min = 0
-
-    # 匹配小時 (支援 "1小時"、"1時"、"1 小時"、"1 時")
-    hr_match = re.search(r"(\d+)\s*(?:小時|時)", time_str)
-    if hr_match:
-        total_min += int(hr_match.group(1)) * 60
-
-    # 匹配分鐘 (支援 "40分" 或 "40 分")
-    min_match = re.search(r"(\d+)\s*分", time_str)
-    if min_match:
-        total_min += int(min_match.group(1))
-
-    # 如果完全沒對應到小時或分鐘，但有純數字，則視為小時 (針對認證時數純數字情況)
-    if total_min == 0 and re.match(r"^\d+(\.\d+)?$", time_str):
-        try:
-            return int(float(time_str) * 60)
-        except ValueError:
-            pass
 
-    return total_min
+def parse_times_to_minutes(time_strs: Iterable[Optional[str]]) -> List[int]:
+    """批次轉換整欄時間字串；重複的字串只解析一次"""
+    parsed: Dict[Optional[str], int] = {}
+    result = []
+    for time_str in time_strs:
+        if time_str not in parsed:
+            parsed[time_str] = parse_time_to_minutes(time_str)
+        result.append(parsed[time_str])
+    return result
 
 
 def calculate_remaining_time(cert_str: str, study_str: str, target_str: Optional[str] = None) -> int:
@@ -59,11 +111,12 @@ def calculate_remaining_time(cert_str: str, study_str: str, target_str: Optional
     如果提供了 target_str (例如 "完成條件時數")，則優先使用它作為目標。
     否則預設使用 認證時數的一半 作為目標。
     """
-    if target_str:
-        target_min = parse_time_to_minutes(target_str)
-    else:
-        target_min = int(parse_time_to_minutes(cert_str) / 2)
-
-    study_min = parse_time_to_minutes(study_str)
-    remaining_min = target_min - study_min
+    remaining_min = target_minutes(cert_str, target_str) - parse_time_to_minutes(study_str)
     return max(remaining_min, 0)
+
+
+def target_minutes(cert_str: str, target_str: Optional[str] = None) -> int:
+    """目標時間：有完成條件時使用完成條件，否則為認證時數的一半"""
+    if target_str:
+        return parse_time_to_minutes(target_str)
+    return int(parse_time_to_minutes(cert_str) / 2)